@@ -1,11 +1,21 @@
 import json
 import os
-from typing import Iterable, Optional, List
+from typing import Iterable, Optional, List, Tuple
 
-import bazelwrapper.bi.wrapper_api as bi
-import bazelwrapper.remotecache.wrapper_api as remotecache
-from bazelwrapper.context import Context, WixFlags, ENGFLOW_CONFIG_ROOT, ENV_VAR_RBE_ACTIVE_PROVIDER, OUTPUT_BASE_DIR
+from bazelwrapper.context import Context, ENGFLOW_CONFIG_ROOT, ENV_VAR_RBE_ACTIVE_PROVIDER, OUTPUT_BASE_DIR
 from bazelwrapper.env.info import is_local_dev
+from bazelwrapper.fastpath import is_fast_path, is_ide_invocation
+from bazelwrapper.flagscache import cached_flags
+
+# Per-invocation flags are cached as placeholders and expanded on every run
+_BI_PROFILE_FLAGS_PLACEHOLDER = "{wix:bi_profile_flags}"
+_BEP_FLAGS_PLACEHOLDER = "{wix:bep_flags}"
+# The remote cache endpoint is selected per invocation, see 'bazelwrapper.remotecache.endpoints'
+_REMOTE_CACHE_ENDPOINTS_PLACEHOLDER_PREFIX = "{wix:remote_cache_endpoints:"
+
+# Commands whose build events are summarized, see 'bazelwrapper.bep'. Other commands never get a build event file, it
+# would be left behind by the fast path, which has no post command actions.
+_BEP_COMMANDS = ("build", "test")
 
 
 def _bazel_command(ctx: Context, params: [str]):
@@ -19,58 +29,77 @@ def _bazel_command(ctx: Context, params: [str]):
     return real_bazel_command
 
 
-def build_bazel_command(ctx: Context):
+def build_bazel_command(ctx: Context, with_bi=True):
+    startup_flags, command_flags = _resolve_flags(ctx, with_bi=with_bi)
     params = [
-        *_generate_startup_flags(ctx),
-        *_inject_command_flags(ctx.user_args, _generate_command_flags(ctx))
+        *startup_flags,
+        *ctx.command_line.with_command_flags(command_flags)  # builtin flags has lowest priority
     ]
 
     return _bazel_command(ctx, params)
 
-def build_bep_parser_bazel_command(ctx: Context):
-    user_args = ["run",
-                 "@wix_ci//localdev_new/tools/bazel/build/bep:bep-runner",
-                 "--ui_event_filters=-info,-stdout,-stderr,-debug",
-                 "--noshow_progress",
-                 "--",
-                 f"--bep_file={ctx.bep_file_path}",
-                 "--skipped_targets=True"]
-
+def analyze_bazel_command(ctx: Context, profile_path):
     params = [
-        *_generate_startup_flags(ctx),
-        *_inject_command_flags(user_args, _generate_command_flags(ctx, main_command=False))
+        "analyze-profile",
+        profile_path
     ]
 
     return _bazel_command(ctx, params)
 
-def analyze_bazel_command(ctx: Context, profile_path):
+
+def build_server_warmup_command(ctx: Context):
+    """
+    A no-op command that starts the bazel server with the exact startup options of the main command, so the main
+    command reuses the server instead of restarting it.
+    """
     params = [
-        "analyze-profile",
-        profile_path
+        *bazel_startup_args(ctx),
+        "info",
+        "server_pid"
     ]
 
     return _bazel_command(ctx, params)
 
 
-def _inject_command_flags(user_args: List[str], flags: Iterable[str]) -> list:
-    final_arguments = []
-    command_found = False
+def bazel_startup_args(ctx: Context) -> List[str]:
+    """
+    The startup options of the main command: the wrapper's startup flags followed by the user's ones.
+    """
+    startup_flags, _ = _cached_flags(ctx, main_command=True, with_bi=True)
+
+    return [*startup_flags, *ctx.command_line.startup_options]
+
 
+def _resolve_flags(ctx: Context, main_command=True, with_bi=True) -> Tuple[List[str], List[str]]:
+    startup_flags, command_flags = _cached_flags(ctx, main_command, with_bi)
+
+    return startup_flags, list(_expand_per_invocation_flags(ctx, command_flags))
+
+
+def _cached_flags(ctx: Context, main_command: bool, with_bi: bool) -> Tuple[List[str], List[str]]:
+    def resolve():
+        return list(_generate_startup_flags(ctx)), list(_generate_command_flags(ctx, main_command, with_bi))
+
+    return cached_flags(ctx, main_command, with_bi, resolve)
 
-    # WARNING: this logic is flawed as it assumes that the first argument that doens't start with `--` is the command
-    # This is corrent for the case of `bazel --some_flag=some_value build //...`
-    # This is incorrect for the case of `bazel --some_flag some_value build //...` as it will think that some_value is the command
-    for user_arg in user_args:
-        if user_arg.startswith(WixFlags.PREFIX):
-            continue
-        elif not user_arg.startswith("--") and not command_found:
-            command_found = True  # assuming this arg to be the bazel command
-            final_arguments.append(user_arg)
-            final_arguments.extend(flags)  # builtin flags has lowest priority
-        else:
-            final_arguments.append(user_arg)
 
-    return final_arguments
+def _expand_per_invocation_flags(ctx: Context, flags: List[str]) -> Iterable[str]:
+    for flag in flags:
+        if flag == _BI_PROFILE_FLAGS_PLACEHOLDER:
+            import bazelwrapper.bi.wrapper_api as bi
+
+            yield from bi.profile_flags(ctx)
+        elif flag == _BEP_FLAGS_PLACEHOLDER:
+            # Per invocation, the fast path flag is not a flags cache input
+            if not is_fast_path(ctx):
+                yield f"--build_event_binary_file={ctx.bep_file_path}"
+                yield "--nobuild_event_binary_file_path_conversion"
+        elif flag.startswith(_REMOTE_CACHE_ENDPOINTS_PLACEHOLDER_PREFIX):
+            from bazelwrapper.remotecache.endpoints import expand_endpoints_placeholder
+
+            yield expand_endpoints_placeholder(ctx, flag)
+        else:
+            yield flag
 
 
 def _use_no_sandbox_test_strategy(ctx: Context):
@@ -81,11 +110,7 @@ def _use_no_sandbox_test_strategy(ctx: Context):
     if test_strategy_var_name in os.environ:
         return os.environ[test_strategy_var_name].lower() not in ["yes", "true", "1"]
 
-    for arg in ctx.user_args:
-        if arg.startswith("--tool_tag=ijwb:"):
-            return True
-
-    return False
+    return is_ide_invocation(ctx)
 
 
 def _generate_startup_flags(ctx: Context) -> Iterable[str]:
@@ -179,21 +204,28 @@ def _generate_bazel_flags_with_secrets(ctx: Context) -> Iterable[str]:
 
     return iter(())
 
-def _generate_command_flags(ctx: Context, main_command=True) -> Iterable[str]:
+def _generate_command_flags(ctx: Context, main_command=True, with_bi=True) -> Iterable[str]:
     if not ctx.is_bypassed_command:
         yield from _generate_bazel_flags_with_secrets(ctx)
         yield from _try_generate_engflow_bes_metadata(ctx)
-        yield from bi.resolve_profile_flags(ctx)
+
+        if with_bi:
+            import bazelwrapper.bi.wrapper_api as bi
+
+            if bi.is_profiling_applicable(ctx):
+                yield _BI_PROFILE_FLAGS_PLACEHOLDER
 
         if is_local_dev(ctx):
+            import bazelwrapper.remotecache.wrapper_api as remotecache
+
             yield "--config=localdev"
             yield from remotecache.resolve_remote_cache_flags(ctx)
+            yield from remotecache.resolve_disk_cache_flags(ctx)
         else:  # this is legacy behaviour that will be dropped in the future.
             yield "--config=wix"
 
-        if is_local_dev(ctx) and main_command:
-            yield f"--build_event_binary_file={ctx.bep_file_path}"
-            yield "--nobuild_event_binary_file_path_conversion"
+        if is_local_dev(ctx) and main_command and ctx.bazel_command() in _BEP_COMMANDS:
+            yield _BEP_FLAGS_PLACEHOLDER
 
         if _use_no_sandbox_test_strategy(ctx):
             yield "--config=sandbox-off"
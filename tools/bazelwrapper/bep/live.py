@@ -0,0 +1,236 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from typing import Optional
+
+from bazelwrapper.bep.reader import BuildEvent, BuildEventReader, ID_TARGET_COMPLETED, ID_TEST_SUMMARY
+from bazelwrapper.bep.summary import BuildSummary
+from bazelwrapper.context import Context
+from bazelwrapper.env.console import ConsoleSummaryParser, DISK_CACHE_HITS_FIELD_NAME, REMOTE_CACHE_HITS_FIELD_NAME
+from bazelwrapper.env.info import is_local_dev
+from bazelwrapper.utils.feature_flags import Flag
+from bazelwrapper.utils.json_store import write_json_atomic
+
+#
+# A live status of the running build, for IDE plugins and dashboards to poll instead of issuing their own bazel
+# commands (which would wait for the server lock held by the build).
+#
+# The build event file is followed while bazel writes it. The status is written to
+# '<config_dir>/status/<sha1 of the workspace dir>.json' (see 'live_status_file_path') at most every
+# '_WRITE_INTERVAL_SEC', and once more when the command finished.
+#
+# IMPORTANT:
+# Bazel reports the cache hits only in its final summary, so the cache hit counters are set once the build finished.
+#
+
+_live_status_disabled_flag = Flag(
+    env_var_name="WIX_BAZEL_WRAPPER_LIVE_STATUS_DISABLED",
+    env_var_required_value="1"
+)
+
+_STATUS_FORMAT_VERSION = 1
+
+_STATUS_DIR_NAME = "status"
+
+_POLL_INTERVAL_SEC = 0.25
+_WRITE_INTERVAL_SEC = 0.5
+
+# How long the follower drains the remaining events after the bazel client exited
+_DRAIN_TIMEOUT_SEC = 2.0
+
+_PASSED_TEST_STATUSES = {"PASSED", "FLAKY"}
+
+_ANSI_ESCAPE_SEQUENCE = re.compile(r"\x1b\[[0-9;?]*[ -/]*[@-~]")
+# [1,234 / 5,678] 12 actions, 4 running
+_ACTIONS_PROGRESS = re.compile(r"\[([\d,]+) / ([\d,]+)\]")
+#     Compiling src/foo.cc; 12s linux-sandbox
+_RUNNING_ACTION = re.compile(r"^(?:\[[\d,]+ / [\d,]+\])?\s*(.+?); (\d+)s\b")
+
+
+def live_status_file_path(config_dir: str, workspace_dir: str) -> str:
+    workspace_hash = hashlib.sha1(workspace_dir.encode("utf-8")).hexdigest()
+    return os.path.join(config_dir, _STATUS_DIR_NAME, "{}.json".format(workspace_hash))
+
+
+class LiveBuildStatus:
+    """
+    Follows the build event file on a background thread. Usage: 'start' once bazel was spawned and 'finish' once it
+    exited.
+    """
+
+    def __init__(self, ctx: Context):
+        self._ctx = ctx
+        self._status_file_path = live_status_file_path(ctx.config_dir, ctx.workspace_dir)
+        self._stopping = threading.Event()
+        self._thread = None  # type: Optional[threading.Thread]
+        self._console_parser = ConsoleSummaryParser()
+        self._last_write = 0.0
+        self._dirty = True
+        # Complete once the last build event was read
+        self.complete = False
+        self.summary = BuildSummary()
+        self.status = {
+            "version": _STATUS_FORMAT_VERSION,
+            "invocation_id": ctx.unique_id,
+            "workspace": ctx.workspace_dir,
+            "command": ctx.bazel_command(),
+            "pid": os.getpid(),
+            "state": "running",
+            "started_at": time.time(),
+            "updated_at": None,
+            "targets_completed": 0,
+            "targets_failed": 0,
+            "tests_passed": 0,
+            "tests_failed": 0,
+            "actions_done": None,
+            "actions_total": None,
+            "remote_cache_hits": None,
+            "disk_cache_hits": None,
+            "slowest_action": None,
+            "slowest_action_sec": None,
+            "exit_code": None,
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self._follow, name="bep-follower", daemon=True)
+        self._thread.start()
+
+    def finish(self, exit_code: int) -> Optional[BuildSummary]:
+        """
+        Drains the remaining events and writes the final status, which is written even when the events were not
+        drained in time. Returns the build summary, None when it is not complete.
+        """
+        self._stopping.set()
+        self._thread.join(_DRAIN_TIMEOUT_SEC)
+        drained = not self._thread.is_alive()
+
+        self.status.update({
+            "state": "finished",
+            "exit_code": exit_code,
+            "slowest_action": None,
+            "slowest_action_sec": None,
+        })
+
+        if drained:
+            self._console_parser.close()
+            self.status.update({
+                "remote_cache_hits": self._console_parser.fields[REMOTE_CACHE_HITS_FIELD_NAME],
+                "disk_cache_hits": self._console_parser.fields[DISK_CACHE_HITS_FIELD_NAME],
+            })
+        else:
+            # The follower may still be feeding the console parser, the cache hits are left unknown
+            self._ctx.logger.debug("The build event file was not drained in time.")
+
+        self._write_status()
+
+        return self.summary if drained and self.complete else None
+
+    def _follow(self):
+        bep_file = None
+        try:
+            while not self.complete:
+                # Checked before reading, so the last read happens after bazel exited
+                stopping = self._stopping.is_set()
+
+                if bep_file is None:
+                    bep_file = self._open_bep_file()
+
+                if bep_file is not None:
+                    for event in bep_file.read_available():
+                        self._on_event(event)
+
+                if self._dirty and time.monotonic() - self._last_write >= _WRITE_INTERVAL_SEC:
+                    self._write_status()
+
+                if stopping:
+                    break
+
+                self._stopping.wait(_POLL_INTERVAL_SEC)
+        except Exception as err:
+            self._ctx.logger.debug("Failed to follow the build event file. Error: {error}".format(error=err))
+        finally:
+            if bep_file is not None:
+                bep_file.close()
+
+    def _open_bep_file(self) -> Optional[BuildEventReader]:
+        try:
+            return BuildEventReader(open(self._ctx.bep_file_path, "rb"))
+        except FileNotFoundError:
+            return None  # not created by bazel yet
+
+    def _on_event(self, event: BuildEvent):
+        self.summary.add(event)
+        self.complete = self.complete or event.last_message
+        self._dirty = True
+
+        progress_stderr = event.progress_stderr()
+        if progress_stderr:
+            self._console_parser.feed(progress_stderr)
+            self._on_progress(progress_stderr.decode("utf-8", errors="replace"))
+        elif event.id_kind == ID_TARGET_COMPLETED:
+            success = event.target_success()
+            if success is not None:
+                self.status["targets_completed"] += 1
+                self.status["targets_failed"] += 0 if success else 1
+        elif event.id_kind == ID_TEST_SUMMARY:
+            status = event.test_overall_status()
+            if status is not None:
+                self.status["tests_passed" if status in _PASSED_TEST_STATUSES else "tests_failed"] += 1
+
+    def _on_progress(self, text: str):
+        slowest = None
+        found_running_actions = False
+
+        for line in _ANSI_ESCAPE_SEQUENCE.sub("", text).splitlines():
+            match = _ACTIONS_PROGRESS.search(line)
+            if match:
+                self.status["actions_done"] = _to_int(match.group(1))
+                self.status["actions_total"] = _to_int(match.group(2))
+                found_running_actions = True
+
+            match = _RUNNING_ACTION.match(line)
+            if match:
+                seconds = int(match.group(2))
+                if slowest is None or seconds > slowest[1]:
+                    slowest = (match.group(1).strip(), seconds)
+
+        # Every progress report lists the actions in flight, the previous ones finished
+        if found_running_actions:
+            self.status["slowest_action"], self.status["slowest_action_sec"] = slowest or (None, None)
+
+    def _write_status(self):
+        self.status["updated_at"] = time.time()
+        try:
+            # Polled by IDE plugins and dashboards
+            write_json_atomic(self._status_file_path, self.status, mode=0o644)
+        except OSError as err:
+            self._ctx.logger.debug("Failed to write the live build status. Error: {error}".format(error=err))
+
+        self._last_write = time.monotonic()
+        self._dirty = False
+
+
+def start_live_status_safe(ctx: Context) -> Optional[LiveBuildStatus]:
+    """
+    Starts following the build event file of a local dev build or test, None when there is no build event file of the
+    wrapper to follow.
+    """
+    if not is_local_dev(ctx) or \
+            ctx.bazel_command() not in ("build", "test") or \
+            not ctx.owns_bep_file or \
+            _live_status_disabled_flag.on(ctx):
+        return None
+
+    try:
+        live_status = LiveBuildStatus(ctx)
+        live_status.start()
+        return live_status
+    except Exception as err:
+        ctx.logger.debug("Failed to start the live build status. Error: {error}".format(error=err))
+        return None
+
+
+def _to_int(value: str) -> int:
+    return int(value.replace(",", ""))
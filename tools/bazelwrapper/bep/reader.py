@@ -0,0 +1,226 @@
+from typing import Iterator, List, Optional, Tuple
+
+from bazelwrapper.bep.wire import DecodeError, iter_fields, read_varint, to_str
+
+#
+# A streaming reader of the binary build event protocol file ('--build_event_binary_file'), a sequence of
+# varint length-delimited 'BuildEvent' messages. Only the fields the wrapper uses are decoded, see
+# https://github.com/bazelbuild/bazel/blob/master/src/main/java/com/google/devtools/build/lib/buildeventstream/proto/build_event_stream.proto
+#
+
+_READ_SIZE = 64 * 1024
+
+# BuildEvent fields
+_EVENT_ID = 1
+_EVENT_PROGRESS = 3
+_EVENT_ABORTED = 4
+_EVENT_COMPLETED = 8
+_EVENT_TEST_SUMMARY = 9
+_EVENT_FINISHED = 14
+_EVENT_LAST_MESSAGE = 20
+
+# Decoded on demand, see the accessors of 'BuildEvent'
+_PAYLOAD_FIELDS = {_EVENT_PROGRESS, _EVENT_ABORTED, _EVENT_COMPLETED, _EVENT_TEST_SUMMARY, _EVENT_FINISHED}
+
+# BuildEventId fields, the kind of the event
+ID_PROGRESS = 2
+ID_STARTED = 3
+ID_PATTERN = 4
+ID_TARGET_COMPLETED = 5
+ID_ACTION_COMPLETED = 6
+ID_TEST_SUMMARY = 7
+ID_TEST_RESULT = 8
+ID_BUILD_FINISHED = 9
+ID_PATTERN_SKIPPED = 10
+ID_TARGET_CONFIGURED = 16
+ID_UNCONFIGURED_LABEL = 19
+ID_CONFIGURED_LABEL = 21
+
+# Event ids whose first field is the target label
+_LABELED_IDS = {
+    ID_TARGET_COMPLETED,
+    ID_TEST_SUMMARY,
+    ID_TEST_RESULT,
+    ID_TARGET_CONFIGURED,
+    ID_UNCONFIGURED_LABEL,
+    ID_CONFIGURED_LABEL,
+}
+
+ABORT_REASONS = {
+    0: "UNKNOWN",
+    1: "USER_INTERRUPTED",
+    2: "TIME_OUT",
+    3: "REMOTE_ENVIRONMENT_FAILURE",
+    4: "INTERNAL",
+    5: "LOADING_FAILURE",
+    6: "ANALYSIS_FAILURE",
+    7: "SKIPPED",
+    8: "NO_ANALYZE",
+    9: "NO_BUILD",
+    10: "INCOMPLETE",
+    11: "OUT_OF_MEMORY",
+}
+
+TEST_STATUSES = {
+    0: "NO_STATUS",
+    1: "PASSED",
+    2: "FLAKY",
+    3: "TIMEOUT",
+    4: "FAILED",
+    5: "INCOMPLETE",
+    6: "REMOTE_FAILURE",
+    7: "FAILED_TO_BUILD",
+    8: "TOOL_HALTED_BEFORE_TESTING",
+}
+
+
+class BuildEvent:
+    """
+    A decoded build event. The payload is decoded on demand by the accessor of its kind.
+    """
+
+    def __init__(self, data: bytes):
+        self.id_kind = None  # type: Optional[int]
+        self.label = None  # type: Optional[str]
+        self.last_message = False
+        self._payloads = {}
+
+        for field_number, _, value in iter_fields(data):
+            if field_number == _EVENT_ID:
+                self._decode_id(value)
+            elif field_number == _EVENT_LAST_MESSAGE:
+                self.last_message = bool(value)
+            elif field_number in _PAYLOAD_FIELDS:
+                self._payloads[field_number] = value
+
+    def progress_stderr(self) -> Optional[bytes]:
+        """
+        The console output bazel reported since the previous progress event, the same text it prints to stderr.
+        """
+        payload = self._payloads.get(_EVENT_PROGRESS)
+        if payload is None:
+            return None
+
+        return b"".join(bytes(value) for field_number, _, value in iter_fields(payload) if field_number == 2)
+
+    def aborted(self) -> Optional[Tuple[str, str]]:
+        """
+        The abort reason and description, or None when the event is not an abort.
+        """
+        payload = self._payloads.get(_EVENT_ABORTED)
+        if payload is None:
+            return None
+
+        reason, description = 0, ""
+        for field_number, _, value in iter_fields(payload):
+            if field_number == 1:
+                reason = value
+            elif field_number == 2:
+                description = to_str(value)
+
+        return ABORT_REASONS.get(reason, str(reason)), description
+
+    def target_success(self) -> Optional[bool]:
+        payload = self._payloads.get(_EVENT_COMPLETED)
+        if payload is None:
+            return None
+
+        # proto3 omits default values, a missing field means false
+        return any(field_number == 1 and value for field_number, _, value in iter_fields(payload))
+
+    def test_overall_status(self) -> Optional[str]:
+        payload = self._payloads.get(_EVENT_TEST_SUMMARY)
+        if payload is None:
+            return None
+
+        status = 0
+        for field_number, _, value in iter_fields(payload):
+            if field_number == 5:
+                status = value
+
+        return TEST_STATUSES.get(status, str(status))
+
+    def exit_code(self) -> Optional[Tuple[str, int]]:
+        payload = self._payloads.get(_EVENT_FINISHED)
+        if payload is None:
+            return None
+
+        name, code = "SUCCESS", 0
+        for field_number, _, value in iter_fields(payload):
+            if field_number == 3:
+                for exit_code_field, _, exit_code_value in iter_fields(value):
+                    if exit_code_field == 1:
+                        name = to_str(exit_code_value)
+                    elif exit_code_field == 2:
+                        code = exit_code_value
+
+        return name, code
+
+    def _decode_id(self, data):
+        for field_number, _, value in iter_fields(data):
+            self.id_kind = field_number
+            if field_number in _LABELED_IDS:
+                for id_field_number, _, id_value in iter_fields(value):
+                    if id_field_number == 1:
+                        self.label = to_str(id_value)
+                        break
+
+
+class BuildEventReader:
+    """
+    Reads the events of a build event file as they become available. A partially written event is kept until the rest
+    of it is written, so the reader can follow a file that bazel is still writing.
+    """
+
+    def __init__(self, file):
+        self._file = file
+        self._buffer = bytearray()
+
+    def read_available(self) -> Iterator[BuildEvent]:
+        while True:
+            data = self._file.read(_READ_SIZE)
+            if not data:
+                return
+
+            self._buffer += data
+            yield from self._decode_complete_events()
+
+    def close(self):
+        self._file.close()
+
+    @property
+    def has_partial_event(self) -> bool:
+        return len(self._buffer) > 0
+
+    def _decode_complete_events(self) -> Iterator[BuildEvent]:
+        events = []  # type: List[BuildEvent]
+        buffer = self._buffer
+        pos = 0
+
+        while True:
+            try:
+                length, start = read_varint(buffer, pos)
+            except IndexError:
+                break  # the length itself is not fully written yet
+
+            end = start + length
+            if end > len(buffer):
+                break
+
+            events.append(BuildEvent(bytes(buffer[start:end])))
+            pos = end
+
+        del buffer[:pos]
+        return iter(events)
+
+
+def read_build_events(path: str) -> Iterator[BuildEvent]:
+    """
+    Streams the events of a complete build event file.
+    """
+    with open(path, "rb") as file:
+        reader = BuildEventReader(file)
+        yield from reader.read_available()
+
+        if reader.has_partial_event:
+            raise DecodeError("The build event file '{}' ends with a partial event".format(path))
@@ -0,0 +1,153 @@
+import os
+import time
+from typing import Iterable, List, Optional, Tuple
+
+from bazelwrapper.bep.reader import BuildEvent, ID_BUILD_FINISHED, ID_TARGET_COMPLETED, ID_TEST_SUMMARY, \
+    read_build_events
+from bazelwrapper.bep.wire import DecodeError
+from bazelwrapper.context import Context
+
+#
+# The skipped targets and failures summary of a build, read from its build event file once bazel finished.
+#
+# IMPORTANT:
+# Build event files created by the wrapper are per invocation (see 'Context.bep_file_path') and deleted once they were
+# summarized. Files of invocations that never got here (e.g. fast path commands) are removed once they are stale.
+#
+
+_FAILED_TEST_STATUSES = {
+    "TIMEOUT",
+    "FAILED",
+    "INCOMPLETE",
+    "REMOTE_FAILURE",
+    "FAILED_TO_BUILD",
+    "TOOL_HALTED_BEFORE_TESTING",
+}
+
+# Longer lists are truncated, the full details are in the bazel output
+_MAX_LISTED_TARGETS = 20
+
+_STALE_BEP_FILE_AGE_SEC = 24 * 60 * 60
+
+
+class BuildSummary:
+    def __init__(self):
+        self.skipped_targets = []  # type: List[str]
+        self.failed_targets = []  # type: List[str]
+        self.failed_tests = []  # type: List[Tuple[str, str]]
+        # Aborted for any other reason than being skipped, (label, reason, description)
+        self.aborted_targets = []  # type: List[Tuple[str, str, str]]
+        self.exit_code = None  # type: Optional[Tuple[str, int]]
+        self.events_count = 0
+
+    def add(self, event: BuildEvent):
+        self.events_count += 1
+
+        aborted = event.aborted()
+        if aborted is not None:
+            reason, description = aborted
+            if event.label is None:
+                return
+            if reason == "SKIPPED":
+                self.skipped_targets.append(event.label)
+            elif event.id_kind == ID_TARGET_COMPLETED:
+                self.aborted_targets.append((event.label, reason, description))
+            return
+
+        if event.id_kind == ID_TARGET_COMPLETED and event.target_success() is False:
+            self.failed_targets.append(event.label)
+        elif event.id_kind == ID_TEST_SUMMARY:
+            status = event.test_overall_status()
+            if status in _FAILED_TEST_STATUSES:
+                self.failed_tests.append((event.label, status))
+        elif event.id_kind == ID_BUILD_FINISHED:
+            self.exit_code = event.exit_code()
+
+    def lines(self) -> List[str]:
+        lines = []
+        lines.extend(_section("target(s) were skipped", self.skipped_targets))
+        lines.extend(_section("target(s) failed to build", self.failed_targets))
+        lines.extend(_section("target(s) were aborted", [
+            "{label}: {reason}{description}".format(
+                label=label, reason=reason, description=" - " + description if description else "")
+            for label, reason, description in self.aborted_targets
+        ]))
+        lines.extend(_section("test(s) failed", [
+            "{label} ({status})".format(label=label, status=status) for label, status in self.failed_tests
+        ]))
+
+        return lines
+
+
+def summarize(events: Iterable[BuildEvent]) -> BuildSummary:
+    summary = BuildSummary()
+    for event in events:
+        summary.add(event)
+
+    return summary
+
+
+def report_build_summary(ctx: Context):
+    """
+    Logs the summary of the build, nothing when all targets were built and all tests passed. The summary collected
+    while the build was running is used when available (see 'bazelwrapper.bep.live').
+    """
+    if ctx.build_summary is not None:
+        summary = ctx.build_summary
+    elif not os.path.exists(ctx.bep_file_path):
+        ctx.logger.debug("No build event file at '{path}'".format(path=ctx.bep_file_path))
+        return
+    else:
+        try:
+            summary = summarize(read_build_events(ctx.bep_file_path))
+        except (OSError, DecodeError) as err:
+            ctx.logger.debug("Failed to read the build event file. Error: {error}".format(error=err))
+            return
+
+    ctx.logger.debug("Read {count} build events, build finished with {exit_code}".format(
+        count=summary.events_count, exit_code=summary.exit_code))
+
+    for line in summary.lines():
+        ctx.logger.warn(line)
+
+
+def remove_bep_files(ctx: Context):
+    """
+    Removes the build event file of the invocation when the wrapper created it, along with stale ones.
+    """
+    if not ctx.owns_bep_file:
+        return
+
+    _remove_safe(ctx, ctx.bep_file_path)
+
+    bep_dir = os.path.dirname(ctx.bep_file_path)
+    now = time.time()
+
+    try:
+        with os.scandir(bep_dir) as entries:
+            for entry in entries:
+                if entry.name.endswith(".bes") and now - entry.stat().st_mtime > _STALE_BEP_FILE_AGE_SEC:
+                    _remove_safe(ctx, entry.path)
+    except OSError as err:
+        ctx.logger.debug("Failed to list '{path}'. Error: {error}".format(path=bep_dir, error=err))
+
+
+def _remove_safe(ctx: Context, path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as err:
+        ctx.logger.debug("Failed to remove '{path}'. Error: {error}".format(path=path, error=err))
+
+
+def _section(title: str, entries: List[str]) -> List[str]:
+    if not entries:
+        return []
+
+    lines = ["{count} {title}:".format(count=len(entries), title=title)]
+    lines.extend("  " + entry for entry in entries[:_MAX_LISTED_TARGETS])
+    if len(entries) > _MAX_LISTED_TARGETS:
+        lines.append("  ... and {count} more".format(count=len(entries) - _MAX_LISTED_TARGETS))
+
+    return lines
@@ -0,0 +1,79 @@
+from typing import Iterator, Tuple, Union
+
+#
+# A minimal decoder of the protobuf wire format, enough to read the build event protocol without the protobuf runtime.
+# See https://protobuf.dev/programming-guides/encoding/
+#
+
+WIRE_TYPE_VARINT = 0
+WIRE_TYPE_FIXED64 = 1
+WIRE_TYPE_LENGTH_DELIMITED = 2
+WIRE_TYPE_FIXED32 = 5
+
+_MAX_VARINT_BYTES = 10
+
+
+class DecodeError(Exception):
+    pass
+
+
+def read_varint(buffer, pos: int) -> Tuple[int, int]:
+    """
+    Decodes the varint at 'pos', returns its value and the position right after it. Raises IndexError when the buffer
+    ends in the middle of the varint.
+    """
+    result = 0
+    shift = 0
+
+    for _ in range(_MAX_VARINT_BYTES):
+        byte = buffer[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+    raise DecodeError("Varint is too long")
+
+
+def iter_fields(buffer) -> Iterator[Tuple[int, int, Union[int, memoryview]]]:
+    """
+    Yields the (field number, wire type, value) of every field of an encoded message. Varint values are decoded,
+    length-delimited values are returned as views into the buffer, fixed-size values as raw views.
+    """
+    view = memoryview(buffer)
+    pos = 0
+    end = len(view)
+
+    try:
+        while pos < end:
+            key, pos = read_varint(view, pos)
+            field_number = key >> 3
+            wire_type = key & 0x07
+
+            if wire_type == WIRE_TYPE_VARINT:
+                value, pos = read_varint(view, pos)
+            elif wire_type == WIRE_TYPE_LENGTH_DELIMITED:
+                length, pos = read_varint(view, pos)
+                if pos + length > end:
+                    raise DecodeError("Field {} is truncated".format(field_number))
+                value = view[pos:pos + length]
+                pos += length
+            elif wire_type == WIRE_TYPE_FIXED64:
+                value = view[pos:pos + 8]
+                pos += 8
+            elif wire_type == WIRE_TYPE_FIXED32:
+                value = view[pos:pos + 4]
+                pos += 4
+            else:
+                # Groups are deprecated and not used by the build event protocol
+                raise DecodeError("Unsupported wire type {} of field {}".format(wire_type, field_number))
+
+            yield field_number, wire_type, value
+
+    except IndexError:
+        raise DecodeError("Message is truncated")
+
+
+def to_str(value: memoryview) -> str:
+    return bytes(value).decode("utf-8", errors="replace")
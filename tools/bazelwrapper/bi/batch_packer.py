@@ -0,0 +1,181 @@
+import json
+from typing import List, Optional
+
+from bazelwrapper.bi.frog import BatchEvent
+from bazelwrapper.bi.schema import ProfileEvent
+
+#
+# Packing of profile events into frog batches by their encoded size.
+#
+# IMPORTANT:
+# A batch that exceeds 64KB on the BI system backend, after its enrichment, is silently dropped (see
+# 'bazelwrapper.bi.profile_reporter'). Batches are closed once their encoded size reaches the byte budget, which keeps
+# a safety margin for the enrichment. An event that does not fit into a batch on its own is split into parts that
+# share its ordinal and identity fields and carry 'part' and 'parts' fields, oversized values are cut into consecutive
+# string chunks.
+#
+
+# Fields that identify a trace event, repeated in every part of a split event
+_IDENTITY_FIELDS = ("name", "cat", "ph", "ts", "pid", "tid")
+_PART_FIELD = "part"
+_PARTS_FIELD = "parts"
+
+# The separator between two events of the batch array, as written by 'json.dumps'
+_EVENT_SEPARATOR_BYTES = len(", ")
+
+_HISTOGRAM_BYTES_BUCKET = 4 * 1024
+_HISTOGRAM_EVENTS_BOUNDS = (1, 10, 50, 100, 250, 500, 1000)
+
+
+def encoded_size(value) -> int:
+    return len(json.dumps(value).encode("utf-8"))
+
+
+class BatchPacker:
+    """
+    Collects events into batches of at most 'byte_budget' encoded bytes and 'max_events' events. 'add' and 'flush'
+    return the batches that were closed, in order.
+    """
+
+    def __init__(self, byte_budget: int, max_events: int):
+        self._byte_budget = byte_budget
+        self._max_events = max_events
+        self._events = []  # type: List[ProfileEvent]
+        self._bytes = 0
+        self._envelope_bytes = None  # type: Optional[int]
+        self.batch_bytes = []  # type: List[int]
+        self.batch_events = []  # type: List[int]
+        self.split_events = 0
+
+    def add(self, event: ProfileEvent) -> List[List[ProfileEvent]]:
+        if self._envelope_bytes is None:
+            # The common fields and the frame of the batch, the time offset is at most as long as a timestamp
+            self._envelope_bytes = encoded_size({
+                "dt": _ts_ms(event), "g": {**event.headers, "src": event.meta.source_id}, "e": []})
+
+        closed = []
+        event_bytes = _batch_event_size(event)
+
+        if self._envelope_bytes + event_bytes > self._byte_budget:
+            parts = split_event(event, self._byte_budget - self._envelope_bytes)
+            self.split_events += 1
+        else:
+            parts = [(event, event_bytes)]
+
+        for part, part_bytes in parts:
+            if self._events and (self._bytes + _EVENT_SEPARATOR_BYTES + part_bytes > self._byte_budget or
+                                 len(self._events) == self._max_events):
+                closed.append(self._close())
+
+            if not self._events:
+                self._bytes = self._envelope_bytes + part_bytes
+            else:
+                self._bytes += _EVENT_SEPARATOR_BYTES + part_bytes
+            self._events.append(part)
+
+        return closed
+
+    def flush(self) -> List[List[ProfileEvent]]:
+        return [self._close()] if self._events else []
+
+    def histogram_lines(self) -> List[str]:
+        bytes_bounds = tuple(range(_HISTOGRAM_BYTES_BUCKET, self._byte_budget + _HISTOGRAM_BYTES_BUCKET,
+                                   _HISTOGRAM_BYTES_BUCKET))
+        bytes_histogram = _histogram(self.batch_bytes, bytes_bounds, unit="KB", scale=1024)
+
+        return [
+            "Batch bytes histogram ({count} batches): {histogram}".format(
+                count=len(self.batch_bytes), histogram=bytes_histogram),
+            "Batch events histogram: {histogram}".format(
+                histogram=_histogram(self.batch_events, _HISTOGRAM_EVENTS_BOUNDS)),
+            "Events split to fit the byte budget: {count}".format(count=self.split_events),
+        ]
+
+    def _close(self) -> List[ProfileEvent]:
+        events = self._events
+        self.batch_bytes.append(self._bytes)
+        self.batch_events.append(len(events))
+
+        self._events = []
+        self._bytes = 0
+        return events
+
+
+def split_event(event: ProfileEvent, byte_budget: int) -> List[tuple]:
+    """
+    Splits an event into (part, encoded size) pairs that fit the byte budget each.
+    """
+    identity = {name: event.data[name] for name in _IDENTITY_FIELDS if name in event.data}
+    # Counted as if the event had more parts than it ever has, the numbers are written once they are known
+    frame_bytes = _batch_event_size(_part_of(event, {**identity, _PART_FIELD: 9999, _PARTS_FIELD: 9999}))
+    field_budget = byte_budget - frame_bytes
+    if field_budget <= 0:
+        raise ValueError("Byte budget {} cannot hold the identity of an event".format(byte_budget))
+
+    parts_fields = [{}]
+    parts_bytes = [0]
+
+    for name, value in event.data.items():
+        if name in identity:
+            continue
+
+        for chunk in _chunks(name, value, field_budget):
+            chunk_bytes = encoded_size({name: chunk})
+            if parts_bytes[-1] + chunk_bytes > field_budget or name in parts_fields[-1]:
+                parts_fields.append({})
+                parts_bytes.append(0)
+
+            parts_fields[-1][name] = chunk
+            parts_bytes[-1] += chunk_bytes
+
+    parts = []
+    for index, fields in enumerate(parts_fields):
+        part = _part_of(event, {**identity, **fields, _PART_FIELD: index + 1, _PARTS_FIELD: len(parts_fields)})
+        parts.append((part, _batch_event_size(part)))
+
+    return parts
+
+
+def _chunks(name: str, value, field_budget: int) -> List:
+    if encoded_size({name: value}) <= field_budget:
+        return [value]
+
+    text = value if isinstance(value, str) else json.dumps(value)
+    chunks = []
+    while text:
+        # Escaping may take more than a byte per character, the longest prefix that fits is looked up
+        length = len(text)
+        while length > 1 and encoded_size({name: text[:length]}) > field_budget:
+            length = max(1, length * 3 // 4)
+
+        chunks.append(text[:length])
+        text = text[length:]
+
+    return chunks
+
+
+def _part_of(event: ProfileEvent, data: dict) -> ProfileEvent:
+    part = ProfileEvent(raw_data=data, headers=event.headers)
+    part.set_ordinal(event.ordinal())
+    return part
+
+
+def _batch_event_size(event: ProfileEvent) -> int:
+    return encoded_size(BatchEvent(dt=_ts_ms(event), f=event).to_bi_schema())
+
+
+def _ts_ms(event: ProfileEvent) -> int:
+    timestamp = event.timestamp_milli()
+    return timestamp if timestamp is not None and timestamp >= 0 else 0
+
+
+def _histogram(values: List[int], bounds: tuple, unit: str = "", scale: int = 1) -> str:
+    counts = [0] * (len(bounds) + 1)
+    for value in values:
+        index = 0
+        while index < len(bounds) and value > bounds[index]:
+            index += 1
+        counts[index] += 1
+
+    labels = ["<={}{}".format(bound // scale, unit) for bound in bounds] + [">{}{}".format(bounds[-1] // scale, unit)]
+    return ", ".join("{}: {}".format(label, count) for label, count in zip(labels, counts) if count)
@@ -3,7 +3,7 @@ import socket
 import logging
 
 from bazelwrapper.bi.profiles_processor import process_profiles
-from bazelwrapper.context import create_cli_context, config_dir, create_logger
+from bazelwrapper.context import Context, create_cli_context, config_dir, create_logger
 from bazelwrapper.utils.logging import daily_log_file_handler
 from bazelwrapper.utils.pidlock import Lock
 
@@ -35,6 +35,29 @@ def _on_process_lock_failed(locker_pid):
     exit(LOCK_FAILURE_EXIT_CODE)
 
 
+class ReporterBusyError(Exception):
+    def __init__(self, pid: int):
+        super().__init__("The BI reporter lock is held by pid={pid}".format(pid=pid))
+        self.pid = pid
+
+
+def report(ctx: Context):
+    """
+    Processes the ready profiles in the calling process, under the same lock as the reporter script.
+    """
+    def on_lock_failed(locker_pid):
+        raise ReporterBusyError(locker_pid)
+
+    lock_file_path = os.path.join(config_dir(), ".reporter.lock")
+    with Lock(file_path=lock_file_path, on_failure=on_lock_failed, auto_refresh=True):
+        ctx.logger.info("Reporter starting...")
+
+        try:
+            process_profiles(ctx)
+        finally:
+            ctx.logger.info("Reporter finished.")
+
+
 def main():
     # The reason we're creating the main logger here, is to make sure it is initialized for any code that might be using
     # utils.logging.get_default_logger(), like the LockMaintainer thread..
@@ -1,6 +1,7 @@
 import gzip
 import json
 import os
+import threading
 from typing import List
 from urllib.parse import urlencode, quote
 
@@ -179,6 +180,105 @@ class client(http_client):
         return is_successful
 
 
+class BatchResult:
+    def __init__(self, event_count: int, is_successful: bool):
+        self.event_count = event_count
+        self.is_successful = is_successful
+
+
+class batch_uploader:
+    """
+    A context manager style uploader that keeps up to 'in_flight' batches on the wire at once, so reporting is bound by
+    the number of batches in flight rather than by the round-trip time of every single batch.
+
+    Every upload thread keeps its own keep-alive connection, see 'bazelwrapper.utils.simple_http_client'. Batches are
+    submitted in processing order and their results are collected in completion order, 'submit' blocks while the limit
+    is reached.
+    """
+
+    def __init__(self, in_flight: int, timeout=_DEFAULT_HTTP_CONNECTION_TIMEOUT):
+        from concurrent.futures import ThreadPoolExecutor
+
+        self._in_flight = max(1, in_flight)
+        self._timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=self._in_flight, thread_name_prefix="frog")
+        self._pending = []
+        # Completed while 'submit' waited for a free slot, not collected yet
+        self._completed = []
+        self._local = threading.local()
+        self._clients = []  # type: List[client]
+        self._clients_lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._executor.shutdown(wait=True)
+
+        for frog_client in self._clients:
+            frog_client.__exit__(None, None, None)
+
+        # An exception of the body propagates as is
+        return False
+
+    def submit(self, batch: Batch, event_count: int, use_gzip=False):
+        if len(self._pending) >= self._in_flight:
+            from concurrent.futures import wait, FIRST_COMPLETED
+
+            done, not_done = wait(self._pending, return_when=FIRST_COMPLETED)
+            # Kept in submission order, the completed ones are collected by the next 'completed' call
+            self._completed.extend(future for future in self._pending if future in done)
+            self._pending = [future for future in self._pending if future in not_done]
+
+        self._pending.append(self._executor.submit(self._upload, batch, event_count, use_gzip))
+
+    def completed(self) -> List[BatchResult]:
+        """
+        The results of the batches that completed since the last call.
+        """
+        # A single pass, a future that completes meanwhile is either done or still pending, never lost
+        done, pending = self._completed, []
+        for future in self._pending:
+            (done if future.done() else pending).append(future)
+        self._completed, self._pending = [], pending
+
+        return [future.result() for future in done]
+
+    def drain(self) -> List[BatchResult]:
+        """
+        Waits for all the batches in flight, returns their results.
+        """
+        pending = self._completed + self._pending
+        self._completed, self._pending = [], []
+
+        return [future.result() for future in pending]
+
+    def _upload(self, batch: Batch, event_count: int, use_gzip: bool) -> BatchResult:
+        frog_client = self._thread_client()
+        try:
+            is_successful = frog_client.post_batch(batch=batch, use_gzip=use_gzip)
+        except Exception as err:
+            get_default_logger().warn("Failed to send a batch of {count} events. Error: {error}".format(
+                count=event_count, error=err))
+            # The connection may be left in the middle of a request, the next batch opens a new one
+            frog_client.__exit__(None, None, None)
+            self._local.client = None
+            with self._clients_lock:
+                self._clients.remove(frog_client)
+            is_successful = False
+
+        return BatchResult(event_count=event_count, is_successful=is_successful)
+
+    def _thread_client(self) -> "client":
+        frog_client = getattr(self._local, "client", None)
+        if frog_client is None:
+            frog_client = self._local.client = client(timeout=self._timeout)
+            with self._clients_lock:
+                self._clients.append(frog_client)
+
+        return frog_client
+
+
 def _bi_payload_for(event: BiEvent):
     return {
         'src': event.meta.source_id,
@@ -3,10 +3,12 @@ import json
 import os
 import time
 from os import path, listdir
-from typing import Generator
+from typing import Generator, Iterator
 
+from bazelwrapper.bi.profile_stream import iter_trace_events, read_other_data
 from bazelwrapper.context import Context
 from bazelwrapper.utils.env_vars import non_empty_env_var_value
+from bazelwrapper.utils.tracing import wrapper_trace_path_for
 
 PROFILE_INFO_FILE_EXTENSION = "info"
 PROFILE_FILE_EXTENSION = "prof.gz"
@@ -19,6 +21,10 @@ _PENDING_PROFILE_FILE_NAME_SUFFIX = "." + PENDING_PROFILE_FILE_EXTENSION
 
 _DEVEX_PROFILES_PATH_ENV_VAR_NAME = "WIX_DEVEX_BI_PROFILES_PATH"
 
+_COPY_CHUNK_SIZE = 1024 * 1024
+# Large enough to hold the closing brackets of the profile and any trailing whitespace
+_TAIL_SIZE = 64
+
 
 def profiles_dir_path(ctx: Context):
     def default(c):
@@ -64,6 +70,7 @@ class Profile:
         self.info_file_path = "{filepath}.{ext}".format(filepath=_info_filepath, ext=PROFILE_INFO_FILE_EXTENSION)
         self._info = info
         self._data = data
+        self._other_data = None
 
     def is_ready(self) -> bool:
         return self.file_path.endswith(_PROFILE_FILE_NAME_SUFFIX) and \
@@ -86,16 +93,85 @@ class Profile:
         return self._info
 
     def data(self):
+        """
+        The whole profile document. Prefer 'trace_events' and 'build_id', which never load it.
+        """
         if self._data is None:
             self._data = _load_json_file(self.file_path)
 
         return self._data
 
-    def trace_events(self):
-        return self.data()["traceEvents"]
+    def trace_events(self) -> Iterator[dict]:
+        """
+        The trace events, streamed from the profile file one at a time unless the document was given.
+        """
+        if self._data is not None:
+            return iter(self._data["traceEvents"])
+
+        return iter_trace_events(self.file_path)
 
     def build_id(self):
-        return self.data()["otherData"]["build_id"]
+        if self._data is not None:
+            return self._data["otherData"]["build_id"]
+
+        if self._other_data is None:
+            self._other_data = read_other_data(self.file_path)
+
+        return self._other_data["build_id"]
+
+
+def merge_wrapper_trace(profile: Profile, ctx: Context) -> bool:
+    """
+    Appends the wrapper trace events recorded next to the profile (see 'bazelwrapper.utils.tracing') to its trace
+    events. The profile is copied in chunks, only the closing brackets are looked at, so large profiles are never loaded
+    into memory.
+    """
+    trace_path = wrapper_trace_path_for(profile.file_path)
+    if not path.isfile(trace_path):
+        return False
+
+    try:
+        with open(trace_path) as trace_file:
+            events = json.load(trace_file)["traceEvents"]
+
+        if not events:
+            return False
+
+        # Events are separated by a comma and a newline, like bazel writes them
+        serialized_events = ",\n".join(json.dumps(event) for event in events).encode("utf-8")
+
+        merged_path = profile.file_path + ".merging"
+        with gzip.open(profile.file_path, "rb") as source, gzip.open(merged_path, "wb") as target:
+            tail = b""
+            while True:
+                chunk = source.read(_COPY_CHUNK_SIZE)
+                if not chunk:
+                    break
+
+                data = tail + chunk
+                target.write(data[:-_TAIL_SIZE])
+                tail = data[-_TAIL_SIZE:]
+
+            # The profile ends with the trace events array and the closing bracket of the root object: ']}'
+            body = tail.rstrip()
+            if not body.endswith(b"]}"):
+                raise ValueError("Unexpected profile ending: {}".format(tail))
+
+            events_end = body[:-2].rstrip()
+            separator = b"" if events_end.endswith(b"[") else b",\n"
+            target.write(events_end + separator + serialized_events + b"\n]}")
+
+        os.replace(merged_path, profile.file_path)
+        ctx.logger.debug("Merged {count} wrapper trace events into '{path}'".format(
+            count=len(events), path=profile.file_path))
+
+        return True
+
+    finally:
+        # A trace that could not be merged is not retried
+        os.remove(trace_path)
+        if path.exists(profile.file_path + ".merging"):
+            os.remove(profile.file_path + ".merging")
 
 
 def list_all_by_mtime(ctx: Context) -> Generator:
@@ -1,4 +1,5 @@
 from bazelwrapper.bi import frog
+from bazelwrapper.bi.batch_packer import BatchPacker
 from bazelwrapper.bi.profile import Profile
 from bazelwrapper.bi.schema import ProfileEventBatch, bi_events_of, ProfileEvent, StatsEvent, micros_to_millis
 from bazelwrapper.context import Context
@@ -19,11 +20,20 @@ _no_batch_api = Flag(
 # backend (after their enrichment!) will not pass through to grafana, because the BI system uses UDP to dispatch events
 # and batches to the relevant sub-systems and that poses a technical limitation on the message size.
 #
-# Testing with Bazel trace events, 50 seems to work nicely most of the time and 100 is sometimes edgy. The size of a
-# batch depends on the size of the data of course, so keep that in mind before changing and experiment with your
-# specific data.
+# Batches are therefore packed by their encoded size (see 'bazelwrapper.bi.batch_packer'), up to the limit divided by
+# the enrichment factor. Testing with Bazel trace events, 50 events per batch seemed to work nicely most of the time and
+# 100 was sometimes edgy, which is about a third of the limit before enrichment. The number of events is capped as well.
 _DEVEX_FROG_BATCH_SIZE_ENV_VAR_NAME = "WIX_DEVEX_FROG_BATCH_SIZE"
-_FROG_DEFAULT_BATCH_SIZE = "50"
+_FROG_DEFAULT_BATCH_SIZE = "200"
+
+_DEVEX_FROG_BATCH_MAX_BYTES_ENV_VAR_NAME = "WIX_DEVEX_FROG_BATCH_MAX_BYTES"
+_FROG_DEFAULT_BATCH_MAX_BYTES = str(64 * 1024)
+_DEVEX_FROG_BATCH_ENRICHMENT_FACTOR_ENV_VAR_NAME = "WIX_DEVEX_FROG_BATCH_ENRICHMENT_FACTOR"
+_FROG_DEFAULT_BATCH_ENRICHMENT_FACTOR = "3"
+
+# Batches sent concurrently, each over its own keep-alive connection. 1 sends the batches one after the other.
+_DEVEX_FROG_IN_FLIGHT_BATCHES_ENV_VAR_NAME = "WIX_DEVEX_FROG_IN_FLIGHT_BATCHES"
+_FROG_DEFAULT_IN_FLIGHT_BATCHES = "4"
 
 
 def process(profile: Profile, ctx: Context):
@@ -33,14 +43,19 @@ def process(profile: Profile, ctx: Context):
     ctx.logger.debug("Frog batch API disabled? {}".format(no_batch))
     batch_size = _frog_batch_size(ctx)
     ctx.logger.debug("Frog batch size is set to? {}".format(batch_size))
+    batch_byte_budget = _frog_batch_byte_budget(ctx)
+    ctx.logger.debug("Frog batch byte budget is set to? {}".format(batch_byte_budget))
+    in_flight_batches = _frog_in_flight_batches(ctx)
+    ctx.logger.debug("Frog batches in flight are limited to? {}".format(in_flight_batches))
     ctx.logger.info("Processing profile for build_id='{}'".format(profile.build_id()))
 
     success_count = 0
     total_count = 0
-    with frog.client() as frog_client:
+    with frog.client() as frog_client, frog.batch_uploader(in_flight=in_flight_batches) as uploader:
         stats = StatsEventHandler(frog_client=frog_client, use_gzip=use_gzip)
         raw_handler = raw_event_handler(
-            frog_client=frog_client, use_batch=not no_batch, use_gzip=use_gzip, batch_size=batch_size)
+            frog_client=frog_client, use_batch=not no_batch, use_gzip=use_gzip, batch_size=batch_size,
+            batch_byte_budget=batch_byte_budget, uploader=uploader)
 
         for profile_event in bi_events_of(profile):
             if _should_report(profile_event):
@@ -77,10 +92,11 @@ class ProfileEventMatcher:
                event.phase() == self.phase
 
 
-def raw_event_handler(frog_client, use_batch, use_gzip, batch_size):
+def raw_event_handler(frog_client, use_batch, use_gzip, batch_size, batch_byte_budget, uploader):
     if use_batch:
         raw_handler = RawBatchEventHandler(
-            frog_client=frog_client, use_gzip=use_gzip, batch_size=batch_size)
+            frog_client=frog_client, use_gzip=use_gzip, batch_size=batch_size, batch_byte_budget=batch_byte_budget,
+            uploader=uploader)
     else:
         raw_handler = RawEventHandler(frog_client=frog_client, use_gzip=use_gzip)
 
@@ -109,35 +125,56 @@ class RawEventHandler:
 
 
 class RawBatchEventHandler(RawEventHandler):
-
-    def __init__(self, frog_client, use_gzip, batch_size):
+    """
+    Sends the events in batches, packed by their encoded size, through a pipelined uploader. Ordinals are assigned in
+    processing order, before an event is packed, so the order in which batches complete does not matter. 'process' and
+    'flush' return the number of events of the batches that were sent successfully since the previous call. A split
+    event is counted once, by the batch of its first part (the parts share the ordinal of the event).
+    """
+
+    def __init__(self, frog_client, use_gzip, batch_size, batch_byte_budget, uploader: frog.batch_uploader):
         super().__init__(frog_client, use_gzip)
         self.ordinal = 0
-        self._batch_events = []
-        self._batch_size = batch_size
+        self._packer = BatchPacker(byte_budget=batch_byte_budget, max_events=batch_size)
+        self._uploader = uploader
+        self._last_batch_ordinal = None
 
     def process(self, event: ProfileEvent, ctx: Context):
         event.set_ordinal(self._next_ordinal())
-        self._batch_events.append(event)
-        return self._send_batch(force=False, ctx=ctx)
+        for batch_events in self._packer.add(event):
+            self._send_batch(batch_events)
+
+        return self._sent_events(self._uploader.completed(), ctx)
 
     def flush(self, ctx: Context):
-        return self._send_batch(force=True, ctx=ctx)
+        for batch_events in self._packer.flush():
+            self._send_batch(batch_events)
 
-    def _send_batch(self, force, ctx):
-        current_batch_size = len(self._batch_events)
+        for line in self._packer.histogram_lines():
+            ctx.logger.info(line)
 
-        if current_batch_size > 0 and (force or current_batch_size == self._batch_size):
-            batch = ProfileEventBatch.create(events=self._batch_events)
-            self._batch_events = []
-            if self.frog_client.post_batch(
-                    batch=batch,
-                    use_gzip=self.use_gzip
-            ):
-                ctx.logger.debug("Batch sent successfully (size={})".format(current_batch_size))
-                return current_batch_size
+        return self._sent_events(self._uploader.drain(), ctx)
 
-        return 0
+    def _send_batch(self, batch_events):
+        # The parts of a split event are consecutive, a batch may only start with the continuation of the previous one
+        ordinals = set(event.ordinal() for event in batch_events)
+        ordinals.discard(self._last_batch_ordinal)
+        self._last_batch_ordinal = batch_events[-1].ordinal()
+
+        batch = ProfileEventBatch.create(events=batch_events)
+        self._uploader.submit(batch=batch, event_count=len(ordinals), use_gzip=self.use_gzip)
+
+    @staticmethod
+    def _sent_events(results, ctx):
+        sent_events = 0
+        for result in results:
+            if result.is_successful:
+                ctx.logger.debug("Batch sent successfully (size={})".format(result.event_count))
+                sent_events += result.event_count
+            else:
+                ctx.logger.debug("Batch failed (size={})".format(result.event_count))
+
+        return sent_events
 
 
 class StatsEventHandler:
@@ -233,6 +270,35 @@ def _should_report(event: ProfileEvent):
     return event.phase() != "C"
 
 
+def _frog_batch_byte_budget(ctx: Context):
+    max_bytes = int(
+        non_empty_env_var_value(
+            name=_DEVEX_FROG_BATCH_MAX_BYTES_ENV_VAR_NAME,
+            default_fn=lambda x: _FROG_DEFAULT_BATCH_MAX_BYTES,
+            ctx=ctx
+        )
+    )
+    enrichment_factor = float(
+        non_empty_env_var_value(
+            name=_DEVEX_FROG_BATCH_ENRICHMENT_FACTOR_ENV_VAR_NAME,
+            default_fn=lambda x: _FROG_DEFAULT_BATCH_ENRICHMENT_FACTOR,
+            ctx=ctx
+        )
+    )
+
+    return int(max_bytes / enrichment_factor)
+
+
+def _frog_in_flight_batches(ctx: Context):
+    return int(
+        non_empty_env_var_value(
+            name=_DEVEX_FROG_IN_FLIGHT_BATCHES_ENV_VAR_NAME,
+            default_fn=lambda x: _FROG_DEFAULT_IN_FLIGHT_BATCHES,
+            ctx=ctx
+        )
+    )
+
+
 def _frog_batch_size(ctx: Context):
     return int(
         non_empty_env_var_value(
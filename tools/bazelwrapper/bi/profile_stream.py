@@ -0,0 +1,161 @@
+import gzip
+import json
+from typing import Any, Generator, Tuple
+
+#
+# Incremental parsing of bazel JSON trace profiles.
+#
+# A profile of a large build holds millions of trace events. Rather than loading the whole document, the decompressed
+# stream is read in fixed-size chunks and the members of the root object are decoded one at a time. The trace events
+# are yielded one by one, so only a single event (and a chunk of text) is held in memory at any time:
+#   {"otherData": {"build_id": "...", ...}, "traceEvents": [{...}, {...}, ...]}
+#
+
+_CHUNK_SIZE = 256 * 1024
+
+_TRACE_EVENTS_KEY = "traceEvents"
+_OTHER_DATA_KEY = "otherData"
+
+_WHITESPACE = " \t\n\r"
+
+
+class ProfileFormatError(ValueError):
+    pass
+
+
+def iter_trace_events(file_path: str, chunk_size: int = _CHUNK_SIZE) -> Generator[dict, None, None]:
+    for key, value in _iter_members(file_path, chunk_size):
+        if key == _TRACE_EVENTS_KEY:
+            yield value
+
+
+def read_other_data(file_path: str, chunk_size: int = _CHUNK_SIZE) -> dict:
+    """
+    The 'otherData' object of the profile. Bazel writes it first, so the trace events are usually not even read.
+    """
+    for key, value in _iter_members(file_path, chunk_size):
+        if key == _OTHER_DATA_KEY:
+            return value
+
+    raise ProfileFormatError("'{}' has no '{}'".format(file_path, _OTHER_DATA_KEY))
+
+
+def _open_text(file_path: str):
+    if file_path.endswith(".gz"):
+        return gzip.open(file_path, "rt", encoding="utf-8")
+
+    return open(file_path, encoding="utf-8")
+
+
+def _iter_members(file_path: str, chunk_size: int) -> Generator[Tuple[str, Any], None, None]:
+    """
+    Yields a (key, value) pair per member of the root object, and a ('traceEvents', event) pair per trace event.
+    """
+    with _open_text(file_path) as text_file:
+        scanner = _Scanner(text_file, chunk_size)
+
+        scanner.expect("{")
+        if scanner.peek() == "}":
+            return
+
+        while True:
+            key = scanner.decode()
+            scanner.expect(":")
+
+            if key == _TRACE_EVENTS_KEY:
+                for event in scanner.iter_array():
+                    yield key, event
+            else:
+                yield key, scanner.decode()
+
+            char = scanner.next_char()
+            if char == "}":
+                return
+            if char != ",":
+                raise ProfileFormatError("Expected ',' or '}}' but found '{}'".format(char))
+
+
+class _Scanner:
+    """
+    A window over the text stream. Values are decoded from the window, which is refilled when a value does not fit.
+    """
+
+    def __init__(self, text_file, chunk_size: int):
+        self._file = text_file
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def peek(self) -> str:
+        self._skip_whitespace()
+        if self._pos >= len(self._buffer):
+            raise ProfileFormatError("Unexpected end of profile")
+
+        return self._buffer[self._pos]
+
+    def next_char(self) -> str:
+        char = self.peek()
+        self._pos += 1
+        return char
+
+    def expect(self, expected: str):
+        char = self.next_char()
+        if char != expected:
+            raise ProfileFormatError("Expected '{}' but found '{}'".format(expected, char))
+
+    def decode(self) -> Any:
+        self._skip_whitespace()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError as err:
+                if self._eof:
+                    raise ProfileFormatError("Malformed profile: {}".format(err)) from err
+                self._fill()
+                continue
+
+            # A number at the end of the window may continue in the next chunk
+            if end == len(self._buffer) and not self._eof:
+                self._fill()
+                continue
+
+            self._pos = end
+            return value
+
+    def iter_array(self) -> Generator[Any, None, None]:
+        self.expect("[")
+        if self.peek() == "]":
+            self._pos += 1
+            return
+
+        while True:
+            yield self.decode()
+
+            char = self.next_char()
+            if char == "]":
+                return
+            if char != ",":
+                raise ProfileFormatError("Expected ',' or ']' but found '{}'".format(char))
+
+    def _skip_whitespace(self):
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE:
+                self._pos += 1
+
+            if self._pos < len(self._buffer) or self._eof:
+                return
+
+            self._fill()
+
+    def _fill(self):
+        # Drops what was already consumed, the window never grows beyond the largest value and a chunk
+        self._buffer = self._buffer[self._pos:]
+        self._pos = 0
+
+        chunk = self._file.read(self._chunk_size)
+        if chunk:
+            self._buffer += chunk
+        else:
+            self._eof = True
@@ -1,9 +1,10 @@
 import os
 from os import path
 
-from bazelwrapper.bi.profile import Profile, list_all_by_mtime
+from bazelwrapper.bi.profile import Profile, list_all_by_mtime, merge_wrapper_trace
 from bazelwrapper.bi.profile_reporter import process
 from bazelwrapper.context import Context
+from bazelwrapper.utils.tracing import wrapper_trace_path_for
 
 
 def _delete(profile: Profile, ctx: Context):
@@ -17,6 +18,10 @@ def _delete(profile: Profile, ctx: Context):
         last_profile_path = last_command_profile_info_path_for("last.command.prof.gz")
         os.replace(src=profile.file_path, dst=last_profile_path)
 
+    wrapper_trace_path = wrapper_trace_path_for(profile.file_path)
+    if path.exists(wrapper_trace_path):
+        os.remove(wrapper_trace_path)
+
     if path.exists(profile.info_file_path):
         ctx.logger.debug("Deleting profile info file: {path}".format(path=profile.info_file_path))
 
@@ -25,6 +30,12 @@ def _delete(profile: Profile, ctx: Context):
 
 
 def _process(profile: Profile, ctx: Context):
+    try:
+        merge_wrapper_trace(profile, ctx)
+    except Exception as e:
+        ctx.logger.warning("Failed to merge the wrapper trace into '{file_path}'. {err}".format(
+            file_path=profile.file_path, err=e))
+
     try:
         process(profile, ctx)
 
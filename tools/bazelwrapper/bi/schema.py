@@ -4,7 +4,9 @@ from typing import List, Optional, Generator
 from bazelwrapper.bi.frog import EventMeta, BiEvent, Batch, BatchEvent
 from bazelwrapper.bi.profile import Profile
 from bazelwrapper.context import Context
+from bazelwrapper.env import console
 from bazelwrapper.env.info import build_info_snapshot
+from bazelwrapper.env.resources import BazelResourceUsage, CLIENT_FIELD_NAMES, SERVER_FIELD_NAMES
 
 LOCAL_DEVEX_PROJECT_NAME = "local-devex"
 DEVEX_SOURCE_ID = 119
@@ -33,6 +35,7 @@ VMR_REPO_RULE_TYPE_NAME = "vmr_repo_rule_type"
 VMR_BUILD_POST_INVALIDATION_NAME = "vmr_build_post_invalidation"
 VMR_VECTOR_MODE_NAME = "vmr_vector_mode"
 REMOTE_CACHE_PROVIDER = "remote_cache_provider"
+REMOTE_CACHE_CIRCUIT = "remote_cache_circuit"
 
 _TIMESTAMP_FIELD_NAME = "{prefix}ts".format(prefix=PROFILE_EVENT_FIELD_PREFIX)
 _TIMESTAMP_MS_FIELD_NAME = 'ts_ms'
@@ -90,6 +93,9 @@ class ProfileEvent(BiEvent):
     def set_ordinal(self, ordinal: int):
         self._ordinal = ordinal
 
+    def ordinal(self) -> int:
+        return self._ordinal
+
     def to_bi_schema(self, include_headers=True):
         # The ordinal filed must be set before sending the event and reflect the order of processed events, excluding
         # filtered events. The sequence of ordinal values must not have holes in it - this is how we know we got
@@ -108,6 +114,10 @@ class ProfileEvent(BiEvent):
 
 
 def bi_events_of(profile: Profile) -> Generator[ProfileEvent, None, None]:
+    """
+    The BI events of the profile, in the order of its trace events. The trace events are streamed from the profile
+    file, so the memory in use does not depend on the size of the profile.
+    """
     header_fields = _prepare_header_fields(profile)
 
     ordinal = 0
@@ -117,9 +127,14 @@ def bi_events_of(profile: Profile) -> Generator[ProfileEvent, None, None]:
 
 
 def build_event_info_with(bazel_exit_code: int, ctx: Context):
+    usage = ctx.bazel_resource_usage if ctx.bazel_resource_usage is not None else BazelResourceUsage()
+
     return {
         EXIT_CODE_FIELD_NAME: bazel_exit_code,
-        **build_info_snapshot(ctx)
+        **build_info_snapshot(ctx),
+        **usage.fields(),
+        # Only parsed when the console relay is on, see 'bazelwrapper.env.console'
+        **(ctx.bazel_console_summary or {name: None for name in console.FIELD_NAMES}),
     }
 
 
@@ -130,7 +145,7 @@ def validate_info_schema(profile: Profile):
     """
     info = profile.info()
 
-    assert len(info) == 21
+    assert len(info) == 22 + len(CLIENT_FIELD_NAMES) + len(SERVER_FIELD_NAMES) + len(console.FIELD_NAMES)
     assert "timestamp" in info and isinstance(info["timestamp"], float)
     assert BUILD_COMMAND_FIELD_NAME in info and isinstance(info[BUILD_COMMAND_FIELD_NAME], str)
     assert BUILD_COMMAND_TARGETS_FIELD_NAME in info and isinstance(info[BUILD_COMMAND_TARGETS_FIELD_NAME], str)
@@ -152,6 +167,14 @@ def validate_info_schema(profile: Profile):
     assert VMR_BUILD_POST_INVALIDATION_NAME in info and isinstance(info[VMR_BUILD_POST_INVALIDATION_NAME], bool)
     assert VMR_VECTOR_MODE_NAME in info and isinstance(info[VMR_VECTOR_MODE_NAME], str)
     assert REMOTE_CACHE_PROVIDER in info and isinstance(info[REMOTE_CACHE_PROVIDER], str)
+    # None when the command did not use the remote cache
+    assert REMOTE_CACHE_CIRCUIT in info and (info[REMOTE_CACHE_CIRCUIT] is None or
+                                             isinstance(info[REMOTE_CACHE_CIRCUIT], str))
+    # Not available when bazel did not run through the wrapper, or on platforms without /proc (server fields)
+    for field_name in CLIENT_FIELD_NAMES + SERVER_FIELD_NAMES:
+        assert field_name in info and (info[field_name] is None or isinstance(info[field_name], (int, float)))
+    for field_name in console.FIELD_NAMES:
+        assert field_name in info and (info[field_name] is None or isinstance(info[field_name], (int, float, str)))
 
 
 class ProfileEventBatch:
@@ -4,11 +4,8 @@ from typing import List, Optional
 
 from bazelwrapper.bi.profile import PROFILE_INFO_FILE_EXTENSION, \
     profiles_dir_path, pending_profile_path_for, profile_path
-from bazelwrapper.bi.schema import build_event_info_with
 from bazelwrapper.context import Context
 from bazelwrapper.utils.feature_flags import Flag
-from bazelwrapper.utils.subproc_launcher import PySubprocessLauncher
-from bazelwrapper.bi.entrypoint import main as run_reporter
 
 _APPLICABLE_COMMANDS = ['build', 'test', 'run', 'clean']
 
@@ -27,26 +24,26 @@ _bi_noreporter_flag = Flag(
 )
 
 
-def resolve_profile_flags(ctx: Context) -> List[str]:
-    def is_bi_enabled() -> bool:
-        return _bi_flag.on(ctx)
+def is_profiling_applicable(ctx: Context) -> bool:
+    return _bi_flag.on(ctx) and \
+        ctx.bazel_command() in _APPLICABLE_COMMANDS and \
+        not _is_user_request_profile(ctx)
 
-    if is_bi_enabled() and \
-            ctx.bazel_command() in _APPLICABLE_COMMANDS and \
-            not _is_user_request_profile(ctx.user_args):
 
-        os.makedirs(profiles_dir_path(ctx), exist_ok=True)
-        if ctx.profile_path_override:
-            profile_file = ctx.profile_path_override
-        else:
-            profile_file = pending_profile_path_for(profile_path(ctx))
-
-        return [
-            "--profile=" + profile_file,
-            "--experimental_profile_include_target_label"
-        ]
+def profile_flags(ctx: Context) -> List[str]:
+    """
+    The profile path is unique per invocation, so these flags are never cached (see 'bazelwrapper.flagscache').
+    """
+    os.makedirs(profiles_dir_path(ctx), exist_ok=True)
+    if ctx.profile_path_override:
+        profile_file = ctx.profile_path_override
     else:
-        return []
+        profile_file = pending_profile_path_for(profile_path(ctx))
+
+    return [
+        "--profile=" + profile_file,
+        "--experimental_profile_include_target_label"
+    ]
 
 
 def maybe_create_profile_info_file(bazel_exit_code: int, ctx: Context) -> Optional[str]:
@@ -68,19 +65,19 @@ def maybe_create_profile_info_file(bazel_exit_code: int, ctx: Context) -> Option
 def start_bi_reporter(ctx: Context, run_sync: bool):
     if _bi_noreporter_flag.off(ctx):
         if run_sync:
+            from bazelwrapper.bi.entrypoint import main as run_reporter
             run_reporter() # runs the reporter script main function directly
         else:
-            _launch_bi_reporter(ctx) # creates a subprocess that runs the reporter script
-            
+            _enqueue_bi_report(ctx) # the detached job worker runs the reporter after the wrapper exits
+
     else:
         ctx.logger.debug("BI reporter is disabled and will not be executed.")
 
-def _launch_bi_reporter(ctx: Context):
-    launcher = PySubprocessLauncher(
-        title="BI reporter",
-        main_py_script_path=os.path.join(ctx.workspace_dir, 'tools', 'reporter')
-    )
-    launcher.launch(ctx)
+def _enqueue_bi_report(ctx: Context):
+    from bazelwrapper.jobs import queue, worker
+
+    queue.enqueue(ctx, worker.JOB_BI_REPORT)
+    worker.start_worker(ctx)
 
 
 def _create_build_info_file(prof_path: str, bazel_exit_code: int, ctx: Context):
@@ -88,15 +85,14 @@ def _create_build_info_file(prof_path: str, bazel_exit_code: int, ctx: Context):
 
     ctx.logger.debug("Creating env info snapshot file '{path}'".format(path=path))
 
+    # The BI schema pulls in the frog HTTP client, which is only needed when a profile was actually recorded
+    from bazelwrapper.bi.schema import build_event_info_with
+
     with open(path, "w") as file:
         build_info = build_event_info_with(bazel_exit_code, ctx)
 
         json.dump(build_info, file, indent=2)
 
 
-def _is_user_request_profile(user_args):
-    for arg in user_args:
-        if arg.startswith('--profile='):
-            return True
-
-    return False
+def _is_user_request_profile(ctx: Context):
+    return ctx.command_line.has_option("--profile")
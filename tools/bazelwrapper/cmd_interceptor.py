@@ -7,10 +7,19 @@ _PERSONAL_DASHBOARD_URL_TEMPLATE = \
     "https://grafana.wixpress.com/d/jASkdh9Zk/my-bazel-experience-dashboard?" \
     "var-env_id={env_id}"
 
+_DASHBOARD_COMMAND = "dashboard"
+# Keep in sync with 'bazelwrapper.env.outputbases', which is only imported when the command runs
+_RECLAIM_OUTPUT_BASES_COMMAND = "reclaim-output-bases"
+
+# Commands that are handled by the wrapper itself and never reach bazel. Keep in sync with 'cmdline.BAZEL_COMMANDS'.
+INTERCEPTED_COMMANDS = frozenset({_DASHBOARD_COMMAND, _RECLAIM_OUTPUT_BASES_COMMAND})
+
 
 def intercept_command(ctx: Context):
-    if ctx.bazel_command() == "dashboard":
+    if ctx.bazel_command() == _DASHBOARD_COMMAND:
         _handle_dashboard_command(ctx)
+    elif ctx.bazel_command() == _RECLAIM_OUTPUT_BASES_COMMAND:
+        _handle_reclaim_output_bases_command(ctx)
 
 
 def _handle_dashboard_command(ctx):
@@ -27,3 +36,10 @@ def _handle_dashboard_command(ctx):
         ctx.logger.info("Please open {url}".format(url=url))
 
     exit(0)
+
+
+def _handle_reclaim_output_bases_command(ctx):
+    from bazelwrapper.env.outputbases import handle_reclaim_command
+
+    handle_reclaim_command(ctx)
+    exit(0)
@@ -0,0 +1,342 @@
+from typing import Dict, List, Optional, Set
+
+#
+# A single-pass parser of the bazel command line the wrapper receives.
+#
+# The command line is split into startup options, the command, command options, targets and residual args (everything
+# after '--'), and indexed once so the wrapper components can query it without rescanning the args.
+#
+
+# Bazel commands (see 'bazel help'), including the commands the wrapper handles itself (see 'cmd_interceptor')
+BAZEL_COMMANDS = frozenset({
+    "analyze-profile",
+    "aquery",
+    "build",
+    "canonicalize-flags",
+    "clean",
+    "config",
+    "coverage",
+    "cquery",
+    "dump",
+    "fetch",
+    "help",
+    "info",
+    "license",
+    "mobile-install",
+    "modquery",
+    "print_action",
+    "query",
+    "run",
+    "shutdown",
+    "sync",
+    "test",
+    "version",
+    # wrapper commands
+    "dashboard",
+    "reclaim-output-bases",
+})
+
+# Startup options that take a value, which may be passed as a separate arg ('--output_base /path')
+_STARTUP_OPTIONS_WITH_VALUE = frozenset({
+    "--bazelrc",
+    "--connect_timeout_secs",
+    "--digest_function",
+    "--failure_detail_out",
+    "--host_jvm_args",
+    "--host_jvm_profile",
+    "--install_base",
+    "--install_md5",
+    "--io_nice_level",
+    "--local_startup_timeout_secs",
+    "--macos_qos_class",
+    "--max_idle_secs",
+    "--output_base",
+    "--output_user_root",
+    "--server_javabase",
+    "--server_jvm_out",
+    "--unix_digest_hash_attribute_name",
+})
+
+# Command options that take a value, which may be passed as a separate arg ('--config ci'). Options that are not listed
+# here are assumed to be either boolean or passed as '--name=value'.
+_COMMAND_OPTIONS_WITH_VALUE = frozenset({
+    "-c",
+    "-j",
+    "--action_env",
+    "--aspects",
+    "--bes_backend",
+    "--bes_header",
+    "--bes_instance_name",
+    "--bes_keywords",
+    "--bes_results_url",
+    "--bes_timeout",
+    "--build_event_binary_file",
+    "--build_event_json_file",
+    "--build_event_text_file",
+    "--build_tag_filters",
+    "--color",
+    "--compilation_mode",
+    "--config",
+    "--copt",
+    "--cpu",
+    "--curses",
+    "--cxxopt",
+    "--define",
+    "--disk_cache",
+    "--distdir",
+    "--embed_label",
+    "--execution_log_binary_file",
+    "--execution_log_json_file",
+    "--extra_toolchains",
+    "--flaky_test_attempts",
+    "--genrule_strategy",
+    "--google_credentials",
+    "--host_action_env",
+    "--host_cpu",
+    "--host_platform",
+    "--instrumentation_filter",
+    "--invocation_id",
+    "--java_language_version",
+    "--java_runtime_version",
+    "--javacopt",
+    "--jobs",
+    "--jvmopt",
+    "--linkopt",
+    "--local_cpu_resources",
+    "--local_ram_resources",
+    "--local_test_jobs",
+    "--memory_profile",
+    "--output",
+    "--output_groups",
+    "--override_repository",
+    "--package_path",
+    "--platforms",
+    "--profile",
+    "--query_file",
+    "--remote_cache",
+    "--remote_download_outputs",
+    "--remote_executor",
+    "--remote_header",
+    "--remote_instance_name",
+    "--remote_timeout",
+    "--repo_env",
+    "--repository_cache",
+    "--run_under",
+    "--runs_per_test",
+    "--sandbox_add_mount_pair",
+    "--sandbox_tmpfs_path",
+    "--sandbox_writable_path",
+    "--script_path",
+    "--show_result",
+    "--spawn_strategy",
+    "--starlark_cpu_profile",
+    "--strategy",
+    "--symlink_prefix",
+    "--target_pattern_file",
+    "--test_arg",
+    "--test_env",
+    "--test_filter",
+    "--test_output",
+    "--test_strategy",
+    "--test_summary",
+    "--test_tag_filters",
+    "--test_timeout",
+    "--tls_client_certificate",
+    "--tls_client_key",
+    "--tool_java_runtime_version",
+    "--tool_tag",
+    "--ui_event_filters",
+    "--universe_scope",
+    "--workspace_status_command",
+    "--worker_max_instances",
+})
+
+_RESIDUAL_SEPARATOR = "--"
+
+# Options of the wrapper itself, see 'bazelwrapper.context.WixFlags'
+WRAPPER_OPTION_PREFIX = "--wix"
+
+
+class CommandLine:
+    """
+    A parsed bazel command line.
+
+    Options are kept as the tokens they were given in (a separate value is kept as a separate token), and are indexed by
+    their normalized '--name=value' / '--name' form.
+    """
+
+    def __init__(self, args: List[str]):
+        self.args = list(args)
+
+        self.startup_options = []  # type: List[str]
+        self.command = None  # type: Optional[str]
+        self.command_options = []  # type: List[str]
+        self.positionals = []  # type: List[str]
+        self.residual = []  # type: List[str]
+        # Wrapper options ('--wix_*') are never passed on to bazel
+        self.wrapper_options = []  # type: List[str]
+
+        self._command_index = None  # type: Optional[int]
+        self._normalized_options = set()  # type: Set[str]
+        self._option_values = {}  # type: Dict[str, List[str]]
+
+        self._parse()
+
+    def has_arg(self, arg: str) -> bool:
+        """
+        True if the given option (e.g. '--config=ci' or '--keep_going') or wrapper option was passed.
+        """
+        return arg in self._normalized_options
+
+    def has_option(self, name: str) -> bool:
+        return name in self._option_values
+
+    def option_values(self, name: str) -> List[str]:
+        return self._option_values.get(name, [])
+
+    def option_value(self, name: str) -> Optional[str]:
+        """
+        The value of the last occurrence of the option, like bazel does.
+        """
+        values = self._option_values.get(name)
+        return values[-1] if values else None
+
+    @property
+    def targets(self) -> List[str]:
+        if self.command == "run":
+            # Everything after '--' is passed to the binary
+            return self.positionals[:1]
+
+        return self.positionals + self.residual
+
+    def with_command_flags(self, flags) -> List[str]:
+        """
+        The args to pass on to bazel: the wrapper options are dropped and the given flags are injected right after the
+        command, so the user's own options take precedence.
+        """
+        if self._command_index is None:
+            return [arg for arg in self.args if not _is_wrapper_option(arg)]
+
+        before = self.args[:self._command_index]
+        after = self.args[self._command_index + 1:]
+
+        return [
+            *(arg for arg in before if not _is_wrapper_option(arg)),
+            self.args[self._command_index],
+            *flags,
+            *_without_wrapper_options(after),
+        ]
+
+    def _parse(self):
+        args = self.args
+        count = len(args)
+
+        self._command_index = _find_command_index(args)
+        startup_end = self._command_index if self._command_index is not None else count
+
+        # Startup options, up to the command
+        index = 0
+        while index < startup_end:
+            arg = args[index]
+            if _is_wrapper_option(arg):
+                self._add_wrapper_option(arg)
+            elif _is_option(arg):
+                index = self._add_option(index, self.startup_options, _STARTUP_OPTIONS_WITH_VALUE, end=startup_end)
+            else:
+                # The separate value of a startup option the wrapper does not know
+                self.startup_options.append(arg)
+            index += 1
+
+        if self._command_index is None:
+            return
+
+        self.command = args[self._command_index].lower()
+
+        # Command options and targets, up to '--'
+        index = self._command_index + 1
+        while index < count:
+            arg = args[index]
+            if arg == _RESIDUAL_SEPARATOR:
+                self.residual = args[index + 1:]
+                break
+            elif _is_wrapper_option(arg):
+                self._add_wrapper_option(arg)
+            elif _is_option(arg):
+                index = self._add_option(index, self.command_options, _COMMAND_OPTIONS_WITH_VALUE, end=count)
+            else:
+                self.positionals.append(arg)
+            index += 1
+
+    def _add_wrapper_option(self, arg: str):
+        self.wrapper_options.append(arg)
+        self._normalized_options.add(arg)
+
+    def _add_option(self, index: int, options: List[str], options_with_value, end: int) -> int:
+        """
+        Records the option at the given index and returns the index of its last token.
+        """
+        arg = self.args[index]
+        options.append(arg)
+
+        if "=" in arg:
+            name, value = arg.split("=", 1)
+        elif arg in options_with_value and index + 1 < end:
+            name, value = arg, self.args[index + 1]
+            options.append(value)
+            index += 1
+        else:
+            name, value = arg, None
+
+        if value is None:
+            self._normalized_options.add(name)
+        else:
+            self._normalized_options.add("{}={}".format(name, value))
+
+        self._option_values.setdefault(name, [])
+        if value is not None:
+            self._option_values[name].append(value)
+
+        return index
+
+
+def parse_command_line(args: List[str]) -> CommandLine:
+    return CommandLine(args)
+
+
+def _find_command_index(args: List[str]) -> Optional[int]:
+    """
+    The index of the first known command, skipping the values of startup options. Falls back to the first arg that is
+    not an option (e.g. a misspelled command, which bazel reports), like bazel does.
+    """
+    first_positional = None
+    skip_value = False
+
+    for index, arg in enumerate(args):
+        if skip_value:
+            skip_value = False
+        elif _is_option(arg):
+            skip_value = arg in _STARTUP_OPTIONS_WITH_VALUE
+        elif arg in BAZEL_COMMANDS:
+            return index
+        elif first_positional is None:
+            first_positional = index
+
+    return first_positional
+
+
+def _is_option(arg: str) -> bool:
+    # '-//foo' is a negative target pattern rather than an option
+    return arg.startswith("-") and len(arg) > 1 and not arg.startswith("-/")
+
+
+def _is_wrapper_option(arg: str) -> bool:
+    return arg.startswith(WRAPPER_OPTION_PREFIX)
+
+
+def _without_wrapper_options(args: List[str]) -> List[str]:
+    # Args passed to a binary after '--' are kept as they are
+    if _RESIDUAL_SEPARATOR in args:
+        separator = args.index(_RESIDUAL_SEPARATOR)
+        return [arg for arg in args[:separator] if not _is_wrapper_option(arg)] + args[separator:]
+
+    return [arg for arg in args if not _is_wrapper_option(arg)]
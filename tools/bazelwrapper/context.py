@@ -1,20 +1,16 @@
 from logging import Logger
 import logging
 import os
-import platform
 import sys
-import tempfile
-from uuid import uuid4
 from typing import List, Optional
-from pathlib import Path
 
-from bazelwrapper.utils.list_utils import split_after
+from bazelwrapper.cmdline import CommandLine, WRAPPER_OPTION_PREFIX, parse_command_line
 from bazelwrapper.utils.logging import create_logger
 
 
 #  underscore flags notation follows bazel's practice
 class WixFlags:
-    PREFIX = "--wix"
+    PREFIX = WRAPPER_OPTION_PREFIX
     DEBUG = "{prefix}_debug".format(prefix=PREFIX)
     BI_REPORTER_RUN_SYNC = "{prefix}_bi_reporter_run_sync".format(prefix=PREFIX)
     PROFILE_PATH_OVERRIDE = "{prefix}_profile_path_override".format(prefix=PREFIX)
@@ -23,6 +19,8 @@ _BYPASSED_COMMANDS = {"version", "shutdown"}
 
 _WIXTALLER_CONFIG_DIR_PATH = ".config/wix/wixtaller"
 _WRAPPER_CONFIG_DIR_PATH = ".config/wix/bazelwrapper"
+# Build event files of the wrapper's invocations, relative to the wrapper config dir
+_BEP_DIR_NAME = "bep"
 
 _CONFIG_BASE_DIR = os.path.expanduser(
     os.getenv("WIX_DEVEX_CONFIG_BASE_DIR", "~")
@@ -43,20 +41,22 @@ class Context:
     def __init__(self,
                  user_args: List[str],
                  config_base_dir=_CONFIG_BASE_DIR,
-                 system_name=platform.system(),
+                 system_name=os.uname().sysname,
                  workspace_dir=None,
                  debug=False,
                  bypassed_commands=None,
                  logger: Optional[Logger]=None,
                  bi_reporter_run_sync: bool=True,
                  profile_path_override: Optional[str]=None,
-                 bep_file_path: Optional[str]=None):
+                 bep_file_path: Optional[str]=None,
+                 command_line: Optional[CommandLine]=None):
         if bypassed_commands is None:
             bypassed_commands = _BYPASSED_COMMANDS
 
         log_level = logging.DEBUG if debug else logging.INFO
         self.logger = logger if logger is not None else create_logger(log_level)
         self.user_args = user_args
+        self.command_line = command_line if command_line is not None else parse_command_line(user_args)
         self.config_base_dir = config_base_dir
         self.gcloud_creds_filepath = os.path.expanduser(_GCLOUD_CREDS_FILEPATH)
         self.buildbuddy_api_key_filepath = os.path.expanduser(_BUILDBUDDY_API_KEY_FILEPATH)
@@ -67,40 +67,58 @@ class Context:
         self.workspace_dir = workspace_dir
         self.wixtaller_config_dir = os.path.join(self.config_base_dir, _WIXTALLER_CONFIG_DIR_PATH)
         self.config_dir = config_dir(config_base_dir)
-        self._bazel_command = self._find_bazel_command()
-        self.is_bypassed_command = bypassed_commands.__contains__(self._bazel_command)
+        self.is_bypassed_command = bypassed_commands.__contains__(self.command_line.command)
         self.bi_reporter_run_sync = bi_reporter_run_sync
-        self.unique_id = str(uuid4())
+        self._unique_id = None
+        self._flag_snapshot = None
         self.profile_path_override = profile_path_override
-        self.bep_file_path = bep_file_path
+        # The user's '--build_event_binary_file' when given, otherwise a per-invocation file created on first use
+        self._bep_file_path = bep_file_path
+        self.owns_bep_file = bep_file_path is None
+        # Set by the wrapper once bazel ran, see 'bazelwrapper.env.resources' and 'bazelwrapper.env.console'
+        self.bazel_resource_usage = None
+        self.bazel_console_summary = None
+        # Set by the wrapper when the build events were followed while bazel ran, see 'bazelwrapper.bep.live'
+        self.build_summary = None
+        # Set by the wrapper once the build events were followed, the final counters of 'bazelwrapper.bep.live'
+        self.live_build_status = None
+        # Set by the wrapper once the remote cache circuit was checked, see 'bazelwrapper.remotecache.circuit'
+        self.remote_cache_circuit = None
 
         if self.is_bypassed_command:
             self.logger.debug("This command is expected to be bypassed by the wrapper.")
 
+    @property
+    def unique_id(self) -> str:
+        # Generated on first use, most commands (e.g. 'version', 'info', 'query') never need one
+        if self._unique_id is None:
+            from uuid import uuid4
+            self._unique_id = str(uuid4())
+
+        return self._unique_id
+
+    @property
+    def bep_file_path(self) -> str:
+        if self._bep_file_path is None:
+            self._bep_file_path = os.path.join(self.config_dir, _BEP_DIR_NAME, "{}.bes".format(self.unique_id))
+
+        return self._bep_file_path
+
+    @property
+    def flag_snapshot(self):
+        # Taken on first use, so the config dir is listed once per invocation rather than once per flag evaluation
+        if self._flag_snapshot is None:
+            from bazelwrapper.utils.feature_flags import FlagSnapshot
+            self._flag_snapshot = FlagSnapshot(self)
+
+        return self._flag_snapshot
+
     def bazel_command(self) -> Optional[str]:
-        if self._bazel_command:
-            return self._bazel_command.lower()
-        else:
-            return self._bazel_command
-
-    # BUG: given "bazel --option option_value build //...", it will take "option_value" as the bazel command. It should take "build".
-    # The problem is that you cannot distinguish beetwen flags and options.
-    # Option to fix this is: have a static list of all the build commands and match it with that, and then fallback to this value of not found.
-    def _find_bazel_command(self):
-        # finding the first argument that is not a flag
-        for arg in self.user_args:
-            if not arg.startswith("--"):
-                return arg
-
-        return None
-
-    # BUG: given "bazel build //... --option option_value ", it will take "//..." and "option_value"
-    # The problem is that you cannot distinguish beetwen flags and options.
-    # Option to fix this is: have a static list of all the build commands and match it with that?
+        return self.command_line.command
+
     def bazel_command_targets(self):
         if self.bazel_command() in ("build", "test"):
-            after_command = list(split_after(self.user_args, lambda v: v == self.bazel_command()))[-1]
-            return [arg for arg in after_command if not arg.startswith("--")]
+            return self.command_line.targets
         return []
 
 def config_dir(config_base_dir=_CONFIG_BASE_DIR):
@@ -110,15 +128,8 @@ def _extract_profile_path_override(user_args: List[str]):
     # PROFILE_PATH_OVERRIDE is in the form of --wix_profile_path_override=<path>
     return _extract_property_value(WixFlags.PROFILE_PATH_OVERRIDE, user_args)
 
-def _extract_bep_file_path(user_args: List[str]):
-    bep_file = _extract_property_value('build_event_binary_file', user_args, False)
-
-    if bep_file is None:
-        bep_file_dir = tempfile.gettempdir()
-        bep_file_name = tempfile.gettempprefix()
-        bep_file = Path(bep_file_dir, bep_file_name).with_suffix(".bes")
-
-    return bep_file
+def _extract_bep_file_path(command_line: CommandLine) -> Optional[str]:
+    return command_line.option_value("--build_event_binary_file")
 
 def _extract_property_value(name, user_args, remove_arg=True):
     property_value = next((arg for arg in user_args if name in arg), None)
@@ -128,12 +139,18 @@ def _extract_property_value(name, user_args, remove_arg=True):
         property_value = property_value.split("=")[1]
     return property_value
 
-def create_cli_context(logger=None):
-    user_args = sys.argv[1:]
-    debug = WixFlags.DEBUG in user_args
+def create_cli_context(logger=None, user_args: Optional[List[str]]=None, workspace_dir: Optional[str]=None):
+    if user_args is None:
+        user_args = sys.argv[1:]
+    if workspace_dir is None:
+        workspace_dir = resolve_workspace_dir()
+
+    debug = is_debug_requested(user_args)
     bi_reporter_run_sync = WixFlags.BI_REPORTER_RUN_SYNC in user_args
     profile_path_override = _extract_profile_path_override(user_args)
-    bep_file_path = _extract_bep_file_path(user_args)
+    # Parsed once the wrapper-only args were removed
+    command_line = parse_command_line(user_args)
+    bep_file_path = _extract_bep_file_path(command_line)
 
     if profile_path_override and not profile_path_override.endswith(".prof.gz"):
         # this was done because bi profile processor needs the file to end with .prof.gz :/
@@ -142,11 +159,12 @@ def create_cli_context(logger=None):
     ctx = Context(
         user_args=user_args,
         debug=debug,
-        workspace_dir=_resolve_workspace_dir(),
+        workspace_dir=workspace_dir,
         logger=logger,
         bi_reporter_run_sync=bi_reporter_run_sync,
         profile_path_override=profile_path_override,
-        bep_file_path=bep_file_path
+        bep_file_path=bep_file_path,
+        command_line=command_line
     )
 
     ensure_directories(ctx)
@@ -159,16 +177,17 @@ def ensure_directories(ctx):
         .format(name=ctx.config_base_dir)
 
     os.makedirs(ctx.config_dir, exist_ok=True)
+    os.makedirs(os.path.join(ctx.config_dir, _BEP_DIR_NAME), exist_ok=True)
     os.makedirs(ctx.wixtaller_config_dir, exist_ok=True)
 
 
-def _resolve_workspace_dir() -> str:
-    current_dir = os.getcwd()
-    ws_dir = current_dir
-    while ws_dir != "/":
-        if os.path.exists(os.path.join(ws_dir, "WORKSPACE")):
-            return ws_dir
-        else:
-            ws_dir = os.path.abspath(os.path.join(ws_dir, os.pardir))
+def is_debug_requested(user_args: List[str]) -> bool:
+    return WixFlags.DEBUG in user_args
+
+
+def resolve_workspace_dir(current_dir: Optional[str]=None) -> str:
+    if current_dir is None:
+        current_dir = os.getcwd()
 
-    return ws_dir
+    from bazelwrapper.env.workspace_metadata import find_workspace_dir
+    return find_workspace_dir(current_dir, config_dir())
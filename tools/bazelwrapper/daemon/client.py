@@ -0,0 +1,64 @@
+import os
+import socket
+import sys
+
+from bazelwrapper.daemon import protocol
+
+#
+# IMPORTANT:
+# This is the thin client of the wrapper daemon. It runs before the wrapper itself is imported and must return quickly
+# when the daemon is not running, so the wrapper can fall back to the in-process flow.
+#
+
+_DAEMON_DISABLED_ENV_VAR_NAME = "WIX_BAZEL_WRAPPER_DAEMON_DISABLED"
+
+_CLIENT_TIMEOUT_SEC = 2.0
+
+
+def try_exec_via_daemon(user_args=None):
+    """
+    Asks the wrapper daemon for the final bazel command and environment and replaces the current process with it.
+    Returns only if the daemon is not available or declined to handle the invocation.
+    """
+    if os.environ.get(_DAEMON_DISABLED_ENV_VAR_NAME):
+        return
+
+    path = protocol.socket_path()
+    if not os.path.exists(path):
+        return
+
+    if user_args is None:
+        user_args = sys.argv[1:]
+
+    try:
+        response = _request(path, {
+            "version": protocol.PROTOCOL_VERSION,
+            "user_args": user_args,
+            "cwd": os.getcwd(),
+            "env": dict(os.environ),
+        })
+    except (OSError, ValueError):
+        return  # daemon is down, stale socket, timeout or a garbled response
+
+    if response.get("status") != protocol.STATUS_EXEC:
+        return
+
+    messages = response.get("messages")
+    if messages:
+        sys.stderr.write(messages)
+        sys.stderr.flush()
+
+    command = response["command"]
+    try:
+        os.execve(command[0], command, response["env"])
+    except OSError:
+        return
+
+
+def _request(path, message: dict) -> dict:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(_CLIENT_TIMEOUT_SEC)
+        sock.connect(path)
+        protocol.send_message(sock, message)
+
+        return protocol.receive_message(sock)
@@ -0,0 +1,55 @@
+import hashlib
+import json
+import os
+import socket
+
+#
+# IMPORTANT:
+# This module is imported by the thin daemon client before anything else. Keep its imports minimal.
+#
+
+PROTOCOL_VERSION = 1
+
+# Kept in sync with 'bazelwrapper.context.config_dir', which is not imported here in order to keep the client thin
+_CONFIG_BASE_DIR_ENV_VAR_NAME = "WIX_DEVEX_CONFIG_BASE_DIR"
+_WRAPPER_CONFIG_DIR_PATH = ".config/wix/bazelwrapper"
+
+_MAX_MESSAGE_SIZE = 8 * 1024 * 1024
+
+STATUS_EXEC = "exec"
+STATUS_FALLBACK = "fallback"
+
+# The directory that contains the 'bazelwrapper' package, e.g. '<workspace>/tools'
+TOOLS_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+
+def socket_path(tools_dir=TOOLS_DIR) -> str:
+    """
+    Each checkout runs its own daemon, since the wrapper code may differ between checkouts.
+    """
+    config_base_dir = os.path.expanduser(os.getenv(_CONFIG_BASE_DIR_ENV_VAR_NAME, "~"))
+    tools_dir_hash = hashlib.md5(tools_dir.encode("utf-8")).hexdigest()[:12]
+
+    return os.path.join(config_base_dir, _WRAPPER_CONFIG_DIR_PATH, "wrapperd-{}.sock".format(tools_dir_hash))
+
+
+def send_message(sock: socket.socket, message: dict):
+    sock.sendall(json.dumps(message).encode("utf-8") + b"\n")
+
+
+def receive_message(sock: socket.socket) -> dict:
+    chunks = []
+    size = 0
+    while True:
+        chunk = sock.recv(64 * 1024)
+        if not chunk:
+            break
+
+        chunks.append(chunk)
+        size += len(chunk)
+        if chunk.endswith(b"\n"):
+            break
+        if size > _MAX_MESSAGE_SIZE:
+            raise ValueError("Message is too large")
+
+    return json.loads(b"".join(chunks).decode("utf-8"))
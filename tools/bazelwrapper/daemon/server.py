@@ -0,0 +1,259 @@
+import io
+import logging
+import os
+import socket
+import sys
+from contextlib import contextmanager
+
+from bazelwrapper.cmd_interceptor import INTERCEPTED_COMMANDS
+from bazelwrapper.context import config_dir, create_cli_context, create_logger, is_debug_requested, \
+    resolve_workspace_dir
+from bazelwrapper.daemon import protocol
+from bazelwrapper.fastpath import is_fast_path
+from bazelwrapper.utils.logging import daily_log_file_handler
+from bazelwrapper.utils.pidlock import Lock
+from bazelwrapper.wrapper import prepare_fast_path_command
+
+LOCK_FAILURE_EXIT_CODE = 3
+
+_IDLE_TIMEOUT_ENV_VAR_NAME = "WIX_BAZEL_WRAPPER_DAEMON_IDLE_TIMEOUT_SEC"
+_DEFAULT_IDLE_TIMEOUT_SEC = 3 * 60 * 60
+
+# A single client is served at a time, the request itself is expected to take a few milliseconds
+_REQUEST_TIMEOUT_SEC = 5.0
+
+_REQUEST_LOGGER_NAME = "bazelwrapper.daemon.request"
+
+# Packages whose code is loaded by the daemon. The daemon exits once any of their sources change, so the next
+# invocation falls back to the in-process flow until the daemon is restarted with the new code.
+_SOURCE_PACKAGES = ("bazelwrapper", "virtualmonorepo")
+
+
+def _create_file_logger(name: str):
+    logs_dir = os.path.join(config_dir(), "logs")
+    os.makedirs(logs_dir, exist_ok=True)
+    log_path = os.path.join(logs_dir, name)
+    log_level = os.environ.get("WIX_BAZEL_WRAPPER_DAEMON_LOG_LEVEL") or "INFO"
+
+    return create_logger(level=logging.getLevelName(log_level), handler=daily_log_file_handler(log_path=log_path))
+
+
+def _on_process_lock_failed(locker_pid):
+    print("The wrapper daemon is already running (pid={pid}).".format(pid=locker_pid), file=sys.stderr)
+    exit(LOCK_FAILURE_EXIT_CODE)
+
+
+class _MtimeCache:
+    """
+    Caches a value derived from a file and recomputes it once the file modification time changes.
+    """
+
+    def __init__(self, load):
+        self._load = load
+        self._entries = {}
+
+    def get(self, path):
+        mtime = _mtime_or_none(path)
+
+        entry = self._entries.get(path)
+        if entry is not None and entry[0] == mtime:
+            return entry[1]
+
+        value = self._load(path)
+        self._entries[path] = (mtime, value)
+
+        return value
+
+
+class WrapperDaemon:
+    def __init__(self, logger: logging.Logger, idle_timeout_sec: float):
+        self._logger = logger
+        self._idle_timeout_sec = idle_timeout_sec
+        self._socket_path = protocol.socket_path()
+        self._workspace_dirs = {}
+        self._custom_build_env_variables = _MtimeCache(_load_custom_build_env_variables)
+        self._source_mtimes = _source_mtimes()
+        # Created once, the log level names are re-formatted every time a logger is created
+        self._request_logger = create_logger(logging.INFO, name=_REQUEST_LOGGER_NAME)
+
+    def serve_forever(self):
+        self._remove_socket_file()
+
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            # The response contains the user environment, including secrets. The socket is created owner-only, so no
+            # other user can connect between its creation and a later chmod.
+            umask = os.umask(0o177)
+            try:
+                server.bind(self._socket_path)
+            finally:
+                os.umask(umask)
+            server.listen(16)
+            server.settimeout(self._idle_timeout_sec)
+
+            self._logger.info("Wrapper daemon is listening on {path}".format(path=self._socket_path))
+
+            while True:
+                try:
+                    connection, _ = server.accept()
+                except socket.timeout:
+                    self._logger.info("No requests for {}s. Exiting...".format(self._idle_timeout_sec))
+                    return
+
+                with connection:
+                    self._handle_connection(connection)
+
+                if self._sources_changed():
+                    self._logger.info("Wrapper sources have changed. Exiting...")
+                    return
+        finally:
+            server.close()
+            self._remove_socket_file()
+
+    def _handle_connection(self, connection: socket.socket):
+        connection.settimeout(_REQUEST_TIMEOUT_SEC)
+
+        try:
+            request = protocol.receive_message(connection)
+            response = self._handle_request(request)
+        except Exception as ex:
+            self._logger.exception(ex)
+            response = _fallback("error")
+
+        try:
+            protocol.send_message(connection, response)
+        except OSError as ex:
+            self._logger.warning("Failed to send a response. Error: {error}".format(error=ex))
+
+    def _handle_request(self, request: dict) -> dict:
+        if request.get("version") != protocol.PROTOCOL_VERSION:
+            return _fallback("protocol version mismatch")
+
+        user_args = request["user_args"]
+        cwd = request["cwd"]
+
+        with _request_environment(request["env"], cwd):
+            # A different config base dir means the invocation belongs to another daemon
+            if protocol.socket_path() != self._socket_path:
+                return _fallback("config base dir mismatch")
+
+            # The client prints the request log messages before running bazel
+            stream = io.StringIO()
+            self._request_logger.setLevel(logging.DEBUG if is_debug_requested(user_args) else logging.INFO)
+            for handler in self._request_logger.handlers:
+                handler.setStream(stream)
+
+            ctx = create_cli_context(
+                logger=self._request_logger,
+                user_args=list(user_args),
+                workspace_dir=self._workspace_dir(cwd)
+            )
+
+            if ctx.bazel_command() in INTERCEPTED_COMMANDS or not is_fast_path(ctx):
+                return _fallback("not a fast path command")
+
+            ctx.logger.debug("Running bazel command on the fast path (wrapper daemon).")
+
+            env_file_path = os.path.join(ctx.config_base_dir, ".bazelbuildenv.json")
+            prepared = prepare_fast_path_command(
+                ctx,
+                resolve_vector=False,
+                custom_build_env_variables=self._custom_build_env_variables.get(env_file_path)
+            )
+            if prepared is None:
+                return _fallback("the VMR vector should be resolved")
+
+            bazel_command, env = prepared
+            self._logger.debug("Serving '{command}' for {cwd}".format(command=ctx.bazel_command(), cwd=cwd))
+
+            return {
+                "status": protocol.STATUS_EXEC,
+                "command": bazel_command,
+                "env": env,
+                "messages": stream.getvalue(),
+            }
+
+    def _workspace_dir(self, cwd) -> str:
+        workspace_dir = self._workspace_dirs.get(cwd)
+        if workspace_dir is None or not os.path.exists(os.path.join(workspace_dir, "WORKSPACE")):
+            workspace_dir = resolve_workspace_dir(cwd)
+            self._workspace_dirs[cwd] = workspace_dir
+
+        return workspace_dir
+
+    def _sources_changed(self) -> bool:
+        return _source_mtimes() != self._source_mtimes
+
+    def _remove_socket_file(self):
+        try:
+            os.remove(self._socket_path)
+        except FileNotFoundError:
+            pass
+
+
+@contextmanager
+def _request_environment(env: dict, cwd: str):
+    """
+    The wrapper reads the process environment and working directory in many places, so the client's ones are swapped in
+    for the duration of the request.
+    """
+    original_env = dict(os.environ)
+    original_cwd = os.getcwd()
+
+    os.environ.clear()
+    os.environ.update(env)
+    try:
+        os.chdir(cwd)
+        yield
+    finally:
+        os.chdir(original_cwd)
+        os.environ.clear()
+        os.environ.update(original_env)
+
+
+def _fallback(reason: str) -> dict:
+    return {"status": protocol.STATUS_FALLBACK, "reason": reason}
+
+
+def _load_custom_build_env_variables(path) -> dict:
+    import json
+
+    try:
+        with open(path) as env_file:
+            return json.load(env_file)
+    except FileNotFoundError:
+        return {}
+
+
+def _mtime_or_none(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _source_mtimes() -> dict:
+    mtimes = {}
+    for package in _SOURCE_PACKAGES:
+        for root, _, files in os.walk(os.path.join(protocol.TOOLS_DIR, package)):
+            for name in files:
+                if name.endswith(".py"):
+                    path = os.path.join(root, name)
+                    mtimes[path] = _mtime_or_none(path)
+
+    return mtimes
+
+
+def main():
+    logger = _create_file_logger("wrapperd.log")
+
+    idle_timeout_sec = float(os.environ.get(_IDLE_TIMEOUT_ENV_VAR_NAME, _DEFAULT_IDLE_TIMEOUT_SEC))
+
+    socket_path = protocol.socket_path()
+    os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+
+    with Lock(file_path=socket_path + ".lock", on_failure=_on_process_lock_failed, auto_refresh=True):
+        try:
+            WrapperDaemon(logger, idle_timeout_sec).serve_forever()
+        except Exception as ex:
+            logger.exception(ex)
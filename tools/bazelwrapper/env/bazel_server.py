@@ -0,0 +1,109 @@
+import hashlib
+import os
+import subprocess
+from typing import List, Optional
+
+from bazelwrapper.bazelcommand import bazel_startup_args, build_server_warmup_command
+from bazelwrapper.cmdline import parse_command_line
+from bazelwrapper.context import Context
+from bazelwrapper.utils.feature_flags import Flag
+
+_SERVER_PID_FILE_PATH = "server/server.pid.txt"
+
+# Commands that run on the bazel server and are worth warming it up for
+_WARMUP_COMMANDS = {"build", "test", "run", "coverage", "query", "cquery", "aquery", "fetch", "sync"}
+
+# A cascading flag to turn off the speculative bazel server start
+_server_warmup_disabled_flag = Flag(
+    full_cli_flag="--wix_nowarmup",
+    marker_file_name=".nowarmup",
+    env_var_name="WIX_BAZEL_WRAPPER_SERVER_WARMUP_DISABLED",
+    default_value=False,
+)
+
+
+def warm_up_server(ctx: Context, env: dict, timeout_sec: float):
+    """
+    Starts the bazel server of the current output base when it is not running yet, so the JVM start overlaps with the
+    wrapper's other preparation steps (e.g. VMR vector resolution) instead of following them.
+    """
+    if ctx.is_bypassed_command or \
+            ctx.bazel_command() not in _WARMUP_COMMANDS or \
+            _server_warmup_disabled_flag.on(ctx):
+        return
+
+    startup_args = bazel_startup_args(ctx)
+    if "--batch" in startup_args:
+        return  # no server in batch mode
+
+    if is_server_running(ctx, startup_args):
+        ctx.logger.debug("Bazel server is already running, skipping the warm-up.")
+        return
+
+    ctx.logger.debug("Bazel server is not running, starting it while the wrapper prepares the command.")
+
+    # Waiting for the server to be up, otherwise the main command would report that it waits for another command
+    subprocess.run(
+        args=build_server_warmup_command(ctx),
+        env=env,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        timeout=timeout_sec,
+    )
+
+
+def output_user_root(ctx: Context, startup_args: List[str]) -> str:
+    explicit = _startup_option_value("--output_user_root", startup_args)
+    if explicit:
+        return os.path.expanduser(explicit)
+
+    import pwd
+    user_name = pwd.getpwuid(os.getuid()).pw_name
+
+    # Following bazel's defaults
+    if ctx.system_name == "Darwin":
+        return "/private/var/tmp/_bazel_{}".format(user_name)
+
+    return os.path.expanduser("~/.cache/bazel/_bazel_{}".format(user_name))
+
+
+def output_base(ctx: Context, startup_args: List[str]) -> str:
+    explicit = _startup_option_value("--output_base", startup_args)
+    if explicit:
+        return os.path.expanduser(explicit)
+
+    # Bazel names the default output base after the md5 of the workspace real path
+    workspace_hash = hashlib.md5(os.path.realpath(ctx.workspace_dir).encode("utf-8")).hexdigest()
+    return os.path.join(output_user_root(ctx, startup_args), workspace_hash)
+
+
+def server_pid(ctx: Context, startup_args: List[str]) -> Optional[int]:
+    """
+    Returns the pid of the bazel server of the output base, or None when it is not running.
+    """
+    pid_file_path = os.path.join(output_base(ctx, startup_args), _SERVER_PID_FILE_PATH)
+
+    try:
+        with open(pid_file_path) as pid_file:
+            pid = int(pid_file.read().strip())
+    except (OSError, ValueError):
+        return None
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return None
+    except PermissionError:
+        pass  # exists, owned by another user
+
+    return pid
+
+
+def is_server_running(ctx: Context, startup_args: List[str]) -> bool:
+    return server_pid(ctx, startup_args) is not None
+
+
+def _startup_option_value(name: str, startup_args: List[str]) -> Optional[str]:
+    # Handles both the '--name=value' and the '--name value' forms, the last occurrence wins as in bazel
+    return parse_command_line(startup_args).option_value(name)
@@ -0,0 +1,271 @@
+import os
+import re
+import sys
+import threading
+from typing import Optional
+
+from bazelwrapper.context import Context
+from bazelwrapper.utils.feature_flags import Flag
+
+#
+# An optional relay of the bazel console output that extracts the summary lines bazel prints (processes by strategy and
+# cache hits, elapsed and critical path times, total actions) into the BI info snapshot, so cache hit metrics are
+# reported even when profiling is off.
+#
+# Only stderr is relayed, it is where bazel prints its UI. stdout (e.g. query results, 'run' output) is left untouched.
+# When stderr is a terminal, bazel gets a pseudo terminal of the same size, so colors and the curses progress bar are
+# kept.
+#
+
+# A cascading flag to turn on the console relay
+_console_summary_flag = Flag(
+    full_cli_flag="--wix_console_summary",
+    marker_file_name=".consolesummary",
+    env_var_name="WIX_BAZEL_WRAPPER_CONSOLE_SUMMARY_ENABLED",
+    default_value=False,
+)
+
+TOTAL_PROCESSES_FIELD_NAME = "console_total_processes"
+REMOTE_CACHE_HITS_FIELD_NAME = "console_remote_cache_hits"
+DISK_CACHE_HITS_FIELD_NAME = "console_disk_cache_hits"
+PROCESSES_BREAKDOWN_FIELD_NAME = "console_processes_breakdown"
+ELAPSED_TIME_SEC_FIELD_NAME = "console_elapsed_time_sec"
+CRITICAL_PATH_SEC_FIELD_NAME = "console_critical_path_sec"
+TOTAL_ACTIONS_FIELD_NAME = "console_total_actions"
+
+FIELD_NAMES = (
+    TOTAL_PROCESSES_FIELD_NAME,
+    REMOTE_CACHE_HITS_FIELD_NAME,
+    DISK_CACHE_HITS_FIELD_NAME,
+    PROCESSES_BREAKDOWN_FIELD_NAME,
+    ELAPSED_TIME_SEC_FIELD_NAME,
+    CRITICAL_PATH_SEC_FIELD_NAME,
+    TOTAL_ACTIONS_FIELD_NAME,
+)
+
+_READ_SIZE = 64 * 1024
+
+# The summary lines are short, longer lines (e.g. a test log) are not kept in full
+_MAX_PENDING_LINE_LENGTH = 4096
+
+# How long the relay drains the output after the bazel client exited
+_DRAIN_TIMEOUT_SEC = 2.0
+
+_LINE_SEPARATOR = re.compile(rb"[\r\n]")
+_ANSI_ESCAPE_SEQUENCE = re.compile(rb"\x1b\[[0-9;?]*[ -/]*[@-~]")
+
+# INFO: 1234 processes: 567 remote cache hit, 89 internal, 578 linux-sandbox.
+_PROCESSES_LINE = re.compile(r"^INFO: ([\d,]+) process(?:es)?: (.*?)\.?$")
+_PROCESSES_ENTRY = re.compile(r"^([\d,]+) (.+)$")
+# INFO: Elapsed time: 12.345s, Critical Path: 6.78s
+_ELAPSED_TIME_LINE = re.compile(r"^INFO: Elapsed time: ([\d.]+)s(?:, Critical Path: ([\d.]+)s)?")
+# INFO: Build completed successfully, 5 total actions
+_TOTAL_ACTIONS_LINE = re.compile(r"^INFO: Build completed.*?([\d,]+) total actions?")
+
+
+def is_console_summary_enabled(ctx: Context) -> bool:
+    return _console_summary_flag.on(ctx)
+
+
+class ConsoleSummaryParser:
+    """
+    Parses the console output incrementally, as it is relayed. Only lines that contain 'INFO:' are decoded.
+    """
+
+    def __init__(self):
+        self.fields = {name: None for name in FIELD_NAMES}
+        self._pending = b""
+
+    def feed(self, data: bytes):
+        lines = _LINE_SEPARATOR.split(self._pending + data)
+        self._pending = lines.pop()
+        if len(self._pending) > _MAX_PENDING_LINE_LENGTH:
+            self._pending = b""
+
+        for line in lines:
+            if b"INFO:" in line:
+                self._parse_line(line)
+
+    def close(self):
+        if b"INFO:" in self._pending:
+            self._parse_line(self._pending)
+        self._pending = b""
+
+    def _parse_line(self, raw_line: bytes):
+        line = _ANSI_ESCAPE_SEQUENCE.sub(b"", raw_line).decode("utf-8", errors="replace").strip()
+
+        match = _PROCESSES_LINE.match(line)
+        if match:
+            self._on_processes(_to_int(match.group(1)), match.group(2))
+            return
+
+        match = _ELAPSED_TIME_LINE.match(line)
+        if match:
+            self.fields[ELAPSED_TIME_SEC_FIELD_NAME] = float(match.group(1))
+            if match.group(2) is not None:
+                self.fields[CRITICAL_PATH_SEC_FIELD_NAME] = float(match.group(2))
+            return
+
+        match = _TOTAL_ACTIONS_LINE.match(line)
+        if match:
+            self.fields[TOTAL_ACTIONS_FIELD_NAME] = _to_int(match.group(1))
+
+    def _on_processes(self, total: int, entries: str):
+        breakdown = {}
+        for entry in entries.split(", "):
+            match = _PROCESSES_ENTRY.match(entry.strip())
+            if match:
+                breakdown[match.group(2)] = _to_int(match.group(1))
+
+        self.fields[TOTAL_PROCESSES_FIELD_NAME] = total
+        self.fields[REMOTE_CACHE_HITS_FIELD_NAME] = breakdown.get("remote cache hit", 0)
+        self.fields[DISK_CACHE_HITS_FIELD_NAME] = breakdown.get("disk cache hit", 0)
+        # A flat string, BI fields are not nested
+        self.fields[PROCESSES_BREAKDOWN_FIELD_NAME] = \
+            ",".join("{kind}={count}".format(kind=kind, count=count) for kind, count in breakdown.items())
+
+
+class ConsoleRelay:
+    """
+    Relays the bazel client's stderr to the wrapper's stderr on a background thread, feeding the summary parser.
+
+    Usage: pass 'child_stderr' to the bazel process, call 'start' once it was spawned and 'finish' once it exited, or
+    'abort' when it could not be spawned.
+    """
+
+    def __init__(self, ctx: Context):
+        self._ctx = ctx
+        self._parser = ConsoleSummaryParser()
+        self._output_fd = sys.stderr.fileno()
+        self._thread = None  # type: Optional[threading.Thread]
+        self._sigwinch_forwarded = False
+        self._previous_sigwinch_handler = None
+        # The read end is closed by whichever of 'finish' and the relay thread is the last one done with it
+        self._read_fd_lock = threading.Lock()
+        self._finished = False
+        self._relay_exited = False
+
+        if os.isatty(self._output_fd):
+            import pty
+            self._read_fd, self.child_stderr = pty.openpty()
+            self._copy_window_size()
+            self._forward_window_size_changes()
+        else:
+            self._read_fd, self.child_stderr = os.pipe()
+
+    def start(self):
+        # The child has its own copy, the read end reports EOF once the child closed it
+        os.close(self.child_stderr)
+
+        self._thread = threading.Thread(target=self._relay, name="console-relay", daemon=True)
+        self._thread.start()
+
+    def finish(self) -> dict:
+        """
+        Waits for the remaining output and returns the parsed summary fields.
+        """
+        self._thread.join(_DRAIN_TIMEOUT_SEC)
+        if self._thread.is_alive():
+            # A process spawned by the client keeps the output open, the summary is reported as is
+            self._ctx.logger.debug("The bazel console output was not drained in time.")
+
+        # The window size handler uses the read end until it is restored
+        self._restore_window_size_handler()
+
+        with self._read_fd_lock:
+            self._finished = True
+            if self._relay_exited:
+                os.close(self._read_fd)
+
+        return dict(self._parser.fields)
+
+    def abort(self):
+        """
+        Releases the pseudo terminal (or pipe) when the bazel process could not be spawned.
+        """
+        self._restore_window_size_handler()
+        os.close(self.child_stderr)
+        os.close(self._read_fd)
+
+    def _restore_window_size_handler(self):
+        if self._sigwinch_forwarded:
+            import signal
+            signal.signal(signal.SIGWINCH, self._previous_sigwinch_handler)
+            self._sigwinch_forwarded = False
+
+    def _relay(self):
+        try:
+            while True:
+                try:
+                    data = os.read(self._read_fd, _READ_SIZE)
+                except OSError:
+                    break  # EIO, the pseudo terminal was closed by the child
+
+                if not data:
+                    break
+
+                self._write(data)
+                self._parser.feed(data)
+        finally:
+            self._parser.close()
+
+            with self._read_fd_lock:
+                self._relay_exited = True
+                # Not drained in time, 'finish' left the read end open for this thread
+                if self._finished:
+                    os.close(self._read_fd)
+
+    def _write(self, data: bytes):
+        view = memoryview(data)
+        try:
+            while view:
+                written = os.write(self._output_fd, view)
+                view = view[written:]
+        except OSError:
+            pass  # the wrapper's stderr is gone, keep draining so bazel never blocks on a full buffer
+
+    def _copy_window_size(self):
+        import fcntl
+        import termios
+
+        try:
+            window_size = fcntl.ioctl(self._output_fd, termios.TIOCGWINSZ, b"\0" * 8)
+            fcntl.ioctl(self.child_stderr, termios.TIOCSWINSZ, window_size)
+        except OSError:
+            pass
+
+    def _forward_window_size_changes(self):
+        import signal
+
+        if threading.current_thread() is not threading.main_thread():
+            return  # signal handlers can only be installed by the main thread
+
+        def on_window_size_change(signum, frame):
+            try:
+                import fcntl
+                import termios
+                window_size = fcntl.ioctl(self._output_fd, termios.TIOCGWINSZ, b"\0" * 8)
+                fcntl.ioctl(self._read_fd, termios.TIOCSWINSZ, window_size)
+            except OSError:
+                pass
+
+        self._previous_sigwinch_handler = signal.signal(signal.SIGWINCH, on_window_size_change) or signal.SIG_DFL
+        self._sigwinch_forwarded = True
+
+
+def create_console_relay_safe(ctx: Context) -> Optional[ConsoleRelay]:
+    """
+    A relay when the console summary is enabled, None when it is disabled or could not be set up.
+    """
+    if not is_console_summary_enabled(ctx):
+        return None
+
+    try:
+        return ConsoleRelay(ctx)
+    except OSError as err:
+        ctx.logger.debug("Failed to set up the console relay. Error: {error}".format(error=err))
+        return None
+
+
+def _to_int(value: str) -> int:
+    return int(value.replace(",", ""))
@@ -0,0 +1,135 @@
+import os
+import time
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from bazelwrapper.context import Context
+from bazelwrapper.env import info
+from bazelwrapper.utils.json_store import load_json_safe, write_json_atomic
+
+#
+# An on-disk cache of the slowly changing facts about the host that go into the BI info snapshot.
+#
+# Every fact is validated either by a TTL or by the mtime of the file it is read from, so taking a snapshot does not
+# spawn processes nor parse files on every build. The whole cache is dropped when the kernel (and so most likely the
+# OS) changes.
+#
+
+_CACHE_FORMAT_VERSION = 1
+
+_CACHE_FILE_NAME = "hostfacts.json"
+
+_DAY_SEC = 24 * 60 * 60
+
+
+class _HostFact:
+    """
+    A cached fact. A fact with a source file is valid as long as the file's mtime is unchanged, otherwise it is valid
+    for 'ttl_sec'.
+    """
+
+    def __init__(self,
+                 name: str,
+                 resolve: Callable[[Context], Any],
+                 default_value,
+                 ttl_sec: Optional[int]=None,
+                 source_file: Optional[Callable[[Context], str]]=None):
+        self.name = name
+        self.resolve = resolve
+        self.default_value = default_value
+        self.ttl_sec = ttl_sec
+        self.source_file = source_file
+
+
+_FACTS = (
+    _HostFact("os_version", resolve=info.os_version, default_value="", ttl_sec=_DAY_SEC),
+    _HostFact("total_ram", resolve=info.total_memory, default_value=-1, ttl_sec=_DAY_SEC),
+    _HostFact("cpus", resolve=lambda ctx: os.cpu_count(), default_value=None, ttl_sec=_DAY_SEC),
+    _HostFact("proccessor_architecture", resolve=info.resolve_architecture, default_value="", ttl_sec=7 * _DAY_SEC),
+    _HostFact("wixtaller_version", resolve=info.resolve_wixtaller_version, default_value=None,
+              source_file=info.wixtaller_summary_file_path),
+)
+
+
+def host_facts(ctx: Context, names: Optional[Iterable[str]]=None) -> Dict[str, Any]:
+    """
+    Returns the requested facts (all by default), resolving and caching the ones that are missing or stale.
+    """
+    if names is None:
+        facts = _FACTS
+    else:
+        names = set(names)
+        facts = [fact for fact in _FACTS if fact.name in names]
+
+    cache_file_path = os.path.join(ctx.config_dir, _CACHE_FILE_NAME)
+    cache = _load_cache(cache_file_path, ctx)
+    entries = cache["entries"]
+
+    now = time.time()
+    values = {}
+    changed = False
+
+    for fact in facts:
+        source_mtime = _mtime_or_none(fact.source_file(ctx)) if fact.source_file is not None else None
+        entry = entries.get(fact.name)
+
+        if entry is not None and _is_valid(fact, entry, source_mtime, now):
+            values[fact.name] = entry["value"]
+            continue
+
+        value, resolved = _resolve(fact, ctx)
+        values[fact.name] = value
+
+        if resolved:
+            # Failures are not cached, the fact is resolved again next time
+            entries[fact.name] = {"value": value, "resolved_at": now, "source_mtime": source_mtime}
+            changed = True
+
+    if changed:
+        try:
+            write_json_atomic(cache_file_path, cache)
+        except OSError as err:
+            ctx.logger.debug("Failed to write the host facts cache. Error: {error}".format(error=err))
+
+    return values
+
+
+def _resolve(fact: _HostFact, ctx: Context) -> Tuple[Any, bool]:
+    try:
+        return fact.resolve(ctx), True
+    except Exception as err:
+        ctx.logger.warning("Failed to resolve the '{name}' host fact. Using default value: {default}".format(
+            name=fact.name, default=fact.default_value))
+        ctx.logger.debug(err)
+
+        return fact.default_value, False
+
+
+def _is_valid(fact: _HostFact, entry: dict, source_mtime: Optional[float], now: float) -> bool:
+    if fact.source_file is not None:
+        # A missing source file is not cached, its absence is cheap to find out
+        return source_mtime is not None and entry.get("source_mtime") == source_mtime
+
+    return now - entry.get("resolved_at", 0) < fact.ttl_sec
+
+
+def _load_cache(cache_file_path: str, ctx: Context) -> dict:
+    host = _host_id()
+    cache = load_json_safe(cache_file_path, default_value=None, ctx=ctx)
+
+    if not isinstance(cache, dict) or cache.get("version") != _CACHE_FORMAT_VERSION or cache.get("host") != host:
+        return {"version": _CACHE_FORMAT_VERSION, "host": host, "entries": {}}
+
+    return cache
+
+
+def _host_id() -> str:
+    # A single syscall, changes with kernel updates which usually come with OS updates
+    uname = os.uname()
+    return "{}|{}|{}".format(uname.sysname, uname.release, uname.version)
+
+
+def _mtime_or_none(path: str) -> Optional[float]:
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
@@ -1,13 +1,8 @@
 import json
-import multiprocessing
 import os
-import platform
 import re
 import time
 import sys
-from pathlib import Path
-from uuid import uuid4
-from pathlib import Path
 import subprocess
 
 from bazelwrapper.context import Context
@@ -15,9 +10,6 @@ from bazelwrapper.utils.env_vars import non_empty_env_var_value
 from bazelwrapper.utils.feature_flags import Flag
 from bazelwrapper.utils.safe_exec import safe
 
-from bazelwrapper.vmr_interop import BazelVmrInterop
-from virtualmonorepo.vector import VectorData
-
 _DEFAULT_ENV_TYPE = "default"
 _DEVEX_ENV_TYPE_ENV_VAR_NAME = "WIX_DEVEX_ENVTYPE"
 _DEVEX_ENV_ID_VAR_NAME = "WIX_DEVEX_ENV_ID"
@@ -25,8 +17,6 @@ _DEVEX_ENV_ID_VAR_NAME = "WIX_DEVEX_ENV_ID"
 _ID_REGEX_PATTERN = "^([a-z0-9])([a-z0-9-]{4,49})$"
 _ENV_ID_VALIDATION_REGEX = re.compile(pattern=_ID_REGEX_PATTERN)
 
-_TOOLS_VERSION_FILE_PATH = os.path.join("tools", "info", ".toolsversion")
-
 # this path is coordinated with wixtaller
 _WIXTALLER_SUMMARY_FILE_NAME = "last_summary.json"
 
@@ -51,6 +41,11 @@ def get_id(ctx: Context):
 
 
 def build_info_snapshot(ctx: Context):
+    import platform
+    from bazelwrapper.env.hostfacts import host_facts
+
+    facts = host_facts(ctx)
+
     return {
         "build_command": ctx.bazel_command(),
         "build_command_targets": " ".join(ctx.bazel_command_targets()),
@@ -60,26 +55,30 @@ def build_info_snapshot(ctx: Context):
         "env_type": resolve_env_type(ctx),
         "build_type": resolve_build_type(ctx),
         "tools_version": safe(fn=resolve_tools_version, default_value=None, ctx=ctx),
-        "wixtaller_version": safe(fn=resolve_wixtaller_version, default_value=None, ctx=ctx),
+        "wixtaller_version": facts["wixtaller_version"],
         "vmr_repo_rule_type": safe(fn=resolve_vmr_repo_rule_type, default_value=None, ctx=ctx),
         "vmr_build_post_invalidation": safe(fn=resolve_vmr_build_post_invalidation, default_value=False, ctx=ctx),
         "vmr_vector_mode": safe(fn=resolve_vmr_vector_mode, default_value=None, ctx=ctx),
         "os_family": platform.system().lower(),
-        "os_version": safe(_os_version, "", ctx),
-        "cpus": multiprocessing.cpu_count(),
-        "total_ram": safe(_total_memory, -1, ctx),
-        "proccessor_architecture": safe(resolve_architecture, "", ctx),
+        "os_version": facts["os_version"],
+        "cpus": facts["cpus"],
+        "total_ram": facts["total_ram"],
+        "proccessor_architecture": facts["proccessor_architecture"],
         "python_version": platform.python_version(),
-        "repository": safe(_repository, "", ctx),
+        "repository": safe(fn=_repository, default_value="", ctx=ctx),
         "remote_cache_provider": safe(fn=resolve_remote_cache_provider, default_value=None, ctx=ctx),
+        "remote_cache_circuit": ctx.remote_cache_circuit,
     }
 
 def resolve_architecture(ctx: Context) -> str:
+    import platform
+
     return platform.machine() or platform.processor() or platform.architecture()[0]
 
 def create_envid(path, ctx: Context) -> str:
     ctx.logger.debug("Creating a new envid file '{}'".format(path))
 
+    from uuid import uuid4
     uid = uuid4()
     with open(path, "w") as file:
         file.write(str(uid))
@@ -103,18 +102,9 @@ def resolve_build_type(ctx: Context) -> str:
 
 
 def resolve_tools_version(ctx: Context):
-    version_file_path = os.path.join(ctx.workspace_dir, _TOOLS_VERSION_FILE_PATH)
-    resolved_tools_version = None
-    try:
-        if os.path.exists(version_file_path):
-            with open(version_file_path) as version_file:
-                resolved_tools_version = version_file.read().strip()
+    from bazelwrapper.env.workspace_metadata import workspace_value
 
-    except OSError as e:
-        ctx.logger.warning("Failed to read tools version from '{}'".format(version_file), e)
-        ctx.logger.debug("", e)
-
-    return resolved_tools_version
+    return workspace_value(ctx, "tools_version")
 
 
 def resolve_vmr_repo_rule_type(ctx: Context):
@@ -125,7 +115,7 @@ def resolve_vmr_repo_rule_type(ctx: Context):
 
 def resolve_vmr_build_post_invalidation(ctx: Context):
     is_invalidated = False
-    home_folder = str(Path.home())
+    home_folder = os.path.expanduser("~")
     vmr_invalidation_marker_file_path = "{}/.config/wix/virtual-monorepo/ext/vmr-invalidation-marker".format(
         home_folder)
     try:
@@ -159,7 +149,10 @@ def resolve_vmr_vector_mode(ctx: Context):
         # the expected branch name. To overcome this limitation, we are reading the branch name from env var.
         build_branch_override = os.getenv("BUILDKITE_BRANCH", "http_archive")
 
-        vector_data: VectorData = BazelVmrInterop.read_local_vector(
+        # The VMR client is only loaded when a BI snapshot is taken
+        from bazelwrapper.vmr_interop import BazelVmrInterop
+
+        vector_data = BazelVmrInterop.read_local_vector(
             ctx=ctx, is_silent=True, metadata_only=True,
             build_type=build_type, build_branch_override=build_branch_override)
 
@@ -179,17 +172,21 @@ def resolve_remote_cache_provider(ctx: Context):
     else:
         return "WixCachePops"
 
+def wixtaller_summary_file_path(ctx: Context) -> str:
+    return os.path.join(ctx.wixtaller_config_dir, _WIXTALLER_SUMMARY_FILE_NAME)
+
+
 def resolve_wixtaller_version(ctx: Context):
-    wixtaller_summary_file_path = os.path.join(ctx.wixtaller_config_dir, _WIXTALLER_SUMMARY_FILE_NAME)
-    if os.path.exists(wixtaller_summary_file_path):
-        with open(wixtaller_summary_file_path) as json_file:
+    summary_file_path = wixtaller_summary_file_path(ctx)
+    if os.path.exists(summary_file_path):
+        with open(summary_file_path) as json_file:
             data = json.load(json_file)
             extracted_wixtaller_version = data["version"]
             ctx.logger.debug("Last recorded wixtaller version: {}".format(extracted_wixtaller_version))
 
             return extracted_wixtaller_version
     else:
-        ctx.logger.debug("Wixtaller summary file '{}' does not exist".format(wixtaller_summary_file_path))
+        ctx.logger.debug("Wixtaller summary file '{}' does not exist".format(summary_file_path))
         return None
 
 
@@ -218,7 +215,9 @@ def _resolve_default_id(ctx: Context):
     return _id
 
 
-def _os_version(ctx: Context):
+def os_version(ctx: Context):
+    import platform
+
     system = platform.system().lower()
     if 'darwin' == system:
         return platform.mac_ver()[0]
@@ -230,17 +229,14 @@ def _os_version(ctx: Context):
     else:
         return ",".join(platform.uname())
 
-def _total_memory(ctx: Context) -> int:
+def total_memory(ctx: Context) -> int:
     mem_bytes = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')  # e.g. 4015976448
     return int(mem_bytes/(1024.**3))
 
 def _repository(ctx: Context) -> str:
-    workspace_file_path = os.path.join(ctx.workspace_dir, "WORKSPACE")
-    with open(workspace_file_path, "r") as workspace_file:
-        for line in workspace_file:
-            match = re.match("""\s*repository_name\s*=\s*"([^"]+)"\s*""", line)
-            if match:
-                return match.group(1)
+    from bazelwrapper.env.workspace_metadata import workspace_value
+
+    return workspace_value(ctx, "repository")
 
 def _get_os(ctx: Context) -> str:
     return sys.platform
\ No newline at end of file
@@ -1,13 +1,24 @@
-import json
 import os
+import threading
+import time
+from abc import abstractmethod
 from shutil import disk_usage
-from typing import Generator
+from typing import Dict, List, Optional
 
 from bazelwrapper.context import Context
-from bazelwrapper.env.info import resolve_wixtaller_version
+from bazelwrapper.env.workspace_metadata import workspace_value
 from bazelwrapper.utils.feature_flags import Flag
+from bazelwrapper.utils.json_store import load_json_safe, write_json_atomic
 from bazelwrapper.utils.safe_exec import safe
 
+#
+# Environment inspection, reported as warnings after every command.
+#
+# Every check is a registered 'InspectionCheck'. Checks are started before bazel runs and collected after it finished,
+# so they run off the critical path. The results of checks with a TTL are shared between invocations through
+# '<config_dir>/inspections.json', e.g. the free disk space is checked at most once a minute.
+#
+
 _FALLBACK_ACTUAL_VERSION = "0.0.0"
 
 _env_checks_disabled_flag = Flag(
@@ -17,49 +28,228 @@ _env_checks_disabled_flag = Flag(
 
 _FREE_DISK_SPACE_WARNING_THRESHOLD_IN_GIGABYTES = 10
 
+_CACHE_FILE_NAME = "inspections.json"
+
+# How long the wrapper waits for the checks that are still running once bazel finished
+_COLLECT_TIMEOUT_SEC = 2.0
+
+_IJ_TROUBLESHOOTING_MESSAGE = \
+    "Please see: " \
+    "https://github.com/wix-private/wix-intellij-plugin/blob/master/docs/plugin-troubleshooting.md for " \
+    "IntelliJ issues troubleshooting."
+
 
-def inspect(ctx: Context) -> Generator:
+class InspectionCheck:
     """
-    Returns a generator of inspection warning messages
+    A single environment check. 'run' returns the warnings to report.
+
+    The warnings of a check with a TTL are cached for 'ttl_sec' (per workspace when 'per_workspace') and the check runs
+    in the background. A check without a TTL must be cheap, it runs inline on every command.
     """
 
-    yield_ij_troubleshooting_message = False
+    name = None  # type: str
+    ttl_sec = None  # type: Optional[float]
+    per_workspace = False
+    # Followed by the IntelliJ troubleshooting message when it warns
+    ij_troubleshooting = False
 
-    if _env_checks_enabled(ctx):
+    def applies(self, ctx: Context) -> bool:
+        return True
+
+    @abstractmethod
+    def run(self, ctx: Context) -> List[str]: pass
+
+    def cache_key(self, ctx: Context) -> str:
+        if self.per_workspace:
+            return "{name}@{workspace}".format(name=self.name, workspace=ctx.workspace_dir)
 
+        return self.name
+
+
+_CHECKS = []  # type: List[InspectionCheck]
+
+
+def register(check: InspectionCheck) -> InspectionCheck:
+    _CHECKS.append(check)
+    return check
+
+
+class _FreeDiskSpaceCheck(InspectionCheck):
+    name = "free_disk_space"
+    ttl_sec = 60
+
+    def run(self, ctx: Context) -> List[str]:
         free_disk_space = _free_disk_space_gb()
         ctx.logger.debug("Free disk space: {}GB".format(free_disk_space))
         ctx.logger.debug("Disk space warning threshold is {}GB".format(_FREE_DISK_SPACE_WARNING_THRESHOLD_IN_GIGABYTES))
 
-        if _free_disk_space_gb() < _FREE_DISK_SPACE_WARNING_THRESHOLD_IN_GIGABYTES:
-            yield "Your system has only {actual}GB of free disk space under '/'. " \
-                  "You may want to run some cleanups soon to avoid problems." \
-                .format(actual=free_disk_space)
-
-        if ctx.bazel_command() in ["build", "test"] and "//..." in ctx.user_args:
-            yield_ij_troubleshooting_message = True
-            yield "Building the entire workspace is not recommended for obvious performance reasons! See: " \
-                  "https://ci-kb.wixanswers.com/en/article/local-devex " \
-                  "for Bazel and IntelliJ related docs."
-
-        if ctx.bazel_command() == "clean":
-            yield_ij_troubleshooting_message = True
-            yield \
-                "'clean' and 'clean --expunge' is rarely the cure for local development issues and will cost you a " \
-                "lot of time."
-
-        if yield_ij_troubleshooting_message:
-            yield \
-                "Please see: " \
-                "https://github.com/wix-private/wix-intellij-plugin/blob/master/docs/plugin-troubleshooting.md for " \
-                "IntelliJ issues troubleshooting."
+        if free_disk_space < _FREE_DISK_SPACE_WARNING_THRESHOLD_IN_GIGABYTES:
+            return [
+                "Your system has only {actual}GB of free disk space under '/'. "
+                "You may want to run some cleanups soon to avoid problems, 'bazel reclaim-output-bases' lists the "
+                "output bases that can be removed.".format(actual=free_disk_space)
+            ]
+
+        return []
 
+
+class _EntireWorkspaceBuildCheck(InspectionCheck):
+    name = "entire_workspace_build"
+    ij_troubleshooting = True
+
+    def applies(self, ctx: Context) -> bool:
+        return ctx.bazel_command() in ["build", "test"]
+
+    def run(self, ctx: Context) -> List[str]:
+        if "//..." in ctx.bazel_command_targets():
+            return [
+                "Building the entire workspace is not recommended for obvious performance reasons! See: "
+                "https://ci-kb.wixanswers.com/en/article/local-devex "
+                "for Bazel and IntelliJ related docs."
+            ]
+
+        return []
+
+
+class _CleanCheck(InspectionCheck):
+    name = "clean"
+    ij_troubleshooting = True
+
+    def applies(self, ctx: Context) -> bool:
+        return ctx.bazel_command() == "clean"
+
+    def run(self, ctx: Context) -> List[str]:
+        return [
+            "'clean' and 'clean --expunge' is rarely the cure for local development issues and will cost you a "
+            "lot of time."
+        ]
+
+
+class _WixtallerUpdateCheck(InspectionCheck):
+    name = "wixtaller_update"
+    ttl_sec = 5 * 60
+    # The minimum required version comes from the workspace
+    per_workspace = True
+
+    def run(self, ctx: Context) -> List[str]:
         if is_update_required(ctx):
-            yield \
-                "[ACTION REQUIRED] Your Bazel environment needs to be updated! Please run 'wixtaller' from your " \
-                "terminal and follow the instructions. See: " \
-                "https://github.com/wix-private/wix-ci/blob/master/localdev_new/tools/wixtaller/docs/" \
+            return [
+                "[ACTION REQUIRED] Your Bazel environment needs to be updated! Please run 'wixtaller' from your "
+                "terminal and follow the instructions. See: "
+                "https://github.com/wix-private/wix-ci/blob/master/localdev_new/tools/wixtaller/docs/"
                 "wixtaller-getting-started.md"
+            ]
+
+        return []
+
+
+register(_FreeDiskSpaceCheck())
+register(_EntireWorkspaceBuildCheck())
+register(_CleanCheck())
+register(_WixtallerUpdateCheck())
+
+
+class Inspection:
+    """
+    The checks of a single command. Checks that are not cached run on daemon threads, so a slow check never delays the
+    wrapper exit.
+    """
+
+    def __init__(self, ctx: Context, checks: List[InspectionCheck]):
+        self._ctx = ctx
+        self._checks = checks
+        self._cache_file_path = os.path.join(ctx.config_dir, _CACHE_FILE_NAME)
+        self._results = {}  # type: Dict[str, List[str]]
+        self._fresh_results = {}  # type: Dict[str, dict]
+        self._threads = []  # type: List[threading.Thread]
+
+    def start(self) -> "Inspection":
+        cache = load_json_safe(self._cache_file_path, default_value={}, ctx=self._ctx) \
+            if any(check.ttl_sec is not None for check in self._checks) else {}
+        now = time.time()
+
+        for check in self._checks:
+            if check.ttl_sec is None:
+                self._run(check)
+                continue
+
+            cached = cache.get(check.cache_key(self._ctx))
+            if cached is not None and now - cached.get("checked_at", 0) < check.ttl_sec:
+                self._results[check.name] = cached["warnings"]
+                continue
+
+            thread = threading.Thread(target=self._run, args=(check,), name="inspect-" + check.name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+        return self
+
+    def warnings(self, timeout_sec: float=_COLLECT_TIMEOUT_SEC) -> List[str]:
+        deadline = time.monotonic() + timeout_sec
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+
+        self._store_fresh_results()
+
+        warnings = []
+        ij_troubleshooting = False
+
+        for check in self._checks:
+            check_warnings = self._results.get(check.name)
+            if check_warnings is None:
+                self._ctx.logger.debug("Inspection check '{name}' did not finish in time".format(name=check.name))
+                continue
+
+            warnings.extend(check_warnings)
+            ij_troubleshooting = ij_troubleshooting or (check.ij_troubleshooting and bool(check_warnings))
+
+        if ij_troubleshooting:
+            warnings.append(_IJ_TROUBLESHOOTING_MESSAGE)
+
+        return warnings
+
+    def _run(self, check: InspectionCheck):
+        try:
+            warnings = check.run(self._ctx)
+        except Exception as err:
+            self._ctx.logger.debug("Inspection check '{name}' failed. Error: {error}".format(
+                name=check.name, error=err))
+            return
+
+        # Single assignments, the results are only read once the thread was joined
+        self._results[check.name] = warnings
+        if check.ttl_sec is not None:
+            self._fresh_results[check.cache_key(self._ctx)] = {"warnings": warnings, "checked_at": time.time()}
+
+    def _store_fresh_results(self):
+        fresh_results = dict(self._fresh_results)
+        if not fresh_results:
+            return
+
+        # Re-read, other invocations may have stored results of other checks in the meantime
+        cache = load_json_safe(self._cache_file_path, default_value={}, ctx=self._ctx)
+        cache.update(fresh_results)
+
+        try:
+            write_json_atomic(self._cache_file_path, cache)
+        except OSError as err:
+            self._ctx.logger.debug("Failed to store the inspection results. Error: {error}".format(error=err))
+
+
+def start_inspection(ctx: Context) -> Inspection:
+    """
+    Starts the checks that apply to the command, 'Inspection.warnings' collects their warnings.
+    """
+    checks = [check for check in _CHECKS if check.applies(ctx)] if _env_checks_enabled(ctx) else []
+
+    return Inspection(ctx, checks).start()
+
+
+def inspect(ctx: Context) -> List[str]:
+    """
+    Returns the inspection warning messages
+    """
+    return start_inspection(ctx).warnings()
 
 
 def is_update_required(ctx: Context) -> bool:
@@ -83,12 +273,12 @@ def _env_checks_enabled(ctx):
 
 
 def _unsafe_is_update_required(ctx):
+    # The installed version is cached by the mtime of the wixtaller summary file
+    from bazelwrapper.env.hostfacts import host_facts
+
     ctx.logger.debug("Running environment compatibility check...")
 
-    actual_wixtaller_version = safe(
-        fn=resolve_wixtaller_version,
-        default_value=_FALLBACK_ACTUAL_VERSION,
-        ctx=ctx)
+    actual_wixtaller_version = host_facts(ctx, names=["wixtaller_version"])["wixtaller_version"]
 
     if actual_wixtaller_version is None:
         actual_wixtaller_version = _FALLBACK_ACTUAL_VERSION
@@ -101,10 +291,7 @@ def _unsafe_is_update_required(ctx):
 
 
 def _minimum_required_wixtaller_version(ctx: Context):
-    config_file_path = os.path.join(ctx.workspace_dir, "tools", "info", "wixtaller.json")
-
-    with open(config_file_path, mode='r') as wixtaller_json_file:
-        return json.load(wixtaller_json_file)["minimumRequiredVersion"]
+    return workspace_value(ctx, "minimum_required_wixtaller_version")
 
 
 def _is_update_required_fn(actual_wixtaller_version: str):
@@ -0,0 +1,502 @@
+import os
+import signal
+import time
+from typing import List, Optional, Tuple
+
+from bazelwrapper.context import Context
+from bazelwrapper.utils.feature_flags import Flag
+from bazelwrapper.utils.json_store import load_json_safe, write_json_atomic
+
+#
+# Reclamation of stale bazel output bases.
+#
+# Old output bases, of deleted checkouts or of previous 'BAZEL_OUTPUT_BASE_DIR' overrides, are usually what fills the
+# disk. The output bases are found under the bazel output user root and in '<config_dir>/output_bases.json', where
+# every invocation records the output base it used. An output base is stale when its workspace no longer exists or it
+# was not used for longer than the retention, and the least recently used ones go first while all of them are over the
+# size budget. The retention is configured in '<config_dir>/output_base_reclaim.json', e.g.
+#   {"max_idle_days": 14, "max_size_gb": 200}
+#
+# The detached job worker reclaims at most once per '_RECLAIM_INTERVAL_SEC', with a lowered CPU and I/O priority.
+# 'bazel reclaim-output-bases' prints what would be reclaimed, '--wix_reclaim_now' reclaims right away.
+#
+# IMPORTANT:
+# An output base is only touched while holding its lock, the one the bazel client holds for the duration of a command,
+# so a command never runs against an output base that is being removed. Its server is asked to shut down and the
+# output base is kept when it does not.
+#
+
+RECLAIM_COMMAND = "reclaim-output-bases"
+
+_reclaim_disabled_flag = Flag(
+    env_var_name="WIX_BAZEL_OUTPUT_BASE_RECLAIM_DISABLED",
+    env_var_required_value="1"
+)
+
+_reclaim_now_flag = Flag(full_cli_flag="--wix_reclaim_now")
+
+_SETTINGS_FILE_NAME = "output_base_reclaim.json"
+_REGISTRY_FILE_NAME = "output_bases.json"
+
+_DEFAULT_MAX_IDLE_DAYS = 30
+# An output base of a deleted workspace, or over the size budget, is still kept for a while after its last use
+_MIN_IDLE_SEC = 24 * 60 * 60
+
+_RECLAIM_INTERVAL_SEC = 24 * 60 * 60
+# The registry records the last use of an output base at this granularity, not on every command
+_USE_RECORD_INTERVAL_SEC = 60 * 60
+
+_SERVER_SHUTDOWN_TIMEOUT_SEC = 10
+
+# The state of the bazel server of an output base. A base is only removed once it is known to have no server.
+_SERVER_NONE = "none"
+_SERVER_RUNNING = "running"
+_SERVER_UNKNOWN = "unknown"
+
+_OUTPUT_BASE_OPTION_PREFIX = "--output_base="
+
+# Bazel's own files, see 'bazelwrapper.env.bazel_server'
+_WORKSPACE_FILE_NAME = "DO_NOT_BUILD_HERE"
+_LOCK_FILE_NAME = "lock"
+_SERVER_PID_FILE_PATH = os.path.join("server", "server.pid.txt")
+# Written or touched by every command or server start
+_LAST_USE_FILE_PATHS = (_LOCK_FILE_NAME, "command.log", _SERVER_PID_FILE_PATH, _WORKSPACE_FILE_NAME)
+
+# Output bases are renamed before their removal, leftovers of an interrupted removal are removed by the next one
+_RECLAIMING_SUFFIX = ".reclaiming"
+
+REASON_WORKSPACE_DELETED = "workspace deleted"
+REASON_IDLE = "idle"
+REASON_SIZE_BUDGET = "over size budget"
+
+
+class OutputBase:
+    def __init__(self, path: str, workspace_dir: Optional[str], last_used_at: float):
+        self.path = path
+        self.workspace_dir = workspace_dir
+        self.last_used_at = last_used_at
+        self.size_bytes = None  # type: Optional[int]
+
+    def workspace_exists(self) -> bool:
+        return self.workspace_dir is not None and os.path.isdir(self.workspace_dir)
+
+    def idle_sec(self, now: float) -> float:
+        return now - self.last_used_at
+
+
+class ReclaimSettings:
+    def __init__(self, max_idle_sec: float, max_size_bytes: Optional[int]):
+        self.max_idle_sec = max_idle_sec
+        self.max_size_bytes = max_size_bytes
+
+
+def reclaim_settings(ctx: Context) -> ReclaimSettings:
+    settings = load_json_safe(os.path.join(ctx.config_dir, _SETTINGS_FILE_NAME), default_value={}, ctx=ctx)
+
+    max_size_gb = settings.get("max_size_gb")
+    return ReclaimSettings(
+        max_idle_sec=settings.get("max_idle_days", _DEFAULT_MAX_IDLE_DAYS) * 24 * 60 * 60,
+        max_size_bytes=int(max_size_gb * 1024 ** 3) if max_size_gb is not None else None,
+    )
+
+
+def on_command_finished(ctx: Context):
+    """
+    Records the use of the output base of the command and requests a reclamation when the last one is due.
+    """
+    if _reclaim_disabled_flag.on(ctx):
+        return
+
+    registry_file_path = os.path.join(ctx.config_dir, _REGISTRY_FILE_NAME)
+    registry = load_json_safe(registry_file_path, default_value={}, ctx=ctx)
+    bases = registry.setdefault("output_bases", {})
+    now = time.time()
+
+    current = _current_output_base_path(ctx)
+    recorded = bases.get(current)
+    use_due = recorded is None or now - recorded.get("last_used_at", 0) >= _USE_RECORD_INTERVAL_SEC
+    if use_due:
+        bases[current] = {"workspace_dir": ctx.workspace_dir, "last_used_at": now}
+
+    reclaim_due = now - max(registry.get("last_reclaim_at", 0), registry.get("reclaim_requested_at", 0)) >= \
+        _RECLAIM_INTERVAL_SEC
+    if reclaim_due:
+        # Recorded first, so concurrent invocations do not request the same reclamation
+        registry["reclaim_requested_at"] = now
+
+    if not use_due and not reclaim_due:
+        return
+
+    write_json_atomic(registry_file_path, registry)
+
+    if reclaim_due:
+        from bazelwrapper.jobs import queue, worker
+
+        queue.enqueue(ctx, worker.JOB_OUTPUT_BASE_RECLAIM, payload={"current_output_base": current})
+        worker.start_worker(ctx)
+
+
+def scan_output_bases(ctx: Context, exclude: List[str]) -> List[OutputBase]:
+    """
+    The output bases under the output user root and the ones recorded by previous invocations, except the excluded ones.
+    """
+    registry = load_json_safe(os.path.join(ctx.config_dir, _REGISTRY_FILE_NAME), default_value={}, ctx=ctx)
+    recorded = registry.get("output_bases", {})
+
+    paths = set(recorded)
+    user_root = _output_user_root(ctx)
+    try:
+        with os.scandir(user_root) as entries:
+            paths.update(entry.path for entry in entries if entry.is_dir(follow_symlinks=False))
+    except OSError as err:
+        ctx.logger.debug("Failed to list '{path}'. Error: {error}".format(path=user_root, error=err))
+
+    excluded = {os.path.realpath(path) for path in exclude}
+    bases = []
+
+    for path in sorted(paths):
+        # Only directories bazel created as output bases, never e.g. the install bases or the repository cache
+        if os.path.realpath(path) in excluded or not os.path.isfile(os.path.join(path, _WORKSPACE_FILE_NAME)):
+            continue
+
+        entry = recorded.get(path, {})
+        workspace_dir = entry.get("workspace_dir") or _read_workspace_dir(path)
+        last_used_at = max([entry.get("last_used_at", 0)] + [_mtime(os.path.join(path, file_path))
+                                                            for file_path in _LAST_USE_FILE_PATHS])
+
+        bases.append(OutputBase(path=path, workspace_dir=workspace_dir, last_used_at=last_used_at))
+
+    return bases
+
+
+def reclaim_plan(bases: List[OutputBase], settings: ReclaimSettings, now: float) -> List[Tuple[OutputBase, str]]:
+    """
+    The output bases to reclaim and why, least recently used first. Sizes are only needed for a size budget.
+    """
+    plan = []
+    kept = []
+
+    for base in sorted(bases, key=lambda b: b.last_used_at):
+        if base.idle_sec(now) < _MIN_IDLE_SEC:
+            kept.append(base)
+        elif not base.workspace_exists():
+            plan.append((base, REASON_WORKSPACE_DELETED))
+        elif base.idle_sec(now) >= settings.max_idle_sec:
+            plan.append((base, REASON_IDLE))
+        else:
+            kept.append(base)
+
+    if settings.max_size_bytes is not None:
+        total_size = sum(base.size_bytes or 0 for base in kept)
+        for base in kept:
+            if total_size <= settings.max_size_bytes:
+                break
+
+            if base.idle_sec(now) >= _MIN_IDLE_SEC:
+                plan.append((base, REASON_SIZE_BUDGET))
+                total_size -= base.size_bytes or 0
+
+    return plan
+
+
+def report_lines(ctx: Context) -> List[str]:
+    """
+    A dry run of the reclamation, a line per output base.
+    """
+    current = _current_output_base_path(ctx)
+    bases = scan_output_bases(ctx, exclude=[current])
+    for base in bases:
+        base.size_bytes = _dir_size(base.path)
+
+    now = time.time()
+    plan = dict((base.path, reason) for base, reason in reclaim_plan(bases, reclaim_settings(ctx), now))
+
+    lines = ["Output bases (current: {current}):".format(current=current)]
+    for base in bases:
+        workspace = base.workspace_dir
+        if base.path in plan:
+            workspace = "{reason}: {workspace}".format(reason=plan[base.path], workspace=workspace)
+
+        lines.append("  {action:<9} {size:>7}MB  idle {idle:>4.0f}d  {path} ({workspace})".format(
+            action="reclaim" if base.path in plan else "keep",
+            size=(base.size_bytes or 0) // 1024 ** 2,
+            idle=base.idle_sec(now) / (24 * 60 * 60),
+            path=base.path,
+            workspace=workspace))
+
+    reclaimable = sum(base.size_bytes or 0 for base in bases if base.path in plan)
+    lines.append("{count} output bases, {size}MB reclaimable. Run with '{flag}' to reclaim them now.".format(
+        count=len(bases), size=reclaimable // 1024 ** 2, flag=_reclaim_now_flag.full_cli_flag))
+
+    return lines
+
+
+def reclaim(ctx: Context, current_output_base: str):
+    """
+    Removes the stale output bases. Run by the job worker, or by 'bazel reclaim-output-bases --wix_reclaim_now'.
+    """
+    _lower_priority(ctx)
+
+    settings = reclaim_settings(ctx)
+    started = time.monotonic()
+    now = time.time()
+
+    bases = scan_output_bases(ctx, exclude=[current_output_base])
+    if settings.max_size_bytes is not None:
+        for base in bases:
+            base.size_bytes = _dir_size(base.path)
+
+    reclaimed_count = 0
+    reclaimed_bytes = 0
+    for base, reason in reclaim_plan(bases, settings, now):
+        ctx.logger.info("Reclaiming output base '{path}' ({reason}, workspace: {workspace})".format(
+            path=base.path, reason=reason, workspace=base.workspace_dir))
+
+        size_bytes = base.size_bytes if base.size_bytes is not None else _dir_size(base.path)
+        if _reclaim_output_base(ctx, base):
+            reclaimed_count += 1
+            reclaimed_bytes += size_bytes
+
+    _remove_leftovers(ctx)
+
+    ctx.logger.info("Reclaimed {count} output bases ({size}MB) in {elapsed:.1f}s".format(
+        count=reclaimed_count, size=reclaimed_bytes // 1024 ** 2, elapsed=time.monotonic() - started))
+
+    registry_file_path = os.path.join(ctx.config_dir, _REGISTRY_FILE_NAME)
+    # Re-read, commands that finished in the meantime recorded their output base
+    registry = load_json_safe(registry_file_path, default_value={}, ctx=ctx)
+    registry["output_bases"] = {
+        path: entry for path, entry in registry.get("output_bases", {}).items() if os.path.isdir(path)
+    }
+    registry.update({
+        "last_reclaim_at": time.time(),
+        "reclaimed_count": registry.get("reclaimed_count", 0) + reclaimed_count,
+        "reclaimed_bytes": registry.get("reclaimed_bytes", 0) + reclaimed_bytes,
+    })
+    write_json_atomic(registry_file_path, registry)
+
+
+def handle_reclaim_command(ctx: Context):
+    if _reclaim_now_flag.on(ctx):
+        reclaim(ctx, current_output_base=_current_output_base_path(ctx))
+    else:
+        for line in report_lines(ctx):
+            ctx.logger.info(line)
+
+
+def _reclaim_output_base(ctx: Context, base: OutputBase) -> bool:
+    import fcntl
+
+    try:
+        lock_file = open(os.path.join(base.path, _LOCK_FILE_NAME), "a")
+    except OSError as err:
+        ctx.logger.info("Skipping '{path}', failed to open its lock. Error: {error}".format(path=base.path, error=err))
+        return False
+
+    with lock_file:
+        try:
+            # The same kind of lock as the bazel client's
+            fcntl.lockf(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            ctx.logger.info("Skipping '{path}', a command is running.".format(path=base.path))
+            return False
+
+        if not _shut_down_server(ctx, base.path):
+            return False
+
+        reclaiming_path = "{path}{suffix}".format(path=base.path, suffix=_RECLAIMING_SUFFIX)
+        try:
+            os.rename(base.path, reclaiming_path)
+        except OSError as err:
+            ctx.logger.info("Skipping '{path}', failed to move it. Error: {error}".format(path=base.path, error=err))
+            return False
+
+    _remove_tree(ctx, reclaiming_path)
+    return True
+
+
+def _shut_down_server(ctx: Context, path: str) -> bool:
+    """
+    Terminates the idle server of the output base, if any. False when it is still running or it could not be told
+    whether there is one.
+    """
+    state, pid = _server_state(path)
+    if state == _SERVER_NONE:
+        return True
+
+    if state == _SERVER_UNKNOWN:
+        ctx.logger.info("Skipping '{path}', could not tell whether its bazel server is running.".format(path=path))
+        return False
+
+    ctx.logger.info("Shutting down the bazel server of '{path}' (pid={pid})".format(path=path, pid=pid))
+    try:
+        os.kill(pid, signal.SIGTERM)
+    except ProcessLookupError:
+        return True
+    except OSError as err:
+        ctx.logger.info("Failed to shut down pid {pid}. Error: {error}".format(pid=pid, error=err))
+        return False
+
+    deadline = time.monotonic() + _SERVER_SHUTDOWN_TIMEOUT_SEC
+    while time.monotonic() < deadline:
+        if not _is_alive(pid):
+            return True
+        time.sleep(0.2)
+
+    ctx.logger.info("Bazel server of '{path}' did not shut down, keeping it.".format(path=path))
+    return False
+
+
+def _server_state(path: str) -> Tuple[str, Optional[int]]:
+    """
+    The (state, pid) of the bazel server of the output base, the pid is only known while it is running.
+    """
+    try:
+        with open(os.path.join(path, _SERVER_PID_FILE_PATH)) as pid_file:
+            pid = int(pid_file.read().strip())
+    except FileNotFoundError:
+        return _SERVER_NONE, None
+    except (OSError, ValueError):
+        return _SERVER_UNKNOWN, None
+
+    if not _is_alive(pid):
+        return _SERVER_NONE, None
+
+    # A stale pid file may refer to a reused pid, only a server of this output base is shut down
+    import subprocess
+
+    try:
+        command = subprocess.run(["ps", "-o", "command=", "-p", str(pid)], stdout=subprocess.PIPE,
+                                 stderr=subprocess.DEVNULL, universal_newlines=True, timeout=5).stdout
+    except (OSError, subprocess.SubprocessError):
+        return _SERVER_UNKNOWN, None
+
+    if not command.strip():
+        return (_SERVER_NONE, None) if not _is_alive(pid) else (_SERVER_UNKNOWN, None)
+
+    output_bases = [arg[len(_OUTPUT_BASE_OPTION_PREFIX):] for arg in command.split()
+                    if arg.startswith(_OUTPUT_BASE_OPTION_PREFIX)]
+    if not output_bases:
+        # Not a bazel server, or its command line was cut
+        return _SERVER_UNKNOWN, None
+
+    # The server may have been started with another spelling of the path, e.g. through a symlink
+    real_path = os.path.realpath(path)
+    if any(os.path.realpath(output_base) == real_path for output_base in output_bases):
+        return _SERVER_RUNNING, pid
+
+    # The server of another output base, the pid was reused
+    return _SERVER_NONE, None
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # exists, owned by another user
+
+    return True
+
+
+def _remove_tree(ctx: Context, path: str):
+    import shutil
+    import stat
+
+    def make_writable_and_retry(fn, failed_path, _):
+        # Bazel keeps parts of the output base read-only
+        try:
+            os.chmod(os.path.dirname(failed_path), stat.S_IRWXU)
+            if os.path.isdir(failed_path) and not os.path.islink(failed_path):
+                os.chmod(failed_path, stat.S_IRWXU)
+            fn(failed_path)
+        except OSError as err:
+            ctx.logger.debug("Failed to remove '{path}'. Error: {error}".format(path=failed_path, error=err))
+
+    shutil.rmtree(path, onerror=make_writable_and_retry)
+
+
+def _remove_leftovers(ctx: Context):
+    user_root = _output_user_root(ctx)
+    try:
+        with os.scandir(user_root) as entries:
+            leftovers = [entry.path for entry in entries if entry.name.endswith(_RECLAIMING_SUFFIX)]
+    except OSError:
+        return
+
+    for path in leftovers:
+        ctx.logger.info("Removing the leftovers of '{path}'".format(path=path))
+        _remove_tree(ctx, path)
+
+
+def _lower_priority(ctx: Context):
+    """
+    Lowers the CPU and I/O priority of this process, removing output bases must not slow down a running build.
+    """
+    import shutil
+    import subprocess
+
+    try:
+        os.nice(10)
+    except OSError as err:
+        ctx.logger.debug("Failed to lower the CPU priority. Error: {error}".format(error=err))
+
+    if ctx.system_name == "Darwin":
+        command = ["taskpolicy", "-b", "-p", str(os.getpid())]
+    else:
+        command = ["ionice", "-c", "3", "-p", str(os.getpid())]
+
+    if shutil.which(command[0]) is None:
+        return
+
+    try:
+        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=5)
+    except (OSError, subprocess.SubprocessError) as err:
+        ctx.logger.debug("Failed to lower the I/O priority. Error: {error}".format(error=err))
+
+
+def _current_output_base_path(ctx: Context) -> str:
+    from bazelwrapper.bazelcommand import bazel_startup_args
+    from bazelwrapper.env.bazel_server import output_base
+
+    return output_base(ctx, bazel_startup_args(ctx))
+
+
+def _output_user_root(ctx: Context) -> str:
+    from bazelwrapper.bazelcommand import bazel_startup_args
+    from bazelwrapper.env.bazel_server import output_user_root
+
+    return output_user_root(ctx, bazel_startup_args(ctx))
+
+
+def _read_workspace_dir(path: str) -> Optional[str]:
+    try:
+        with open(os.path.join(path, _WORKSPACE_FILE_NAME)) as workspace_file:
+            return workspace_file.read().strip() or None
+    except OSError:
+        return None
+
+
+def _mtime(path: str) -> float:
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return 0
+
+
+def _dir_size(root: str) -> int:
+    size = 0
+    pending = [root]
+    while pending:
+        try:
+            with os.scandir(pending.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    else:
+                        size += entry.stat(follow_symlinks=False).st_size
+        except OSError:
+            continue
+
+    return size
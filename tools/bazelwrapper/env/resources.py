@@ -0,0 +1,179 @@
+import os
+import signal
+import subprocess
+import sys
+from typing import Optional
+
+from bazelwrapper.context import Context
+
+#
+# Resource accounting of a bazel command, reported in the BI info snapshot.
+#
+# The bazel client is accounted by the rusage of the child process. Most of the work happens in the bazel server, which
+# is not a child of the wrapper, so its JVM is sampled from '/proc/<server pid>' before and after the command and the
+# difference is reported. Server stats are only available on Linux.
+#
+
+CLIENT_USER_CPU_SEC_FIELD_NAME = "bazel_client_user_cpu_sec"
+CLIENT_SYSTEM_CPU_SEC_FIELD_NAME = "bazel_client_system_cpu_sec"
+CLIENT_MAX_RSS_KB_FIELD_NAME = "bazel_client_max_rss_kb"
+CLIENT_BLOCK_INPUT_OPS_FIELD_NAME = "bazel_client_block_input_ops"
+CLIENT_BLOCK_OUTPUT_OPS_FIELD_NAME = "bazel_client_block_output_ops"
+CLIENT_VOLUNTARY_CTX_SWITCHES_FIELD_NAME = "bazel_client_voluntary_ctx_switches"
+CLIENT_INVOLUNTARY_CTX_SWITCHES_FIELD_NAME = "bazel_client_involuntary_ctx_switches"
+SERVER_USER_CPU_SEC_FIELD_NAME = "bazel_server_user_cpu_sec"
+SERVER_SYSTEM_CPU_SEC_FIELD_NAME = "bazel_server_system_cpu_sec"
+SERVER_PEAK_RSS_KB_FIELD_NAME = "bazel_server_peak_rss_kb"
+SERVER_THREADS_FIELD_NAME = "bazel_server_threads"
+SERVER_READ_BYTES_FIELD_NAME = "bazel_server_read_bytes"
+SERVER_WRITE_BYTES_FIELD_NAME = "bazel_server_write_bytes"
+
+CLIENT_FIELD_NAMES = (
+    CLIENT_USER_CPU_SEC_FIELD_NAME,
+    CLIENT_SYSTEM_CPU_SEC_FIELD_NAME,
+    CLIENT_MAX_RSS_KB_FIELD_NAME,
+    CLIENT_BLOCK_INPUT_OPS_FIELD_NAME,
+    CLIENT_BLOCK_OUTPUT_OPS_FIELD_NAME,
+    CLIENT_VOLUNTARY_CTX_SWITCHES_FIELD_NAME,
+    CLIENT_INVOLUNTARY_CTX_SWITCHES_FIELD_NAME,
+)
+
+SERVER_FIELD_NAMES = (
+    SERVER_USER_CPU_SEC_FIELD_NAME,
+    SERVER_SYSTEM_CPU_SEC_FIELD_NAME,
+    SERVER_PEAK_RSS_KB_FIELD_NAME,
+    SERVER_THREADS_FIELD_NAME,
+    SERVER_READ_BYTES_FIELD_NAME,
+    SERVER_WRITE_BYTES_FIELD_NAME,
+)
+
+# /proc/<pid>/stat fields, 0-based after the ')' that ends the process name
+_STAT_UTIME_INDEX = 11
+_STAT_STIME_INDEX = 12
+
+
+class BazelResourceUsage:
+    def __init__(self):
+        self.client = None  # type: Optional[dict]
+        self._server_pid = None  # type: Optional[int]
+        self._server_sample_before = None  # type: Optional[dict]
+        self.server = None  # type: Optional[dict]
+
+    def sample_server_before(self, ctx: Context, startup_args):
+        self._server_pid, self._server_sample_before = _sample_server(ctx, startup_args)
+
+    def sample_server_after(self, ctx: Context, startup_args):
+        pid, after = _sample_server(ctx, startup_args)
+        if after is None:
+            return
+
+        if pid != self._server_pid or self._server_sample_before is None:
+            # The server was started (or restarted) by the command, all of its usage happened within the command
+            before = {name: 0 for name in ("utime_sec", "stime_sec", "read_bytes", "write_bytes")}
+        else:
+            before = self._server_sample_before
+
+        self.server = {
+            SERVER_USER_CPU_SEC_FIELD_NAME: round(after["utime_sec"] - before["utime_sec"], 3),
+            SERVER_SYSTEM_CPU_SEC_FIELD_NAME: round(after["stime_sec"] - before["stime_sec"], 3),
+            # Peak over the server lifetime, the kernel does not keep a windowed peak
+            SERVER_PEAK_RSS_KB_FIELD_NAME: after["peak_rss_kb"],
+            SERVER_THREADS_FIELD_NAME: after["threads"],
+            SERVER_READ_BYTES_FIELD_NAME: _delta_or_none(after["read_bytes"], before["read_bytes"]),
+            SERVER_WRITE_BYTES_FIELD_NAME: _delta_or_none(after["write_bytes"], before["write_bytes"]),
+        }
+
+    def fields(self) -> dict:
+        """
+        The info snapshot fields, None when not available.
+        """
+        return {
+            **{name: None for name in CLIENT_FIELD_NAMES + SERVER_FIELD_NAMES},
+            **(self.client or {}),
+            **(self.server or {}),
+        }
+
+
+def wait_with_rusage(p: subprocess.Popen, ctx: Context, usage: BazelResourceUsage) -> int:
+    """
+    Waits for the bazel client like 'Popen.wait' and records its rusage. SIGINT is forwarded to the client on a keyboard
+    interrupt, so bazel can cancel the command gracefully.
+    """
+    try:
+        _, status, rusage = os.wait4(p.pid, 0)
+    except KeyboardInterrupt:
+        ctx.logger.debug("Keyboard interrupt received. Sending 'SIGINT' to the bazel process.")
+        p.send_signal(signal.SIGINT)
+        _, status, rusage = os.wait4(p.pid, 0)
+
+    # Keeps the Popen object consistent, it must not wait for the reaped process again
+    p.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+
+    usage.client = {
+        CLIENT_USER_CPU_SEC_FIELD_NAME: round(rusage.ru_utime, 3),
+        CLIENT_SYSTEM_CPU_SEC_FIELD_NAME: round(rusage.ru_stime, 3),
+        # Reported in bytes on macOS and in kilobytes on Linux
+        CLIENT_MAX_RSS_KB_FIELD_NAME: rusage.ru_maxrss // 1024 if sys.platform == "darwin" else rusage.ru_maxrss,
+        CLIENT_BLOCK_INPUT_OPS_FIELD_NAME: rusage.ru_inblock,
+        CLIENT_BLOCK_OUTPUT_OPS_FIELD_NAME: rusage.ru_oublock,
+        CLIENT_VOLUNTARY_CTX_SWITCHES_FIELD_NAME: rusage.ru_nvcsw,
+        CLIENT_INVOLUNTARY_CTX_SWITCHES_FIELD_NAME: rusage.ru_nivcsw,
+    }
+
+    return p.returncode
+
+
+def _sample_server(ctx: Context, startup_args):
+    if not os.path.isdir("/proc"):
+        return None, None
+
+    from bazelwrapper.env.bazel_server import server_pid
+
+    pid = server_pid(ctx, startup_args)
+    if pid is None:
+        return None, None
+
+    try:
+        return pid, _sample_process(pid)
+    except (OSError, ValueError, IndexError) as err:
+        ctx.logger.debug("Failed to sample the bazel server (pid={pid}). Error: {error}".format(pid=pid, error=err))
+        return None, None
+
+
+def _sample_process(pid: int) -> dict:
+    clock_ticks = os.sysconf("SC_CLK_TCK")
+
+    with open("/proc/{}/stat".format(pid)) as stat_file:
+        # The process name may contain spaces, the fields are split after it
+        stat_fields = stat_file.read().rsplit(")", 1)[1].split()
+
+    status = {}
+    with open("/proc/{}/status".format(pid)) as status_file:
+        for line in status_file:
+            name, _, value = line.partition(":")
+            status[name] = value.strip()
+
+    io = {}
+    try:
+        with open("/proc/{}/io".format(pid)) as io_file:
+            for line in io_file:
+                name, _, value = line.partition(":")
+                io[name] = int(value)
+    except PermissionError:
+        pass  # restricted on some kernels
+
+    return {
+        "utime_sec": int(stat_fields[_STAT_UTIME_INDEX]) / clock_ticks,
+        "stime_sec": int(stat_fields[_STAT_STIME_INDEX]) / clock_ticks,
+        "peak_rss_kb": int(status["VmHWM"].split()[0]) if "VmHWM" in status else None,
+        "threads": int(status["Threads"]) if "Threads" in status else None,
+        "read_bytes": io.get("read_bytes"),
+        "write_bytes": io.get("write_bytes"),
+    }
+
+
+def _delta_or_none(after: Optional[int], before: Optional[int]) -> Optional[int]:
+    if after is None or before is None:
+        return None
+
+    return after - before
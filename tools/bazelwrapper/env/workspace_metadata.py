@@ -0,0 +1,176 @@
+import json
+import os
+import re
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from bazelwrapper.context import Context
+
+#
+# An on-disk record of the workspace metadata, kept in the wrapper config dir.
+#
+# It maps the directories the wrapper was run from to their workspace, so running from a deep subdirectory does not
+# walk up the tree, and keeps the values parsed from the workspace files, validated by the files' mtimes.
+#
+# IMPORTANT:
+# A mapping is valid as long as the WORKSPACE file of the mapped workspace exists. A workspace nested in between (e.g.
+# a new WORKSPACE file in a subdirectory of a cached checkout) is not picked up until the mapping is evicted.
+#
+
+_RECORD_FORMAT_VERSION = 1
+
+_RECORD_FILE_NAME = "workspaces.json"
+
+_WORKSPACE_FILE_NAME = "WORKSPACE"
+
+_MAX_DIR_MAPPINGS = 256
+
+_REPOSITORY_NAME_PATTERN = re.compile(r"""\s*repository_name\s*=\s*"([^"]+)"\s*""")
+
+
+def _parse_repository_name(file_path: str) -> Optional[str]:
+    with open(file_path, "r") as workspace_file:
+        for line in workspace_file:
+            match = _REPOSITORY_NAME_PATTERN.match(line)
+            if match:
+                return match.group(1)
+
+    return None
+
+
+def _parse_tools_version(file_path: str) -> Optional[str]:
+    try:
+        with open(file_path) as version_file:
+            return version_file.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def _parse_minimum_required_wixtaller_version(file_path: str) -> str:
+    with open(file_path, mode='r') as wixtaller_json_file:
+        return json.load(wixtaller_json_file)["minimumRequiredVersion"]
+
+
+class _WorkspaceValue:
+    def __init__(self, name: str, relative_path: str, parse: Callable[[str], Any]):
+        self.name = name
+        self.relative_path = relative_path
+        self.parse = parse
+
+
+_VALUES = (
+    _WorkspaceValue("repository", _WORKSPACE_FILE_NAME, _parse_repository_name),
+    _WorkspaceValue("tools_version", os.path.join("tools", "info", ".toolsversion"), _parse_tools_version),
+    _WorkspaceValue("minimum_required_wixtaller_version", os.path.join("tools", "info", "wixtaller.json"),
+                    _parse_minimum_required_wixtaller_version),
+)
+
+
+def find_workspace_dir(current_dir: str, config_dir: str) -> str:
+    """
+    The workspace of the given directory, from the record when possible.
+    """
+    record_file_path = os.path.join(config_dir, _RECORD_FILE_NAME)
+    record = _load_record(record_file_path)
+    dirs = record["dirs"]
+
+    workspace_dir = dirs.get(current_dir)
+    if workspace_dir is not None and os.path.exists(os.path.join(workspace_dir, _WORKSPACE_FILE_NAME)):
+        return workspace_dir
+
+    workspace_dir = _walk_up_to_workspace(current_dir)
+
+    if workspace_dir != "/":
+        dirs[current_dir] = workspace_dir
+        while len(dirs) > _MAX_DIR_MAPPINGS:
+            del dirs[next(iter(dirs))]
+
+        _write_record_safe(record_file_path, record, config_dir)
+
+    return workspace_dir
+
+
+def workspace_values(ctx: Context, names: Optional[Iterable[str]]=None) -> Dict[str, Any]:
+    """
+    Returns the requested values (all by default) of the context's workspace, parsing only the files that changed since
+    they were recorded. Parsing errors are raised.
+    """
+    if names is None:
+        values_to_resolve = _VALUES
+    else:
+        names = set(names)
+        values_to_resolve = [value for value in _VALUES if value.name in names]
+
+    record_file_path = os.path.join(ctx.config_dir, _RECORD_FILE_NAME)
+    record = _load_record(record_file_path)
+    entries = record["workspaces"].setdefault(ctx.workspace_dir, {})
+
+    values = {}
+    changed = False
+
+    for value in values_to_resolve:
+        file_path = os.path.join(ctx.workspace_dir, value.relative_path)
+        source_mtime = _mtime_or_none(file_path)
+        entry = entries.get(value.name)
+
+        if entry is not None and entry["source_mtime"] == source_mtime:
+            values[value.name] = entry["value"]
+            continue
+
+        ctx.logger.debug("Parsing '{path}'".format(path=file_path))
+        values[value.name] = value.parse(file_path)
+        entries[value.name] = {"value": values[value.name], "source_mtime": source_mtime}
+        changed = True
+
+    if changed:
+        _write_record_safe(record_file_path, record, ctx.config_dir)
+
+    return values
+
+
+def workspace_value(ctx: Context, name: str):
+    return workspace_values(ctx, names=(name,))[name]
+
+
+def _walk_up_to_workspace(current_dir: str) -> str:
+    ws_dir = current_dir
+    while ws_dir != "/":
+        if os.path.exists(os.path.join(ws_dir, _WORKSPACE_FILE_NAME)):
+            return ws_dir
+        else:
+            ws_dir = os.path.abspath(os.path.join(ws_dir, os.pardir))
+
+    return ws_dir
+
+
+def _load_record(record_file_path: str) -> dict:
+    # Loaded before the context exists, so a corrupted record is silently rebuilt
+    try:
+        with open(record_file_path) as record_file:
+            record = json.load(record_file)
+    except Exception:
+        record = None
+
+    if not isinstance(record, dict) or record.get("version") != _RECORD_FORMAT_VERSION:
+        return {"version": _RECORD_FORMAT_VERSION, "dirs": {}, "workspaces": {}}
+
+    return record
+
+
+def _write_record_safe(record_file_path: str, record: dict, config_dir: str):
+    if not os.path.isdir(config_dir):
+        # Created along with the context (see 'context.ensure_directories')
+        return
+
+    from bazelwrapper.utils.json_store import write_json_atomic
+
+    try:
+        write_json_atomic(record_file_path, record)
+    except OSError:
+        pass
+
+
+def _mtime_or_none(path: str) -> Optional[float]:
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
@@ -0,0 +1,38 @@
+from bazelwrapper.context import Context
+from bazelwrapper.utils.feature_flags import Flag
+
+# Commands that only read the build graph or the server state. They are issued very frequently by IDEs and scripts and
+# they never produce a BI profile or a build event file worth reporting.
+_READ_ONLY_COMMANDS = {"info", "query", "cquery", "aquery"}
+
+# Tool tags set by IDE plugins on the commands they issue, e.g. '--tool_tag=ijwb:IDEA:ultimate:...'
+_IDE_TOOL_TAG_PREFIXES = ("ijwb:",)
+
+# A cascading flag to turn off the fast path and always run the full wrapper flow
+_fast_path_disabled_flag = Flag(
+    full_cli_flag="--wix_nofastpath",
+    marker_file_name=".nofastpath",
+    env_var_name="WIX_BAZEL_WRAPPER_FAST_PATH_DISABLED",
+    default_value=False,
+)
+
+
+def is_fast_path(ctx: Context) -> bool:
+    """
+    Fast path invocations skip BI reporting and post command inspections, only resolve the VMR vector when its symlink
+    is not valid and replace the wrapper process with the real bazel client.
+    """
+    if _fast_path_disabled_flag.on(ctx):
+        return False
+
+    return ctx.is_bypassed_command or \
+        ctx.bazel_command() in _READ_ONLY_COMMANDS or \
+        is_ide_invocation(ctx)
+
+
+def is_ide_invocation(ctx: Context) -> bool:
+    for tool_tag in ctx.command_line.option_values("--tool_tag"):
+        if tool_tag.startswith(_IDE_TOOL_TAG_PREFIXES):
+            return True
+
+    return False
@@ -0,0 +1,221 @@
+import hashlib
+import json
+import os
+import time
+from logging import DEBUG
+from typing import Callable, List, Tuple
+
+from bazelwrapper.context import Context, WixFlags, ENV_VAR_RBE_ACTIVE_PROVIDER, OUTPUT_BASE_DIR
+from bazelwrapper.utils.feature_flags import Flag
+from bazelwrapper.utils.json_store import load_json_safe, write_json_atomic
+
+#
+# An on-disk cache of the flags the wrapper injects into the bazel command line.
+#
+# Entries are keyed by a fingerprint of everything the flags are derived from. Per-invocation flags (e.g. the BI profile
+# path) are cached as placeholders and expanded by 'bazelcommand' on every run.
+#
+# IMPORTANT:
+# Keep the inputs below in sync with 'bazelcommand', 'remotecache' and the flags they consult. An input that is missing
+# from the fingerprint results in stale flags.
+#
+
+_CACHE_FORMAT_VERSION = 2
+
+_CACHE_FILE_NAME = "flags_cache.json"
+
+_MAX_ENTRIES = 32
+_MAX_ENTRY_AGE_SEC = 24 * 60 * 60
+
+# Environment variables consulted while resolving the flags. Their values (or absence) are part of the fingerprint.
+_INPUT_ENV_VAR_NAMES = (
+    ENV_VAR_RBE_ACTIVE_PROVIDER,
+    OUTPUT_BASE_DIR,
+    "BUILDKITE_BUILD_URL",
+    "BUILDKITE_PIPELINE_SLUG",
+    "BUILDKITE_MESSAGE",
+    "REMOTE_CACHE_USE_WIX_CACHE_POPS",
+    "WIX_BAZEL_REMOTE_CACHE_BASE_URL",
+    "WIX_BAZEL_REMOTE_CACHE_BUCKET_NAME",
+    "WIX_BAZEL_REMOTE_CACHE_DISABLED",
+    "WIX_BAZEL_DISK_CACHE_ENABLED",
+    "WIX_BAZEL_USE_SANDBOX_TEST_STRATEGY",
+    "WIX_DEVEX_BI_ENABLED",
+    "WIX_DEVEX_LOCALDEV_WORKSTATION",
+)
+
+# Secrets passed by env vars are never written to disk, the cache is bypassed when any of them is set
+_SECRET_ENV_VAR_NAMES = ("API_KEY_ENGFLOW", "API_KEY_BUILDBUDDY")
+
+# Marker files in the config dir consulted while resolving the flags
+_INPUT_MARKER_FILE_NAMES = (".localdev", ".bienabled", ".nocache", ".diskcache")
+
+# See 'bazelwrapper.remotecache.endpoints' and 'bazelwrapper.remotecache.diskcache', not imported to keep the remote
+# cache package out of cache hits
+_REMOTE_CACHE_ENDPOINTS_FILE_NAME = "remote_cache_endpoints.json"
+_DISK_CACHE_SETTINGS_FILE_NAME = "disk_cache.json"
+
+# A cascading flag to turn off the flags cache
+_flags_cache_disabled_flag = Flag(
+    full_cli_flag="--wix_noflagscache",
+    marker_file_name=".noflagscache",
+    env_var_name="WIX_BAZEL_WRAPPER_FLAGS_CACHE_DISABLED",
+    default_value=False,
+)
+
+# Logs the reason of a cache miss at info level
+_FLAGS_CACHE_DEBUG_FLAG = "{prefix}_debug_flags_cache".format(prefix=WixFlags.PREFIX)
+
+# Wrapper options that never affect the injected flags
+_NON_INPUT_USER_OPTIONS = {WixFlags.DEBUG, WixFlags.BI_REPORTER_RUN_SYNC, _FLAGS_CACHE_DEBUG_FLAG}
+
+Flags = Tuple[List[str], List[str]]
+
+
+def cached_flags(ctx: Context, main_command: bool, with_bi: bool, resolve: Callable[[], Flags]) -> Flags:
+    """
+    Returns the (startup flags, command flags) of the command, calling 'resolve' only on a cache miss.
+    """
+    if _flags_cache_disabled_flag.on(ctx) or _has_secret_env_vars():
+        return resolve()
+
+    inputs = fingerprint_inputs(ctx, main_command, with_bi)
+    fingerprint = _fingerprint_of(inputs)
+
+    cache_file_path = os.path.join(ctx.config_dir, _CACHE_FILE_NAME)
+    cache = load_json_safe(cache_file_path, default_value={}, ctx=ctx)
+    if cache.get("version") != _CACHE_FORMAT_VERSION:
+        cache = {"version": _CACHE_FORMAT_VERSION, "entries": {}}
+
+    entries = cache["entries"]
+    now = time.time()
+
+    entry = entries.get(fingerprint)
+    if entry is not None and now - entry["created"] < _MAX_ENTRY_AGE_SEC:
+        ctx.logger.debug("Flags cache hit. fingerprint: {}".format(fingerprint))
+        return entry["startup_flags"], entry["command_flags"]
+
+    _explain_miss(ctx, inputs, entry, entries.values())
+
+    startup_flags, command_flags = resolve()
+
+    entries[fingerprint] = {
+        "created": now,
+        "inputs": inputs,
+        "startup_flags": startup_flags,
+        "command_flags": command_flags,
+    }
+    _evict(entries, now)
+
+    try:
+        # The entries may contain remote cache credentials
+        write_json_atomic(cache_file_path, cache, mode=0o600)
+    except OSError as err:
+        ctx.logger.debug("Failed to write the flags cache. Error: {error}".format(error=err))
+
+    return startup_flags, command_flags
+
+
+def fingerprint_inputs(ctx: Context, main_command: bool, with_bi: bool) -> dict:
+    return {
+        "bazel_command": ctx.bazel_command(),
+        # Targets never affect the injected flags, keeping them out allows sharing entries between builds
+        "user_options": [arg for arg in _user_options(ctx) if arg not in _NON_INPUT_USER_OPTIONS],
+        "main_command": main_command,
+        "with_bi": with_bi,
+        "env": {name: os.environ.get(name) for name in _INPUT_ENV_VAR_NAMES},
+        "markers": {name: ctx.flag_snapshot.has_marker_file(name) for name in _INPUT_MARKER_FILE_NAMES},
+        "managed_bazelrc": os.path.exists(os.path.join(ctx.config_dir, "managed.bazelrc")),
+        # The candidates only, the endpoint is selected per invocation
+        "remote_cache_endpoints": _mtime_or_none(os.path.join(ctx.config_dir, _REMOTE_CACHE_ENDPOINTS_FILE_NAME)),
+        "disk_cache_settings": _mtime_or_none(os.path.join(ctx.config_dir, _DISK_CACHE_SETTINGS_FILE_NAME)),
+        "credentials": {
+            path: _mtime_or_none(path) for path in (
+                ctx.gcloud_creds_filepath,
+                ctx.buildbuddy_api_key_filepath,
+                ctx.engflow_api_key_filepath,
+                ctx.engflow_tls_key_filepath,
+                ctx.engflow_tls_crt_filepath,
+            )
+        },
+    }
+
+
+def _user_options(ctx: Context) -> List[str]:
+    command_line = ctx.command_line
+    return [*command_line.startup_options, *command_line.command_options, *command_line.wrapper_options]
+
+
+def _fingerprint_of(inputs: dict) -> str:
+    canonical = json.dumps(inputs, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _has_secret_env_vars() -> bool:
+    for name in _SECRET_ENV_VAR_NAMES:
+        if name in os.environ:
+            return True
+
+    return False
+
+
+def _explain_miss(ctx: Context, inputs: dict, expired_entry, entries):
+    if ctx.command_line.has_arg(_FLAGS_CACHE_DEBUG_FLAG):
+        log = ctx.logger.info
+    elif ctx.logger.isEnabledFor(DEBUG):
+        log = ctx.logger.debug
+    else:
+        return
+
+    if expired_entry is not None:
+        log("Flags cache miss: the entry has expired.")
+        return
+
+    # Comparing against the most recent entry of the same command, which is most likely the one the user expected
+    same_command = [entry for entry in entries
+                    if entry["inputs"]["bazel_command"] == inputs["bazel_command"] and
+                    entry["inputs"]["main_command"] == inputs["main_command"]]
+    if not same_command:
+        log("Flags cache miss: no entry for command '{}'.".format(inputs["bazel_command"]))
+        return
+
+    closest = max(same_command, key=lambda entry: entry["created"])
+    for difference in _diff_inputs(closest["inputs"], inputs):
+        log("Flags cache miss: {}".format(difference))
+
+
+def _diff_inputs(cached: dict, current: dict, path="") -> List[str]:
+    differences = []
+    for key in sorted(set(cached) | set(current)):
+        cached_value = cached.get(key)
+        current_value = current.get(key)
+        key_path = "{}.{}".format(path, key) if path else key
+
+        if isinstance(cached_value, dict) and isinstance(current_value, dict):
+            differences.extend(_diff_inputs(cached_value, current_value, key_path))
+        elif cached_value != current_value:
+            differences.append("'{}' changed from {} to {}".format(
+                key_path, json.dumps(cached_value), json.dumps(current_value)))
+
+    return differences
+
+
+def _evict(entries: dict, now: float):
+    for fingerprint, entry in list(entries.items()):
+        if now - entry["created"] >= _MAX_ENTRY_AGE_SEC:
+            del entries[fingerprint]
+
+    if len(entries) > _MAX_ENTRIES:
+        by_age = sorted(entries.items(), key=lambda item: item[1]["created"])
+        for fingerprint, _ in by_age[:len(entries) - _MAX_ENTRIES]:
+            del entries[fingerprint]
+
+
+def _mtime_or_none(path):
+    if not path:
+        return None
+
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
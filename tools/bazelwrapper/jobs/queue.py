@@ -0,0 +1,129 @@
+import os
+import time
+from typing import List, Optional
+
+from bazelwrapper.context import Context
+from bazelwrapper.utils.json_store import load_json_safe, write_json_atomic
+
+#
+# A durable local queue of post command jobs.
+#
+# Every job is a JSON file in '<config_dir>/jobs'. File names start with the enqueue time, so listing the directory
+# returns the jobs in FIFO order. The queue is drained by the detached job worker (see 'bazelwrapper.jobs.worker').
+#
+
+_JOBS_DIR_NAME = "jobs"
+_FAILED_JOBS_DIR_NAME = "failed"
+_JOB_FILE_EXTENSION = ".job.json"
+
+MAX_ATTEMPTS = 3
+
+# Jobs that were not processed for this long are dropped, the data they refer to is most likely gone
+MAX_JOB_AGE_SEC = 7 * 24 * 60 * 60
+
+
+class Job:
+    def __init__(self, file_path: str, data: dict):
+        self.file_path = file_path
+        self.data = data
+
+    @property
+    def id(self) -> str:
+        return self.data["id"]
+
+    @property
+    def kind(self) -> str:
+        return self.data["kind"]
+
+    @property
+    def payload(self) -> dict:
+        return self.data["payload"]
+
+    @property
+    def attempts(self) -> int:
+        return self.data.get("attempts", 0)
+
+    def is_expired(self) -> bool:
+        return time.time() - self.data["created"] > MAX_JOB_AGE_SEC
+
+
+def jobs_dir_path(base_dir: str) -> str:
+    return os.path.join(base_dir, _JOBS_DIR_NAME)
+
+
+def enqueue(ctx: Context, kind: str, payload: Optional[dict]=None) -> Job:
+    created = time.time()
+    job_id = "{time_ns}-{unique_id}".format(time_ns=time.time_ns(), unique_id=ctx.unique_id)
+
+    data = {
+        "id": job_id,
+        "kind": kind,
+        "created": created,
+        "attempts": 0,
+        # The worker recreates the invocation context from these
+        "workspace_dir": ctx.workspace_dir,
+        "wix_flags": list(ctx.command_line.wrapper_options),
+        "payload": payload or {},
+    }
+
+    file_path = os.path.join(jobs_dir_path(ctx.config_dir), job_id + _JOB_FILE_EXTENSION)
+    write_json_atomic(file_path, data)
+
+    ctx.logger.debug("Enqueued '{kind}' job '{id}'".format(kind=kind, id=job_id))
+
+    return Job(file_path, data)
+
+
+def pending_jobs(base_dir: str, ctx: Context) -> List[Job]:
+    jobs_dir = jobs_dir_path(base_dir)
+
+    try:
+        names = sorted(name for name in os.listdir(jobs_dir) if name.endswith(_JOB_FILE_EXTENSION))
+    except FileNotFoundError:
+        return []
+
+    jobs = []
+    for name in names:
+        file_path = os.path.join(jobs_dir, name)
+        data = load_json_safe(file_path, default_value=None, ctx=ctx)
+        if data is None:
+            # Corrupted, or already completed by someone else
+            _remove_safe(file_path)
+            continue
+
+        jobs.append(Job(file_path, data))
+
+    return jobs
+
+
+def has_pending_jobs(base_dir: str) -> bool:
+    try:
+        return any(name.endswith(_JOB_FILE_EXTENSION) for name in os.listdir(jobs_dir_path(base_dir)))
+    except FileNotFoundError:
+        return False
+
+
+def complete(job: Job):
+    _remove_safe(job.file_path)
+
+
+def retry_or_fail(job: Job, error: str):
+    """
+    Keeps a failed job in the queue for another attempt, or moves it aside once it ran out of attempts.
+    """
+    job.data["attempts"] = job.attempts + 1
+    job.data["last_error"] = error
+
+    if job.attempts < MAX_ATTEMPTS:
+        write_json_atomic(job.file_path, job.data)
+    else:
+        failed_dir = os.path.join(os.path.dirname(job.file_path), _FAILED_JOBS_DIR_NAME)
+        write_json_atomic(os.path.join(failed_dir, os.path.basename(job.file_path)), job.data)
+        _remove_safe(job.file_path)
+
+
+def _remove_safe(file_path: str):
+    try:
+        os.remove(file_path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,155 @@
+import logging
+import os
+import time
+
+from bazelwrapper.context import Context, config_dir, create_cli_context, create_logger
+from bazelwrapper.jobs import queue
+from bazelwrapper.jobs.queue import Job
+from bazelwrapper.utils.logging import daily_log_file_handler
+from bazelwrapper.utils.pidlock import Lock
+from bazelwrapper.utils.subproc_launcher import PySubprocessLauncher
+
+LOCK_FAILURE_EXIT_CODE = 3
+
+JOB_BI_REPORT = "bi_report"
+JOB_REMOTE_CACHE_PROBE = "remote_cache_probe"
+JOB_DISK_CACHE_GC = "disk_cache_gc"
+JOB_OUTPUT_BASE_RECLAIM = "output_base_reclaim"
+
+
+def _run_bi_report(ctx: Context, job: Job):
+    from bazelwrapper.bi.entrypoint import report, ReporterBusyError
+
+    try:
+        report(ctx)
+    except ReporterBusyError as err:
+        # The running reporter processes every ready profile, including the one of this job
+        ctx.logger.info("BI reporter is already running (pid={pid}), skipping.".format(pid=err.pid))
+
+
+def _run_remote_cache_probe(ctx: Context, job: Job):
+    from bazelwrapper.remotecache.endpoints import probe_endpoints
+
+    probe_endpoints(ctx, job.payload["endpoints"])
+
+
+def _run_disk_cache_gc(ctx: Context, job: Job):
+    from bazelwrapper.remotecache.diskcache import collect_garbage
+
+    collect_garbage(ctx)
+
+
+def _run_output_base_reclaim(ctx: Context, job: Job):
+    from bazelwrapper.env.outputbases import reclaim
+
+    reclaim(ctx, current_output_base=job.payload["current_output_base"])
+
+
+# Job kind -> handler. Handlers import what they need lazily, a worker usually runs a single kind of job.
+_HANDLERS = {
+    JOB_BI_REPORT: _run_bi_report,
+    JOB_REMOTE_CACHE_PROBE: _run_remote_cache_probe,
+    JOB_DISK_CACHE_GC: _run_disk_cache_gc,
+    JOB_OUTPUT_BASE_RECLAIM: _run_output_base_reclaim,
+}
+
+
+def start_worker(ctx: Context):
+    """
+    Launches a detached job worker, unless one is already draining the queue. The worker outlives the wrapper and the
+    terminal session it runs in.
+    """
+    launcher = PySubprocessLauncher(
+        title="Job worker",
+        main_py_script_path=os.path.join(ctx.workspace_dir, 'tools', 'jobworker'),
+        detached=True
+    )
+    launcher.launch(ctx)
+
+
+def _create_file_logger(name: str):
+    logs_dir = os.path.join(config_dir(), "logs")
+    os.makedirs(logs_dir, exist_ok=True)
+    log_path = os.path.join(logs_dir, name)
+    log_level = os.environ.get("WIX_BAZEL_WRAPPER_JOB_WORKER_LOG_LEVEL") or "DEBUG"
+
+    return create_logger(level=logging.getLevelName(log_level), handler=daily_log_file_handler(log_path=log_path))
+
+
+def _on_process_lock_failed(locker_pid):
+    # Another worker is draining the queue, it will pick up the jobs of this invocation as well
+    exit(LOCK_FAILURE_EXIT_CODE)
+
+
+def _drain(base_dir: str, ctx: Context, attempted: set):
+    # Re-listing after every batch picks up the jobs that were enqueued while the previous ones were running. A failed
+    # job is retried by the next worker rather than right away.
+    while True:
+        jobs = _unattempted_jobs(base_dir, ctx, attempted)
+        if not jobs:
+            return
+
+        for job in jobs:
+            attempted.add(job.id)
+            _run(job, ctx.logger)
+
+
+def _unattempted_jobs(base_dir: str, ctx: Context, attempted: set):
+    return [job for job in queue.pending_jobs(base_dir, ctx) if job.id not in attempted]
+
+
+def _run(job: Job, logger: logging.Logger):
+    if job.is_expired():
+        logger.info("Dropping expired '{kind}' job '{id}'".format(kind=job.kind, id=job.id))
+        queue.complete(job)
+        return
+
+    handler = _HANDLERS.get(job.kind)
+    if handler is None:
+        logger.warning("Dropping '{kind}' job '{id}' of an unknown kind".format(kind=job.kind, id=job.id))
+        queue.complete(job)
+        return
+
+    logger.info("Running '{kind}' job '{id}' (attempt {attempt})...".format(
+        kind=job.kind, id=job.id, attempt=job.attempts + 1))
+    started = time.monotonic()
+
+    try:
+        # The context consumes the wrapper options of the args, the job data is kept as is for a retry
+        ctx = create_cli_context(logger=logger, user_args=list(job.data["wix_flags"]),
+                                 workspace_dir=job.data["workspace_dir"])
+        handler(ctx, job)
+    except Exception as ex:
+        logger.exception(ex)
+        logger.error("Job '{id}' failed after {elapsed:.0f}ms".format(
+            id=job.id, elapsed=(time.monotonic() - started) * 1000))
+        queue.retry_or_fail(job, error=str(ex))
+        return
+
+    logger.info("Job '{id}' finished in {elapsed:.0f}ms".format(id=job.id, elapsed=(time.monotonic() - started) * 1000))
+    queue.complete(job)
+
+
+def main():
+    # Created first, so code that uses utils.logging.get_default_logger() (e.g. the LockMaintainer thread) logs to file
+    logger = _create_file_logger("jobworker.log")
+
+    ctx = create_cli_context(logger=logger)
+    base_dir = config_dir()
+    lock_file_path = os.path.join(base_dir, ".jobworker.lock")
+    attempted = set()
+
+    while True:
+        with Lock(file_path=lock_file_path, on_failure=_on_process_lock_failed, auto_refresh=True):
+            logger.info("Job worker starting...")
+
+            try:
+                _drain(base_dir, ctx, attempted)
+            except Exception as ex:
+                logger.exception(ex)
+            finally:
+                logger.info("Job worker finished.")
+
+        # A job enqueued right before the lock was released has no other worker to run it
+        if not _unattempted_jobs(base_dir, ctx, attempted):
+            break
@@ -0,0 +1,146 @@
+import os
+import socket
+import time
+from typing import List, Optional
+
+from bazelwrapper.context import Context
+from bazelwrapper.remotecache.endpoints import endpoint_address
+from bazelwrapper.utils.feature_flags import Flag
+from bazelwrapper.utils.json_store import load_json_safe, write_json_atomic
+
+#
+# A circuit breaker of the remote cache endpoint.
+#
+# An unreachable remote cache (e.g. VPN down) costs bazel a connection timeout and retries on every action. The
+# endpoint of the command is probed by a short TCP connect while the wrapper prepares the command. Once a probe fails,
+# the circuit opens: the command runs with the local cache only and the endpoint is not probed again until its backoff
+# elapsed. The backoff doubles with every consecutive failure.
+#
+# The state is kept per endpoint in '<config_dir>/remote_cache_circuit.json'.
+#
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+
+_remote_cache_circuit_disabled_flag = Flag(
+    env_var_name="WIX_BAZEL_REMOTE_CACHE_CIRCUIT_DISABLED",
+    env_var_required_value="1"
+)
+
+_CIRCUIT_FILE_NAME = "remote_cache_circuit.json"
+
+_REMOTE_CACHE_FLAG_PREFIX = "--remote_cache="
+_REMOTE_HEADER_FLAG_PREFIX = "--remote_header="
+
+_PROBE_TIMEOUT_SEC = 0.5
+# A reachable endpoint is not probed again for a while
+_CLOSED_RECHECK_SEC = 60
+
+_INITIAL_BACKOFF_SEC = 30
+_MAX_BACKOFF_SEC = 30 * 60
+
+_CIRCUIT_FIELDS = {
+    CIRCUIT_CLOSED: ("failures", "checked_at"),
+    CIRCUIT_OPEN: ("failures", "checked_at", "retry_at"),
+}
+
+
+def remote_cache_endpoint(bazel_command: List[str]) -> Optional[str]:
+    endpoint = None
+    for arg in bazel_command:
+        if arg.startswith(_REMOTE_CACHE_FLAG_PREFIX):
+            endpoint = arg[len(_REMOTE_CACHE_FLAG_PREFIX):] or None
+
+    return endpoint
+
+
+def check_circuit(ctx: Context, bazel_command: List[str], probe: bool=True) -> Optional[str]:
+    """
+    The circuit state of the remote cache endpoint injected by the wrapper, None when the command uses no remote cache
+    or the user chose its own. The endpoint is only probed when 'probe' is True and its last known state is due for a
+    check.
+    """
+    endpoint = remote_cache_endpoint(bazel_command)
+    if endpoint is None or \
+            ctx.command_line.has_option("--remote_cache") or \
+            _remote_cache_circuit_disabled_flag.on(ctx):
+        return None
+
+    circuit_file_path = os.path.join(ctx.config_dir, _CIRCUIT_FILE_NAME)
+    circuit = _load_circuits(ctx, circuit_file_path).get(endpoint)
+    if not _is_valid_circuit(circuit):
+        circuit = {"state": CIRCUIT_CLOSED, "failures": 0, "checked_at": 0}
+    now = time.time()
+
+    if circuit["state"] == CIRCUIT_OPEN:
+        is_due = now >= circuit["retry_at"]
+    else:
+        is_due = now - circuit["checked_at"] >= _CLOSED_RECHECK_SEC
+
+    if not probe or not is_due:
+        return circuit["state"]
+
+    if _is_reachable(ctx, endpoint):
+        if circuit["state"] == CIRCUIT_OPEN:
+            ctx.logger.info("Remote cache '{endpoint}' is reachable again.".format(endpoint=endpoint))
+
+        circuit = {"state": CIRCUIT_CLOSED, "failures": 0, "checked_at": now}
+    else:
+        failures = circuit["failures"] + 1
+        backoff_sec = min(_INITIAL_BACKOFF_SEC * 2 ** (failures - 1), _MAX_BACKOFF_SEC)
+        circuit = {"state": CIRCUIT_OPEN, "failures": failures, "checked_at": now, "retry_at": now + backoff_sec}
+
+    # Re-read, other endpoints may have been checked in the meantime
+    circuits = _load_circuits(ctx, circuit_file_path)
+    circuits[endpoint] = circuit
+    try:
+        write_json_atomic(circuit_file_path, circuits)
+    except OSError as err:
+        ctx.logger.debug("Failed to store the remote cache circuit. Error: {error}".format(error=err))
+
+    return circuit["state"]
+
+
+def apply_circuit(ctx: Context, bazel_command: List[str], state: Optional[str]) -> List[str]:
+    """
+    Turns off the remote cache of the command while its circuit is open.
+    """
+    if state != CIRCUIT_OPEN:
+        return bazel_command
+
+    ctx.logger.warn("Remote cache '{endpoint}' is unreachable, running with the local cache only.".format(
+        endpoint=remote_cache_endpoint(bazel_command)))
+
+    # An empty value turns the remote cache off, the headers only carry its credentials
+    return [
+        _REMOTE_CACHE_FLAG_PREFIX if arg.startswith(_REMOTE_CACHE_FLAG_PREFIX) else arg
+        for arg in bazel_command
+        if not arg.startswith(_REMOTE_HEADER_FLAG_PREFIX)
+    ]
+
+
+def _load_circuits(ctx: Context, circuit_file_path: str) -> dict:
+    circuits = load_json_safe(circuit_file_path, default_value={}, ctx=ctx)
+
+    # The file may have been edited by hand, a malformed one is ignored and rewritten by the next probe
+    return circuits if isinstance(circuits, dict) else {}
+
+
+def _is_valid_circuit(circuit) -> bool:
+    if not isinstance(circuit, dict) or circuit.get("state") not in _CIRCUIT_FIELDS:
+        return False
+
+    return all(isinstance(circuit.get(field), (int, float)) for field in _CIRCUIT_FIELDS[circuit["state"]])
+
+
+def _is_reachable(ctx: Context, endpoint: str) -> bool:
+    address = endpoint_address(endpoint)
+    if address is None:
+        return True  # e.g. a unix socket, never opened by the wrapper
+
+    try:
+        with socket.create_connection(address, timeout=_PROBE_TIMEOUT_SEC):
+            return True
+    except OSError as err:
+        ctx.logger.debug("Remote cache '{endpoint}' probe failed. Error: {error}".format(endpoint=endpoint, error=err))
+        return False
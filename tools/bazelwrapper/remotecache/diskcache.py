@@ -0,0 +1,181 @@
+import os
+import time
+from typing import List, Optional, Tuple
+
+from bazelwrapper.context import Context
+from bazelwrapper.utils.feature_flags import Flag
+from bazelwrapper.utils.json_store import load_json_safe, write_json_atomic
+
+#
+# A local disk cache tier ('--disk_cache'), shared by all the workspaces of the machine and kept within a byte budget.
+#
+# The budget and location are configured in '<config_dir>/disk_cache.json', e.g. {"max_size_gb": 50}. Bazel never
+# removes disk cache entries, so the detached job worker runs a garbage collector at most once per '_GC_INTERVAL_SEC'.
+# It removes the least recently used entries, by their access or modification time (bazel refreshes the latter on a
+# hit), until the cache is back under its low watermark. Action cache entries go before the blobs of the same age, so
+# an entry never refers to removed outputs for longer than necessary.
+#
+# The hit and eviction counters are kept in '<config_dir>/disk_cache_stats.json'.
+#
+
+# A cascading flag to turn on the managed disk cache
+_disk_cache_flag = Flag(
+    full_cli_flag="--wix_disk_cache",
+    marker_file_name=".diskcache",
+    env_var_name="WIX_BAZEL_DISK_CACHE_ENABLED",
+    default_value=False,
+)
+
+# Keep in sync with 'flagscache'
+_SETTINGS_FILE_NAME = "disk_cache.json"
+_STATS_FILE_NAME = "disk_cache_stats.json"
+
+_DEFAULT_MAX_SIZE_GB = 20
+_DEFAULT_DIR_PATH = os.path.join(".cache", "wix", "bazel-disk-cache")
+
+# The collector frees a bit more than needed, so it does not run again right after the next build
+_LOW_WATERMARK_RATIO = 0.9
+_GC_INTERVAL_SEC = 60 * 60
+
+# Removal is paced, so a collection never competes with a running build for the disk
+_REMOVE_BATCH_SIZE = 500
+_REMOVE_BATCH_PAUSE_SEC = 0.05
+
+# Action cache entries first, see above
+_ENTRY_DIR_PRIORITIES = (("ac", 0), ("cas", 1))
+
+
+class DiskCacheSettings:
+    def __init__(self, path: str, max_size_bytes: int):
+        self.path = path
+        self.max_size_bytes = max_size_bytes
+
+
+def is_disk_cache_enabled(ctx: Context) -> bool:
+    return _disk_cache_flag.on(ctx)
+
+
+def disk_cache_settings(ctx: Context) -> DiskCacheSettings:
+    settings = load_json_safe(os.path.join(ctx.config_dir, _SETTINGS_FILE_NAME), default_value={}, ctx=ctx)
+
+    path = os.path.expanduser(settings.get("path") or os.path.join(ctx.config_base_dir, _DEFAULT_DIR_PATH))
+    max_size_gb = settings.get("max_size_gb", _DEFAULT_MAX_SIZE_GB)
+
+    return DiskCacheSettings(path=path, max_size_bytes=int(max_size_gb * 1024 ** 3))
+
+
+def disk_cache_flags(ctx: Context) -> List[str]:
+    return ["--disk_cache={}".format(disk_cache_settings(ctx).path)]
+
+
+def on_command_finished(ctx: Context, hits: Optional[int]):
+    """
+    Records the hits of the command and requests a collection when the last one is due.
+    """
+    stats_file_path = os.path.join(ctx.config_dir, _STATS_FILE_NAME)
+    stats = load_json_safe(stats_file_path, default_value={}, ctx=ctx)
+    now = time.time()
+
+    if hits is not None:
+        stats["hits"] = stats.get("hits", 0) + hits
+
+    gc_due = now - max(stats.get("last_gc_at", 0), stats.get("gc_requested_at", 0)) >= _GC_INTERVAL_SEC
+    if gc_due:
+        # Recorded first, so concurrent invocations do not request the same collection
+        stats["gc_requested_at"] = now
+
+    if hits is None and not gc_due:
+        return
+
+    write_json_atomic(stats_file_path, stats)
+
+    if gc_due:
+        from bazelwrapper.jobs import queue, worker
+
+        queue.enqueue(ctx, worker.JOB_DISK_CACHE_GC)
+        worker.start_worker(ctx)
+
+
+def collect_garbage(ctx: Context):
+    """
+    Removes the least recently used entries until the cache is under its low watermark. Run by the job worker.
+    """
+    settings = disk_cache_settings(ctx)
+    started = time.monotonic()
+
+    entries, total_size = _scan(settings.path)
+    target_size = int(settings.max_size_bytes * _LOW_WATERMARK_RATIO)
+
+    ctx.logger.info("Disk cache '{path}' holds {size}MB in {count} entries, the budget is {budget}MB".format(
+        path=settings.path,
+        size=total_size // 1024 ** 2,
+        count=len(entries),
+        budget=settings.max_size_bytes // 1024 ** 2))
+
+    evicted_files = 0
+    evicted_bytes = 0
+
+    if total_size > settings.max_size_bytes:
+        entries.sort()
+
+        for _, _, size, path in entries:
+            if total_size - evicted_bytes <= target_size:
+                break
+
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # removed by bazel or another collector, it no longer takes space either way
+            except OSError as err:
+                ctx.logger.debug("Failed to remove '{path}'. Error: {error}".format(path=path, error=err))
+                continue
+
+            evicted_files += 1
+            evicted_bytes += size
+
+            if evicted_files % _REMOVE_BATCH_SIZE == 0:
+                time.sleep(_REMOVE_BATCH_PAUSE_SEC)
+
+    ctx.logger.info("Disk cache collection evicted {count} entries ({size}MB) in {elapsed:.1f}s".format(
+        count=evicted_files, size=evicted_bytes // 1024 ** 2, elapsed=time.monotonic() - started))
+
+    stats_file_path = os.path.join(ctx.config_dir, _STATS_FILE_NAME)
+    # Re-read, hits of commands that finished in the meantime were recorded
+    stats = load_json_safe(stats_file_path, default_value={}, ctx=ctx)
+    stats.update({
+        "last_gc_at": time.time(),
+        "gc_runs": stats.get("gc_runs", 0) + 1,
+        "evicted_files": stats.get("evicted_files", 0) + evicted_files,
+        "evicted_bytes": stats.get("evicted_bytes", 0) + evicted_bytes,
+        "size_bytes": total_size - evicted_bytes,
+    })
+    write_json_atomic(stats_file_path, stats)
+
+
+def _scan(cache_dir: str) -> Tuple[List[Tuple[float, int, int, str]], int]:
+    """
+    The (last use, priority, size, path) of every entry and the total size of the cache.
+    """
+    entries = []
+    total_size = 0
+
+    for dir_name, priority in _ENTRY_DIR_PRIORITIES:
+        for path, stat in _walk_files(os.path.join(cache_dir, dir_name)):
+            entries.append((max(stat.st_atime, stat.st_mtime), priority, stat.st_size, path))
+            total_size += stat.st_size
+
+    return entries, total_size
+
+
+def _walk_files(root: str):
+    pending = [root]
+    while pending:
+        try:
+            with os.scandir(pending.pop()) as dir_entries:
+                for entry in dir_entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        yield entry.path, entry.stat(follow_symlinks=False)
+        except FileNotFoundError:
+            continue
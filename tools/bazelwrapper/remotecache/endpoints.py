@@ -0,0 +1,174 @@
+import os
+import socket
+import time
+from typing import List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from bazelwrapper.context import Context
+from bazelwrapper.utils.json_store import load_json_safe, write_json_atomic
+
+#
+# Latency based selection of the remote cache endpoint.
+#
+# The candidate endpoints of a provider are configured in '<config_dir>/remote_cache_endpoints.json', e.g.
+#   {"engflow": ["grpcs://engflow.wixpress.com", "grpcs://engflow-eu.wixpress.com"]}
+# A provider without candidates uses its default endpoint, as before.
+#
+# When there is more than one candidate, the flags carry a placeholder that is expanded on every invocation to the
+# lowest latency healthy endpoint, by the last known probe results in '<config_dir>/remote_cache_latency.json'. Stale
+# results are refreshed by a job of the detached job worker, so the invocation never waits for a probe.
+#
+
+PROVIDER_ENGFLOW = "engflow"
+PROVIDER_BUILDBUDDY = "buildbuddy"
+PROVIDER_GCS = "gcs"
+
+# Keep in sync with 'flagscache'
+_ENDPOINTS_FILE_NAME = "remote_cache_endpoints.json"
+_LATENCY_FILE_NAME = "remote_cache_latency.json"
+
+# Keep in sync with 'bazelcommand', which expands it without importing this module for the other flags
+_ENDPOINTS_PLACEHOLDER_PREFIX = "{wix:remote_cache_endpoints:"
+_ENDPOINTS_PLACEHOLDER_SUFFIX = "}"
+
+_PROBE_TTL_SEC = 10 * 60
+_PROBE_TIMEOUT_SEC = 3.0
+# The best of a few connects, the first one may pay for a DNS lookup
+_PROBE_ATTEMPTS = 2
+
+_DEFAULT_PORTS = {"grpcs": 443, "https": 443, "grpc": 80, "http": 80}
+_TLS_SCHEMES = {"grpcs", "https"}
+
+
+def endpoint_address(endpoint: str) -> Optional[Tuple[str, int]]:
+    """
+    The (host, port) of a TCP endpoint, None for other endpoints (e.g. a unix socket) and malformed ones.
+    """
+    url = urlsplit(endpoint)
+    try:
+        port = url.port
+    except ValueError:
+        return None
+
+    if url.scheme not in _DEFAULT_PORTS or not url.hostname:
+        return None
+
+    return url.hostname, port or _DEFAULT_PORTS[url.scheme]
+
+
+def candidate_endpoints(ctx: Context, provider: str, default_endpoint: str) -> List[str]:
+    endpoints = load_json_safe(os.path.join(ctx.config_dir, _ENDPOINTS_FILE_NAME), default_value={}, ctx=ctx)
+    candidates = endpoints.get(provider) if isinstance(endpoints, dict) else None
+
+    if not candidates:
+        return [default_endpoint]
+
+    return list(candidates)
+
+
+def remote_cache_flag(endpoints: List[str]) -> str:
+    """
+    The '--remote_cache' flag of the given endpoints, a placeholder when one of them has to be selected per invocation.
+    """
+    if len(endpoints) == 1:
+        return "--remote_cache={}".format(endpoints[0])
+
+    return _ENDPOINTS_PLACEHOLDER_PREFIX + ",".join(endpoints) + _ENDPOINTS_PLACEHOLDER_SUFFIX
+
+
+def expand_endpoints_placeholder(ctx: Context, flag: str) -> str:
+    endpoints = flag[len(_ENDPOINTS_PLACEHOLDER_PREFIX):-len(_ENDPOINTS_PLACEHOLDER_SUFFIX)].split(",")
+
+    return "--remote_cache={}".format(select_endpoint(ctx, endpoints))
+
+
+def select_endpoint(ctx: Context, endpoints: List[str]) -> str:
+    """
+    The lowest latency endpoint that was healthy when last probed, the first one when none was probed yet. Requests a
+    probe when the results are stale.
+    """
+    latency_file_path = os.path.join(ctx.config_dir, _LATENCY_FILE_NAME)
+    results = load_json_safe(latency_file_path, default_value={}, ctx=ctx)
+    probes = results.get("endpoints", {})
+    now = time.time()
+
+    healthy = [endpoint for endpoint in endpoints if probes.get(endpoint, {}).get("latency_ms") is not None]
+    # Ties keep the configured order
+    selected = min(healthy, key=lambda endpoint: probes[endpoint]["latency_ms"]) if healthy else endpoints[0]
+
+    ctx.logger.debug("Remote cache endpoint: {selected} (latencies: {latencies})".format(
+        selected=selected,
+        latencies=", ".join("{}={}ms".format(endpoint, probes.get(endpoint, {}).get("latency_ms"))
+                            for endpoint in endpoints)))
+
+    is_stale = any(now - probes.get(endpoint, {}).get("probed_at", 0) >= _PROBE_TTL_SEC for endpoint in endpoints)
+    if is_stale and now - results.get("probe_requested_at", 0) >= _PROBE_TTL_SEC:
+        _request_probe(ctx, latency_file_path, results, endpoints)
+
+    return selected
+
+
+def probe_endpoints(ctx: Context, endpoints: List[str]):
+    """
+    Measures the connect latency of the endpoints concurrently and stores the results. Run by the job worker.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=len(endpoints), thread_name_prefix="probe") as executor:
+        latencies = dict(zip(endpoints, executor.map(lambda endpoint: _probe_safe(ctx, endpoint), endpoints)))
+
+    latency_file_path = os.path.join(ctx.config_dir, _LATENCY_FILE_NAME)
+    # Re-read, probes of other providers may have been stored in the meantime
+    results = load_json_safe(latency_file_path, default_value={}, ctx=ctx)
+    probes = results.setdefault("endpoints", {})
+    now = time.time()
+
+    for endpoint, latency_ms in latencies.items():
+        ctx.logger.info("Remote cache endpoint '{endpoint}' latency: {latency}".format(
+            endpoint=endpoint, latency="{}ms".format(latency_ms) if latency_ms is not None else "unreachable"))
+        probes[endpoint] = {"latency_ms": latency_ms, "probed_at": now}
+
+    write_json_atomic(latency_file_path, results)
+
+
+def _request_probe(ctx: Context, latency_file_path: str, results: dict, endpoints: List[str]):
+    from bazelwrapper.jobs import queue, worker
+
+    # Recorded first, so concurrent invocations do not request the same probe
+    results["probe_requested_at"] = time.time()
+    try:
+        write_json_atomic(latency_file_path, results)
+    except OSError as err:
+        ctx.logger.debug("Failed to record the remote cache probe request. Error: {error}".format(error=err))
+        return
+
+    queue.enqueue(ctx, worker.JOB_REMOTE_CACHE_PROBE, payload={"endpoints": endpoints})
+    worker.start_worker(ctx)
+
+
+def _probe_safe(ctx: Context, endpoint: str) -> Optional[float]:
+    try:
+        return min(_connect_latency_ms(endpoint) for _ in range(_PROBE_ATTEMPTS))
+    except (OSError, ValueError) as err:
+        ctx.logger.info("Failed to probe '{endpoint}'. Error: {error}".format(endpoint=endpoint, error=err))
+        return None
+
+
+def _connect_latency_ms(endpoint: str) -> float:
+    """
+    The time to open a connection to the endpoint, including the TLS handshake of TLS endpoints.
+    """
+    address = endpoint_address(endpoint)
+    if address is None:
+        raise ValueError("Unsupported endpoint '{}'".format(endpoint))
+
+    started = time.monotonic()
+    with socket.create_connection(address, timeout=_PROBE_TIMEOUT_SEC) as sock:
+        if urlsplit(endpoint).scheme in _TLS_SCHEMES:
+            import ssl
+
+            with ssl.create_default_context().wrap_socket(sock, server_hostname=address[0]):
+                pass
+
+    return round((time.monotonic() - started) * 1000, 1)
+
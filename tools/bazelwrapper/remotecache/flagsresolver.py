@@ -3,6 +3,8 @@ import sys
 from abc import abstractmethod
 from typing import Iterable
 from bazelwrapper.context import Context
+from bazelwrapper.remotecache.endpoints import candidate_endpoints, remote_cache_flag, PROVIDER_BUILDBUDDY, \
+    PROVIDER_ENGFLOW, PROVIDER_GCS
 from bazelwrapper.utils.io_utils import IOUtils
 from bazelwrapper.utils.string_utils import StringUtils
 
@@ -34,11 +36,11 @@ class _RemoteCacheFlagsResolver:
     def resolve(self, ctx: Context) -> Iterable[str]: pass
 
     @classmethod
-    def _remote_cache_base_url(cls):
-        return os.getenv(
-            cls._BAZEL_REMOTE_CACHE_BASE_URL_ENV_VAR_NAME,
-            cls._DEFAULT_REMOTE_CACHE_BASE_URL
-        )
+    def _remote_cache_base_urls(cls, ctx: Context):
+        if cls._BAZEL_REMOTE_CACHE_BASE_URL_ENV_VAR_NAME in os.environ:
+            return [os.environ[cls._BAZEL_REMOTE_CACHE_BASE_URL_ENV_VAR_NAME]]
+
+        return candidate_endpoints(ctx, PROVIDER_GCS, cls._DEFAULT_REMOTE_CACHE_BASE_URL)
 
     @classmethod
     def _remote_cache_bucket_name(cls):
@@ -50,10 +52,10 @@ class _RemoteCacheFlagsResolver:
 class WixCachePopsRemoteCacheFlagsResolver(_RemoteCacheFlagsResolver):
     def resolve(self, ctx: Context) -> Iterable[str]:
         flags = [
-            "--remote_cache={base_url}/{bucket_name}".format(
-                base_url=self._remote_cache_base_url(),
-                bucket_name=self._remote_cache_bucket_name(),
-            ),
+            remote_cache_flag([
+                "{base_url}/{bucket_name}".format(base_url=base_url, bucket_name=self._remote_cache_bucket_name())
+                for base_url in self._remote_cache_base_urls(ctx)
+            ]),
             "--config=uniform_remote_cache"  # declared in 'tools/bazelrc/.bazelrc.managed.dev.env'
         ]
 
@@ -93,7 +95,8 @@ class BuildBuddyRemoteCacheFlagsResolver(_RemoteCacheFlagsResolver):
         if ctx.buildbuddy_api_key_filepath and self.collaborators.io.file_exists_func(ctx.buildbuddy_api_key_filepath):
             ctx.logger.debug("Reading Buildbuddy credentials file. path: {}".format(ctx.buildbuddy_api_key_filepath))
             api_key = self._read_api_key(ctx.buildbuddy_api_key_filepath, ctx)
-            flags.append("--remote_cache={}".format(self._DEFAULT_BUILDBUDDY_CACHE_URL))
+            flags.append(remote_cache_flag(
+                candidate_endpoints(ctx, PROVIDER_BUILDBUDDY, self._DEFAULT_BUILDBUDDY_CACHE_URL)))
             flags.append("--remote_header={}".format(api_key))
             ctx.logger.debug("Buildbuddy credentials file was found, added as an additional bazel remote flag. path: {}".format(ctx.buildbuddy_api_key_filepath))
         else:
@@ -118,7 +121,8 @@ class EngflowRemoteCacheFlagsResolver(_RemoteCacheFlagsResolver):
 
         if ctx.engflow_api_key_filepath and self.collaborators.io.file_exists_func(ctx.engflow_api_key_filepath):
             api_key_engflow = self._read_api_key(ctx.engflow_api_key_filepath, ctx)
-            flags.append("--remote_cache={}".format(self._DEFAULT_ENGFLOW_CACHE_URL))
+            flags.append(remote_cache_flag(
+                candidate_endpoints(ctx, PROVIDER_ENGFLOW, self._DEFAULT_ENGFLOW_CACHE_URL)))
             flags.append(f"--bes_header=x-engflow-auth-method=jwt-v0")
             flags.append(f"--bes_header=x-engflow-auth-token={api_key_engflow}")
             flags.append(f"--remote_header=x-engflow-auth-method=jwt-v0")
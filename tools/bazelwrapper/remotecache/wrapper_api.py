@@ -1,5 +1,6 @@
 from typing import Iterable
 
+import bazelwrapper.remotecache.diskcache as diskcache
 import bazelwrapper.remotecache.flagsresolver as flagsresolver
 from bazelwrapper.context import Context
 from bazelwrapper.utils.feature_flags import Flag
@@ -27,6 +28,20 @@ def resolve_remote_cache_flags(ctx: Context) -> Iterable[str]:
         return iter(())
 
 
+def resolve_disk_cache_flags(ctx: Context) -> Iterable[str]:
+    if is_disk_cache_used(ctx):
+        return diskcache.disk_cache_flags(ctx)
+    else:
+        return iter(())
+
+
+def is_disk_cache_used(ctx: Context) -> bool:
+    # The user's own disk cache is not managed
+    return _INCLUDE_COMMANDS.__contains__(ctx.bazel_command()) and \
+        not ctx.command_line.has_option("--disk_cache") and \
+        diskcache.is_disk_cache_enabled(ctx)
+
+
 def _is_command_eligible_for_caching(ctx):
     return not _is_cache_disabled(ctx) and _INCLUDE_COMMANDS.__contains__(ctx.bazel_command())
 
@@ -46,12 +61,8 @@ def _is_cache_disabled(ctx):
     4. The CLI command contains the RBE config flag, which is being passed in CI
     5. The user command contains an explicit remote_cache flag
     """
-    return _rbe_based_config.on(ctx) or _nocache_flag.on(ctx) or _is_user_request_remote_cache(ctx.user_args)
-
+    return _rbe_based_config.on(ctx) or _nocache_flag.on(ctx) or _is_user_request_remote_cache(ctx)
 
-def _is_user_request_remote_cache(user_args):
-    for arg in user_args:
-        if arg.startswith('--remote_cache='):
-            return True
 
-    return False
+def _is_user_request_remote_cache(ctx):
+    return ctx.command_line.has_option("--remote_cache")
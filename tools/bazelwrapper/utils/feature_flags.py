@@ -1,8 +1,16 @@
 import os
-from typing import Optional
+from typing import Dict, List, Optional
 
 from bazelwrapper.context import Context
 
+# Every declared flag, in declaration order. Resolved up front by the snapshot of each invocation.
+_declared_flags = []  # type: List[Flag]
+
+SOURCE_CLI = "cli"
+SOURCE_ENV_VAR = "env var"
+SOURCE_MARKER_FILE = "marker file"
+SOURCE_DEFAULT = "default"
+
 
 class Flag:
     """
@@ -12,6 +20,7 @@ class Flag:
     - An environment variable
 
     The flag is considered on if any of the above is present, regardless of their value.
+    Flags are resolved once per invocation, see 'FlagSnapshot'.
     """
 
     def __init__(self,
@@ -26,25 +35,82 @@ class Flag:
         self.marker_file_name = marker_file_name
         self.default_value = default_value
 
+        _declared_flags.append(self)
+
+    @property
+    def name(self) -> str:
+        return self.full_cli_flag or self.env_var_name or self.marker_file_name
+
     def on(self, ctx: Context) -> bool:
-        return \
-            (self.full_cli_flag is not None and self.full_cli_flag in ctx.user_args) or \
-            self._on_by_env_var() or \
-            self._marker_file_exists(ctx) or \
-            self.default_value
+        return ctx.flag_snapshot.source_of(self) is not None
 
     def off(self, ctx: Context):
         return not self.on(ctx)
 
-    def _on_by_env_var(self) -> bool:
-        if self.env_var_name is not None and self.env_var_name in os.environ:
-            if self.env_var_required_value is not None:
-                return os.getenv(self.env_var_name, False) == self.env_var_required_value
-            else:
-                return True
 
-        return False
+class FlagSnapshot:
+    """
+    The state of the cascading flags of a single invocation, taken from one listing of the config dir and one pass over
+    the environment. Flags that are declared after the snapshot was taken (by a lazily imported module) are resolved on
+    first use against the same state.
+
+    IMPORTANT:
+    Marker files and env vars that change during the invocation are not picked up.
+    """
+
+    def __init__(self, ctx: Context):
+        self._command_line = ctx.command_line
+        self._marker_file_names = _list_dir_safe(ctx.config_dir)
+        self._environ = dict(os.environ)
+        self._sources = {}  # type: Dict[Flag, Optional[str]]
+
+        for flag in list(_declared_flags):
+            self.source_of(flag)
+
+    def source_of(self, flag: Flag) -> Optional[str]:
+        """
+        The source that turned the flag on, or None if it is off.
+        """
+        try:
+            return self._sources[flag]
+        except KeyError:
+            source = self._sources[flag] = self._resolve(flag)
+            return source
+
+    def has_marker_file(self, name: str) -> bool:
+        return name in self._marker_file_names
+
+    def describe(self) -> List[str]:
+        """
+        A line per declared flag, for debugging.
+        """
+        lines = []
+        for flag in list(_declared_flags):
+            source = self.source_of(flag)
+            lines.append("{name}: {state}".format(name=flag.name, state="on ({})".format(source) if source else "off"))
+
+        return lines
+
+    def _resolve(self, flag: Flag) -> Optional[str]:
+        if flag.full_cli_flag is not None and self._command_line.has_arg(flag.full_cli_flag):
+            return SOURCE_CLI
+
+        if flag.env_var_name is not None and flag.env_var_name in self._environ:
+            if flag.env_var_required_value is None or self._environ[flag.env_var_name] == flag.env_var_required_value:
+                return SOURCE_ENV_VAR
+
+        if flag.marker_file_name is not None and flag.marker_file_name in self._marker_file_names:
+            return SOURCE_MARKER_FILE
+
+        if flag.default_value:
+            return SOURCE_DEFAULT
+
+        return None
+
 
-    def _marker_file_exists(self, ctx: Context) -> bool:
-        return self.marker_file_name is not None and \
-               os.path.exists(os.path.join(ctx.config_dir, self.marker_file_name))
+def _list_dir_safe(dir_path: str) -> frozenset:
+    try:
+        with os.scandir(dir_path) as entries:
+            return frozenset(entry.name for entry in entries)
+    except OSError:
+        return frozenset()
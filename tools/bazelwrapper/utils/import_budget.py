@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+"""
+Import time budget check for the bazel wrapper entry point.
+
+Runs 'python -X importtime' on the wrapper module (the same import 'tools/bazel' performs on every invocation) and fails
+when the cumulative import time goes over the budget, or when a module that is supposed to be lazily loaded is imported
+eagerly.
+
+Usage (from the 'tools' directory):
+    python3 -m bazelwrapper.utils.import_budget [--budget-ms 60] [--runs 5] [--verbose]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+_ENTRY_POINT_MODULE = "bazelwrapper.wrapper"
+
+_IMPORT_BUDGET_ENV_VAR_NAME = "WIX_BAZEL_WRAPPER_IMPORT_BUDGET_MS"
+_DEFAULT_IMPORT_BUDGET_MS = 60
+
+# Modules that must only be loaded on the code path that needs them
+_LAZY_MODULE_PREFIXES = (
+    "bazelwrapper.bep",
+    "bazelwrapper.bi.entrypoint",
+    "bazelwrapper.bi.profiles_processor",
+    "bazelwrapper.bi.profile_reporter",
+    "bazelwrapper.bi.frog",
+    "bazelwrapper.bi.schema",
+    "bazelwrapper.env.inspector",
+    "bazelwrapper.jobs",
+    "bazelwrapper.remotecache",
+    "bazelwrapper.vmr_interop",
+    "virtualmonorepo",
+)
+
+_TOOLS_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def measure_import_time(module=_ENTRY_POINT_MODULE) -> Tuple[int, Dict[str, int]]:
+    """
+    Returns the cumulative import time of the given module in microseconds and the cumulative time of every module that
+    was imported along with it.
+    """
+    result = subprocess.run(
+        args=[sys.executable, "-X", "importtime", "-c", "import {}".format(module)],
+        cwd=_TOOLS_DIR,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        check=True,
+    )
+
+    imported = _parse_importtime_output(result.stderr.decode("utf-8"))
+    return imported[module], imported
+
+
+def _parse_importtime_output(output: str) -> Dict[str, int]:
+    # Line format: "import time: <self us> | <cumulative us> | <indented module name>"
+    imported = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue  # the header line
+
+        imported[fields[2].strip()] = int(fields[1])
+
+    return imported
+
+
+def eagerly_imported_modules(imported: Dict[str, int]) -> List[str]:
+    return sorted(name for name in imported if name.startswith(_LAZY_MODULE_PREFIXES))
+
+
+def _default_budget_ms():
+    return int(os.environ.get(_IMPORT_BUDGET_ENV_VAR_NAME, _DEFAULT_IMPORT_BUDGET_MS))
+
+
+def main(args=None) -> int:
+    parser = argparse.ArgumentParser(description="Checks the bazel wrapper import time against a budget")
+    parser.add_argument("--budget-ms", dest="budget_ms", type=int, default=_default_budget_ms(),
+                        help="Maximum allowed wrapper import time in milliseconds "
+                             "(default: ${} or {})".format(_IMPORT_BUDGET_ENV_VAR_NAME, _DEFAULT_IMPORT_BUDGET_MS))
+    parser.add_argument("--runs", dest="runs", type=int, default=5,
+                        help="Number of measurements, the fastest one is compared against the budget (default: 5)")
+    parser.add_argument("--verbose", dest="verbose", action="store_true",
+                        help="Print the slowest imported modules")
+    arguments = parser.parse_args(args)
+
+    # The first run also warms up the bytecode cache, taking the fastest run filters out machine noise
+    measurements = [measure_import_time() for _ in range(max(1, arguments.runs))]
+    best_us, imported = min(measurements, key=lambda m: m[0])
+    best_ms = best_us / 1000
+
+    failed = False
+    eager = eagerly_imported_modules(imported)
+    if eager:
+        failed = True
+        print("FAIL: modules that should be lazily loaded were imported by '{}':".format(_ENTRY_POINT_MODULE))
+        for name in eager:
+            print("  {}".format(name))
+
+    if best_ms > arguments.budget_ms:
+        failed = True
+        print("FAIL: '{}' import time is {:.1f}ms, budget is {}ms".format(
+            _ENTRY_POINT_MODULE, best_ms, arguments.budget_ms))
+    else:
+        print("OK: '{}' import time is {:.1f}ms, budget is {}ms".format(
+            _ENTRY_POINT_MODULE, best_ms, arguments.budget_ms))
+
+    if arguments.verbose or failed:
+        print("Slowest imports (cumulative):")
+        for name, us in sorted(imported.items(), key=lambda item: item[1], reverse=True)[:15]:
+            print("  {:>8.1f}ms  {}".format(us / 1000, name))
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
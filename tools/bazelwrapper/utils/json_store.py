@@ -0,0 +1,46 @@
+import json
+import os
+
+from bazelwrapper.context import Context
+
+
+def load_json_safe(path: str, default_value, ctx: Context):
+    """
+    Returns the content of a JSON file, or the default value when the file is missing or corrupted.
+    """
+    try:
+        with open(path) as json_file:
+            return json.load(json_file)
+
+    except FileNotFoundError:
+        return default_value
+
+    except Exception as err:
+        # Debug log level on purpose, the file is rebuilt by its owner
+        ctx.logger.debug("Failed to load '{path}'. Error: {error}".format(path=path, error=err))
+        return default_value
+
+
+def write_json_atomic(path: str, data, mode=0o600):
+    """
+    Writes a JSON file so that concurrent readers see either the previous or the new content, never a partial one.
+    """
+    # Only needed on a write, which is the uncommon case for most callers
+    import tempfile
+
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".{}.".format(os.path.basename(path)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as tmp_file:
+            json.dump(data, tmp_file)
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
@@ -1,6 +1,6 @@
 import logging
 import os
-from logging import handlers, Logger
+from logging import Logger
 
 _RED = "\u001b[31m"
 _GREEN = "\u001b[32m"
@@ -44,6 +44,9 @@ def console_log_handler():
 
 
 def daily_log_file_handler(log_path, backups=7):
+    # 'logging.handlers' is relatively expensive to import and is only needed by background processes
+    from logging import handlers
+
     template = "{color}{level}" + _RESET
     _set_log_level_names_format(template)
 
@@ -57,14 +60,14 @@ def daily_log_file_handler(log_path, backups=7):
 
 def _set_log_level_names_format(template):
     logging.addLevelName(
-        logging.DEBUG, template.format(color=_YELLOW, level=logging.getLevelName(logging.DEBUG))
+        logging.DEBUG, template.format(color=_YELLOW, level="DEBUG")
     )
     logging.addLevelName(
-        logging.INFO, template.format(color=_GREEN, level=logging.getLevelName(logging.INFO))
+        logging.INFO, template.format(color=_GREEN, level="INFO")
     )
     logging.addLevelName(
-        logging.WARNING, template.format(color=_PURPLE, level=logging.getLevelName(logging.WARNING))
+        logging.WARNING, template.format(color=_PURPLE, level="WARNING")
     )
     logging.addLevelName(
-        logging.ERROR, template.format(color=_RED, level=logging.getLevelName(logging.ERROR))
+        logging.ERROR, template.format(color=_RED, level="ERROR")
     )
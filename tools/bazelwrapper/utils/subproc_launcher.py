@@ -1,13 +1,15 @@
 import subprocess
 import sys
 
-from bazelwrapper.context import Context, WixFlags
+from bazelwrapper.context import Context
 
 
 class PySubprocessLauncher:
-    def __init__(self, title: str, main_py_script_path: str):
+    def __init__(self, title: str, main_py_script_path: str, detached: bool=False):
         self.title = title
         self.main_py_script_path = main_py_script_path
+        # A detached process runs in its own session, so it is not affected by signals sent to the terminal (e.g. ^C)
+        self.detached = detached
 
     def launch(self, ctx: Context):
         ctx.logger.debug("Going to launch {title} worker...".format(title=self.title))
@@ -23,7 +25,12 @@ class PySubprocessLauncher:
             ctx.logger.debug("Launching {title} process...".format(title=self.title))
             ctx.logger.debug("Reporter process command: '{command}'".format(command=" ".join(cmd)))
 
-            p = subprocess.Popen(args=cmd, cwd=ctx.workspace_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            p = subprocess.Popen(args=cmd,
+                                 cwd=ctx.workspace_dir,
+                                 stdin=subprocess.DEVNULL,
+                                 stdout=subprocess.DEVNULL,
+                                 stderr=subprocess.DEVNULL,
+                                 start_new_session=self.detached)
             ctx.logger.debug("{title} process ID is: '{pid}'".format(title=self.title, pid=p.pid))
 
             return p.pid
@@ -34,4 +41,4 @@ class PySubprocessLauncher:
 
 
 def _extract_wix_flags(ctx: Context):
-    return [flag for flag in ctx.user_args if flag.startswith(WixFlags.PREFIX)]
+    return list(ctx.command_line.wrapper_options)
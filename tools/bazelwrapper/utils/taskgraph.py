@@ -0,0 +1,126 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from logging import Logger
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from bazelwrapper.utils.tracing import span
+
+
+class TaskTimeoutError(Exception):
+    pass
+
+
+class Task:
+    """
+    A step of a task graph.
+
+    'fn' receives the results of the tasks it depends on, keyed by task name. An optional task that fails or times out
+    does not fail the graph, its result is None.
+    """
+
+    def __init__(self,
+                 name: str,
+                 fn: Callable[[Dict[str, Any]], Any],
+                 deps: Iterable[str]=(),
+                 timeout_sec: Optional[float]=None,
+                 optional: bool=False):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.timeout_sec = timeout_sec
+        self.optional = optional
+
+
+def _run_traced(task: Task, dep_results: Dict[str, Any]):
+    with span(task.name):
+        return task.fn(dep_results)
+
+
+class TaskGraph:
+    """
+    Runs tasks on a thread pool as soon as their dependencies are done, so the total run time is the longest dependency
+    chain instead of the sum of all tasks.
+
+    IMPORTANT:
+    A timed-out task cannot be interrupted, its thread keeps running in the background. Only give a timeout to tasks
+    whose late completion is harmless.
+    """
+
+    def __init__(self, logger: Logger, max_workers: int=4):
+        self._logger = logger
+        self._max_workers = max_workers
+        self._tasks = {}  # type: Dict[str, Task]
+
+    def add(self, task: Task) -> Task:
+        if task.name in self._tasks:
+            raise ValueError("Task '{}' is already defined".format(task.name))
+
+        for dep in task.deps:
+            if dep not in self._tasks:
+                # Dependencies must be added first, which also rules out cycles
+                raise ValueError("Task '{}' depends on an unknown task '{}'".format(task.name, dep))
+
+        self._tasks[task.name] = task
+        return task
+
+    def run(self) -> Dict[str, Any]:
+        results = {}
+        pending = dict(self._tasks)
+        running = {}  # future -> (task, start time)
+
+        executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="taskgraph")
+        try:
+            while pending or running:
+                for task in list(pending.values()):
+                    if all(dep in results for dep in task.deps):
+                        del pending[task.name]
+                        dep_results = {dep: results[dep] for dep in task.deps}
+                        running[executor.submit(_run_traced, task, dep_results)] = (task, time.monotonic())
+
+                done, _ = wait(running, timeout=self._next_timeout(running.values()), return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    task, started = running.pop(future)
+                    results[task.name] = self._result_of(task, future, started)
+
+                for future, (task, started) in list(running.items()):
+                    if task.timeout_sec is not None and time.monotonic() - started >= task.timeout_sec:
+                        del running[future]
+                        results[task.name] = self._on_timeout(task)
+
+            return results
+
+        finally:
+            # Not waiting for timed-out tasks, they are left to finish in the background
+            executor.shutdown(wait=False)
+
+    def _result_of(self, task: Task, future, started: float):
+        elapsed_ms = (time.monotonic() - started) * 1000
+
+        try:
+            result = future.result()
+        except Exception as err:
+            if not task.optional:
+                raise
+
+            self._logger.debug("Optional task '{name}' failed after {elapsed:.0f}ms. Error: {error}".format(
+                name=task.name, elapsed=elapsed_ms, error=err))
+            return None
+
+        self._logger.debug("Task '{name}' finished in {elapsed:.0f}ms".format(name=task.name, elapsed=elapsed_ms))
+        return result
+
+    def _on_timeout(self, task: Task):
+        message = "Task '{name}' timed out after {timeout}s".format(name=task.name, timeout=task.timeout_sec)
+        if not task.optional:
+            raise TaskTimeoutError(message)
+
+        self._logger.debug(message)
+        return None
+
+    @staticmethod
+    def _next_timeout(running) -> Optional[float]:
+        deadlines = [started + task.timeout_sec - time.monotonic()
+                     for task, started in running if task.timeout_sec is not None]
+
+        return max(0.0, min(deadlines)) if deadlines else None
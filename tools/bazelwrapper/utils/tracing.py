@@ -0,0 +1,100 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import List
+
+#
+# Lightweight in-process spans of the wrapper phases.
+#
+# When a BI profile is recorded, the spans are written to a sidecar file next to it and merged into the profile by the
+# BI reporter as a separate "wrapper" thread (see 'bazelwrapper.bi.profile.merge_wrapper_trace'). Timestamps are
+# relative to the bazel client launch, which is close to the origin of the bazel profile timestamps, so the wrapper
+# phases that precede bazel have negative timestamps.
+#
+
+WRAPPER_TRACE_FILE_EXTENSION = "wrapper.json"
+
+_TRACE_PID = 1
+# Far from bazel's own thread ids, every wrapper thread gets its own id counting down from here
+_WRAPPER_TID = 2 ** 31 - 1
+
+_CATEGORY = "wrapper"
+
+_spans = []
+_bazel_launch_ns = None
+
+
+class _Span:
+    def __init__(self, name: str, start_ns: int, end_ns: int, thread_name: str, args: dict):
+        self.name = name
+        self.start_ns = start_ns
+        self.end_ns = end_ns
+        self.thread_name = thread_name
+        self.args = args
+
+
+@contextmanager
+def span(name: str, **args):
+    start_ns = time.time_ns()
+    try:
+        yield
+    finally:
+        # list.append is atomic, spans may be recorded from several threads
+        _spans.append(_Span(name, start_ns, time.time_ns(), threading.current_thread().name, args))
+
+
+def mark_bazel_launch():
+    global _bazel_launch_ns
+    _bazel_launch_ns = time.time_ns()
+
+
+def trace_events() -> List[dict]:
+    """
+    Returns the recorded spans as Chrome trace events.
+    """
+    spans = list(_spans)
+    if not spans:
+        return []
+
+    origin_ns = _bazel_launch_ns if _bazel_launch_ns is not None else min(s.start_ns for s in spans)
+
+    main_thread_name = threading.main_thread().name
+    tids = {main_thread_name: _WRAPPER_TID}
+    events = []
+
+    for s in sorted(spans, key=lambda s: s.start_ns):
+        tid = tids.get(s.thread_name)
+        if tid is None:
+            tid = tids[s.thread_name] = _WRAPPER_TID - len(tids)
+
+        events.append({
+            "cat": _CATEGORY,
+            "name": s.name,
+            "ph": "X",
+            "ts": (s.start_ns - origin_ns) // 1000,
+            "dur": (s.end_ns - s.start_ns) // 1000,
+            "pid": _TRACE_PID,
+            "tid": tid,
+            "args": s.args,
+        })
+
+    for thread_name, tid in tids.items():
+        events.append({
+            "name": "thread_name",
+            "ph": "M",
+            "pid": _TRACE_PID,
+            "tid": tid,
+            "args": {"name": "wrapper" if thread_name == main_thread_name else "wrapper ({})".format(thread_name)},
+        })
+
+    return events
+
+
+def wrapper_trace_path_for(profile_path: str) -> str:
+    return "{path}.{ext}".format(path=profile_path, ext=WRAPPER_TRACE_FILE_EXTENSION)
+
+
+def write_wrapper_trace(profile_path: str):
+    with open(wrapper_trace_path_for(profile_path), "w") as file:
+        json.dump({"traceEvents": trace_events()}, file)
@@ -1,9 +1,10 @@
-from typing import Optional
+from typing import Optional, TYPE_CHECKING
 
 from bazelwrapper.context import Context as WrapperContext
-from virtualmonorepo.main import update_vector, read_vector
-from virtualmonorepo.cli import ResolveVectorArgs, LocalVectorArgs
-from virtualmonorepo.vector import VectorData
+from bazelwrapper.utils.tracing import span
+
+if TYPE_CHECKING:
+    from virtualmonorepo.vector import VectorData
 
 # This interop class is being used by the Bazel wrapper to use
 # the VMR Client source code directly
@@ -21,7 +22,18 @@ class FakeArgsParser:
     metadata = None
 
 class BazelVmrInterop:
-    
+
+    @staticmethod
+    def is_vector_symlink_valid(ctx: WrapperContext) -> bool:
+        from virtualmonorepo import ioutils
+        from virtualmonorepo.paths import PathsBuilder
+
+        # The symlink path doesn't depend on the branch
+        symlink_path = PathsBuilder(ctx.workspace_dir, branch=None).vector_symlink_path()
+
+        # A dangling symlink (e.g. pointing to a deleted branched vector) is not valid
+        return ioutils.symlink_exists(symlink_path)
+
     @staticmethod
     def resolve_vector(
             ctx: WrapperContext,
@@ -30,6 +42,15 @@ class BazelVmrInterop:
             is_silent: bool,
             build_branch_override: Optional[str] = None) -> None:
 
+        # Importing the VMR client pulls in its resolvers, differ, templates and HTTP client, so it is deferred until a
+        # vector actually needs to be resolved
+        from virtualmonorepo.main import update_vector
+        from virtualmonorepo.cli import ResolveVectorArgs
+        from virtualmonorepo import trace
+
+        # The VMR client phases (e.g. the resolver branch taken) are recorded in the wrapper trace
+        trace.set_span_hook(span)
+
         args = FakeArgsParser()
         args.workspace_dir = ctx.workspace_dir
         args.vector_provider_url = vmr_vector_provider_url
@@ -52,7 +73,10 @@ class BazelVmrInterop:
             is_silent: bool,
             metadata_only: bool = True,
             build_type: Optional[str] = None,
-            build_branch_override: Optional[str] = None) -> VectorData:
+            build_branch_override: Optional[str] = None) -> "VectorData":
+
+        from virtualmonorepo.main import read_vector
+        from virtualmonorepo.cli import LocalVectorArgs
 
         args = FakeArgsParser()
         args.workspace_dir = ctx.workspace_dir
@@ -1,8 +1,8 @@
 import json
 import os
-import signal
 import subprocess
 import sys
+from typing import List, Optional, Tuple
 
 #
 # IMPORTANT:
@@ -12,14 +12,30 @@ import sys
 #
 from logging import DEBUG
 
-import bazelwrapper.bi.wrapper_api as bi
-from bazelwrapper.bazelcommand import build_bazel_command, build_bep_parser_bazel_command
+#
+# IMPORTANT:
+# This module is imported by every 'tools/bazel' invocation, including the ones issued by IDEs hundreds of times per
+# hour. Keep the module level imports minimal and import heavy modules (BI, VMR, env inspection, remote cache) on the
+# code path that actually needs them. See 'bazelwrapper.utils.import_budget' for the enforced import time budget.
+#
+from bazelwrapper.bazelcommand import bazel_startup_args, build_bazel_command
 from bazelwrapper.cmd_interceptor import intercept_command
 from bazelwrapper.context import create_cli_context, Context
-from bazelwrapper.env.inspector import inspect
-from bazelwrapper.vmr_interop import BazelVmrInterop
+from bazelwrapper.env.console import create_console_relay_safe
 from bazelwrapper.env.info import is_local_dev
-import tempfile
+from bazelwrapper.env.resources import BazelResourceUsage, wait_with_rusage
+from bazelwrapper.fastpath import is_fast_path
+from bazelwrapper.utils.safe_exec import safe
+from bazelwrapper.utils.tracing import mark_bazel_launch, span, write_wrapper_trace
+
+# 'git version' is only logged for diagnostics, it must never hold the build back
+_GIT_VERSION_TIMEOUT_SEC = 5
+
+# A probe that takes longer (e.g. a hanging DNS lookup) leaves the circuit as it was
+_REMOTE_CACHE_PROBE_TIMEOUT_SEC = 1
+
+# The main command waits for the server anyway, the timeout only protects against a hanging warm-up
+_SERVER_WARMUP_TIMEOUT_SEC = 60
 
 # Dummy commit for re-triggering across the VMR repos (due to Kafka VMR stale topics issue)
 custom_bazel_env = {
@@ -32,12 +48,15 @@ custom_bazel_env = {
 }
 
 
-def bazel_env(context: Context):
-    final_custom_vars = {**custom_bazel_env, **try_load_custom_build_env_variables(context)}
+def bazel_env(context: Context, custom_build_env_variables: Optional[dict]=None):
+    if custom_build_env_variables is None:
+        custom_build_env_variables = try_load_custom_build_env_variables(context)
+
+    final_custom_vars = {**custom_bazel_env, **custom_build_env_variables}
     return {**os.environ, **final_custom_vars}
 
 
-def update_second_party_repositories(env, ctx: Context):
+def update_second_party_repositories(env, ctx: Context, log_git_version=True):
 
     # Do not try to resolve a VMR vector when analyzing a build profile since
     # the build already executed
@@ -48,8 +67,7 @@ def update_second_party_repositories(env, ctx: Context):
         return ctx.bazel_command() in ["info", "query", "aquery", "cquery"]
 
     if not ctx.is_bypassed_command:
-        if env.get("VMR_REPO_RULE_TYPE", "") == "git_cached_repository":
-            # Log git version to stdout to understand where it originates from XCode or manually installed
+        if log_git_version and _is_git_version_logged(env):
             run_git_version_safe(ctx)
 
         # CI relies on a Buildkite VMR plugin to resolve a vector from env vars
@@ -79,6 +97,7 @@ def update_second_party_repositories(env, ctx: Context):
         # the expected branch name. To overcome this limitation, we are reading the branch name from env var.
         build_branch_override = env.get("BUILDKITE_BRANCH", None)
 
+        from bazelwrapper.vmr_interop import BazelVmrInterop
         BazelVmrInterop.resolve_vector(
             ctx=ctx,
             vmr_vector_provider_url=vmr_vector_provider_url,
@@ -105,10 +124,21 @@ def try_load_custom_build_env_variables(context: Context):
 
 
 def main():
-    context = create_cli_context()
+    with span("create_context"):
+        context = create_cli_context()
 
     intercept_command(context)
 
+    if is_fast_path(context):
+        try:
+            _exec_bazel_command(context)  # does not return
+        except BaseException as err:
+            context.logger.debug("Failed to execute bazel command. Error: {error}".format(error=err))
+            exit(1)
+
+    # Runs while bazel does, collected by the post command actions
+    inspection = _start_inspection_safe(context)
+
     bazel_exit_code = -1
     try:
         bazel_exit_code = _execute_bazel_command(context)
@@ -118,62 +148,262 @@ def main():
         context.logger.debug("Failed to execute bazel command. Error: {error}".format(error=err))
 
     finally:
-        _run_post_bazel_command_actions(bazel_exit_code, context)
+        _run_post_bazel_command_actions(bazel_exit_code, context, inspection)
 
     exit(bazel_exit_code)
 
 
-def _run_post_bazel_command_actions(bazel_exit_code, context: Context):
+def _start_inspection_safe(context: Context):
+    from bazelwrapper.env.inspector import start_inspection
+
+    with span("start_inspection"):
+        return safe(fn=start_inspection, default_value=None, ctx=context)
+
+
+def _run_post_bazel_command_actions(bazel_exit_code, context: Context, inspection=None):
     context.logger.debug("Bazel finished with return code {bazel_exit_code}".format(bazel_exit_code=bazel_exit_code))
 
-    profile_path = bi.maybe_create_profile_info_file(bazel_exit_code, context)
+    import bazelwrapper.bi.wrapper_api as bi
+
+    with span("profile_info_file"):
+        profile_path = bi.maybe_create_profile_info_file(bazel_exit_code, context)
+
+    if is_local_dev(context):
+        with span("build_summary"):
+            _report_build_summary_safe(context)
+
+        with span("disk_cache"):
+            safe(fn=_on_disk_cache_command_finished, default_value=None, ctx=context)
+
+        with span("output_bases"):
+            safe(fn=_on_output_base_command_finished, default_value=None, ctx=context)
+
+    if inspection is not None:
+        with span("inspect"):
+            for warning in inspection.warnings():
+                context.logger.warn(warning)
+
     if profile_path:
+        # Written before the reporter starts, the reporter merges it into the profile
+        _write_wrapper_trace_safe(profile_path, context)
         bi.start_bi_reporter(context, context.bi_reporter_run_sync)
 
-    if is_local_dev(context) and context.bazel_command() in ("build", "test"):
-        _execute_bep_parser_bazel_command(context)
 
-    for warning in inspect(context):
-        context.logger.warn(warning)
+def _report_build_summary_safe(context: Context):
+    from bazelwrapper.bep.summary import remove_bep_files, report_build_summary
+
+    if context.bazel_command() in ("build", "test"):
+        safe(fn=report_build_summary, default_value=None, ctx=context)
+
+    safe(fn=remove_bep_files, default_value=None, ctx=context)
+
+
+def _on_disk_cache_command_finished(context: Context):
+    import bazelwrapper.remotecache.wrapper_api as remotecache
+
+    if not remotecache.is_disk_cache_used(context):
+        return
+
+    from bazelwrapper.env.console import DISK_CACHE_HITS_FIELD_NAME
+    from bazelwrapper.remotecache.diskcache import on_command_finished
+
+    # Parsed by the console relay or from the build events, when any of them is on
+    hits = (context.bazel_console_summary or {}).get(DISK_CACHE_HITS_FIELD_NAME)
+    if hits is None and context.live_build_status is not None:
+        hits = context.live_build_status["disk_cache_hits"]
+
+    on_command_finished(context, hits)
+
+
+def _on_output_base_command_finished(context: Context):
+    if context.is_bypassed_command:
+        return
+
+    from bazelwrapper.env.outputbases import on_command_finished
+
+    on_command_finished(context)
+
+
+def _write_wrapper_trace_safe(profile_path: str, context: Context):
+    try:
+        write_wrapper_trace(profile_path)
+    except Exception as err:
+        context.logger.debug("Failed to write the wrapper trace. Error: {error}".format(error=err))
+
+
+def _is_git_version_logged(env) -> bool:
+    # Log git version to stdout to understand where it originates from XCode or manually installed
+    return env.get("VMR_REPO_RULE_TYPE", "") == "git_cached_repository"
+
+
+def _prepare_bazel_command(context: Context) -> Tuple[List[str], dict]:
+    """
+    Runs the independent preparation steps concurrently, so the time to bazel start is the longest step rather than
+    the sum of all of them.
+    """
+    from bazelwrapper.env.bazel_server import warm_up_server
+    from bazelwrapper.utils.taskgraph import Task, TaskGraph
+
+    def resolve_env(_):
+        env = bazel_env(context)
+        if context.logger.isEnabledFor(DEBUG):
+            context.logger.debug("Resolved build env: {envars}".format(envars=json.dumps(env, indent=2)))
+
+        return env
+
+    def log_git_version(deps):
+        if not context.is_bypassed_command and _is_git_version_logged(deps["env"]):
+            run_git_version_safe(context)
+
+    graph = TaskGraph(context.logger)
+    graph.add(Task("env", resolve_env))
+    graph.add(Task("flags", lambda _: build_bazel_command(context)))
+    graph.add(Task("git_version", log_git_version, deps=["env"], timeout_sec=_GIT_VERSION_TIMEOUT_SEC, optional=True))
+    graph.add(Task("vmr", lambda deps: update_second_party_repositories(deps["env"], context, log_git_version=False),
+                   deps=["env"]))
+    graph.add(Task("server_warmup", lambda deps: warm_up_server(context, deps["env"], _SERVER_WARMUP_TIMEOUT_SEC),
+                   deps=["env", "flags"], timeout_sec=_SERVER_WARMUP_TIMEOUT_SEC, optional=True))
+    graph.add(Task("remote_cache_circuit", lambda deps: _check_remote_cache_circuit(context, deps["flags"]),
+                   deps=["flags"], timeout_sec=_REMOTE_CACHE_PROBE_TIMEOUT_SEC, optional=True))
+
+    results = graph.run()
+
+    bazel_command = _apply_remote_cache_circuit(context, results["flags"], results["remote_cache_circuit"])
+
+    return bazel_command, results["env"]
+
+
+def _check_remote_cache_circuit(context: Context, bazel_command: List[str], probe=True) -> Optional[str]:
+    from bazelwrapper.remotecache.circuit import check_circuit
+
+    context.remote_cache_circuit = check_circuit(context, bazel_command, probe=probe)
+
+    return context.remote_cache_circuit
+
+
+def _apply_remote_cache_circuit(context: Context, bazel_command: List[str], state: Optional[str]) -> List[str]:
+    if state is None:
+        return bazel_command
+
+    from bazelwrapper.remotecache.circuit import apply_circuit
+
+    return apply_circuit(context, bazel_command, state)
+
 
 def _execute_bazel_command(context: Context):
-    bazel_command = build_bazel_command(context)
+    with span("prepare_bazel_command"):
+        bazel_command, env = _prepare_bazel_command(context)
 
-    env = bazel_env(context)
     if context.logger.isEnabledFor(DEBUG):
-        context.logger.debug("Resolved build env: {envars}".format(envars=json.dumps(env, indent=2)))
+        context.logger.debug("Feature flags:\n  {}".format("\n  ".join(context.flag_snapshot.describe())))
+
+    usage = context.bazel_resource_usage = BazelResourceUsage()
+    server_startup_args = _server_sampling_startup_args(context)
+    if server_startup_args is not None:
+        usage.sample_server_before(context, server_startup_args)
+
+    console_relay = create_console_relay_safe(context)
+    live_status = _start_live_status_safe(context)
+
+    mark_bazel_launch()
+    with span("bazel", command=context.bazel_command()):
+        try:
+            p = subprocess.Popen(
+                args=bazel_command,
+                env=env,
+                stderr=console_relay.child_stderr if console_relay is not None else None
+            )
+        except BaseException:
+            if console_relay is not None:
+                console_relay.abort()
+            raise
 
-    update_second_party_repositories(env, context)
+        if console_relay is not None:
+            console_relay.start()
 
-    p = None
-    try:
-        p = subprocess.Popen(args=bazel_command, env=env)
-        return p.wait()
+        exit_code = wait_with_rusage(p, context, usage)
+
+        if console_relay is not None:
+            context.bazel_console_summary = console_relay.finish()
+
+    if live_status is not None:
+        with span("live_status"):
+            context.build_summary = live_status.finish(exit_code)
+            context.live_build_status = live_status.status
+
+    if server_startup_args is not None:
+        usage.sample_server_after(context, server_startup_args)
+
+    return exit_code
+
+
+def _start_live_status_safe(context: Context):
+    if not is_local_dev(context) or context.bazel_command() not in ("build", "test"):
+        return None
+
+    from bazelwrapper.bep.live import start_live_status_safe
 
-    except KeyboardInterrupt:
-        context.logger.debug("Keyboard interrupt received. Sending 'SIGINT' to the bazel process.")
-        p.send_signal(signal.SIGINT)
+    return start_live_status_safe(context)
 
-        return p.wait()
 
-def _execute_bep_parser_bazel_command(context: Context):
-    bazel_command = build_bep_parser_bazel_command(context)
+def _server_sampling_startup_args(context: Context) -> Optional[List[str]]:
+    """
+    The startup args to find the bazel server by, or None when its stats are not reported.
+    """
+    if not os.path.isdir("/proc"):
+        return None
 
-    env = bazel_env(context)
+    import bazelwrapper.bi.wrapper_api as bi
+    if not bi.is_profiling_applicable(context):
+        return None
 
+    return bazel_startup_args(context)
+
+def _exec_bazel_command(context: Context):
+    """
+    Fast path execution: replaces the wrapper process with the real bazel client, so no python parent process is kept
+    around while the command runs. BI profiling and post command actions are skipped and the VMR vector is only resolved
+    when its symlink is not valid.
+    """
+    context.logger.debug("Running bazel command on the fast path.")
+
+    bazel_command, env = prepare_fast_path_command(context)
+
+    # Buffered output is lost once the process image is replaced
+    for handler in context.logger.handlers:
+        handler.flush()
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    os.execve(bazel_command[0], bazel_command, env)
+
+
+def prepare_fast_path_command(context: Context,
+                              resolve_vector=True,
+                              custom_build_env_variables: Optional[dict]=None) -> Optional[Tuple[List[str], dict]]:
+    """
+    Returns the final bazel command and environment of a fast path invocation.
+    When 'resolve_vector' is False and the VMR vector needs to be resolved, None is returned instead.
+    """
+    from bazelwrapper.vmr_interop import BazelVmrInterop
+
+    bazel_command = build_bazel_command(context, with_bi=False)
+    # The fast path never waits for a probe, the last known circuit state is used
+    circuit_state = safe(fn=lambda ctx: _check_remote_cache_circuit(ctx, bazel_command, probe=False),
+                         default_value=None, ctx=context)
+    bazel_command = _apply_remote_cache_circuit(context, bazel_command, circuit_state)
+
+    env = bazel_env(context, custom_build_env_variables)
     if context.logger.isEnabledFor(DEBUG):
         context.logger.debug("Resolved build env: {envars}".format(envars=json.dumps(env, indent=2)))
 
-    p = None
-    try:
-        p = subprocess.Popen(args=bazel_command, env=env)
-        return p.wait()
+    if not context.is_bypassed_command and not BazelVmrInterop.is_vector_symlink_valid(context):
+        if not resolve_vector:
+            return None
 
-    except KeyboardInterrupt:
-        context.logger.debug("Keyboard interrupt received. Sending 'SIGINT' to the bazel process.")
-        p.send_signal(signal.SIGINT)
+        update_second_party_repositories(env, context)
 
-        return p.wait()
+    return bazel_command, env
 
 
 FOLDER_OF_SCRIPT = os.path.dirname(sys.argv[0])
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+
+import fcntl
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from urllib.request import urlopen
+
+from virtualmonorepo import ioutils
+from virtualmonorepo.log import logger
+
+#
+# Integrity pinning of the 2nd party archives fetched by the 'http_archive' VMR rule type.
+#
+# An archive without a sha256 is downloaded by Bazel on every fetch, it cannot be looked up in the repository cache.
+# The sha256 of an archive comes from the vector server when it provides one, otherwise from the checksums recorded
+# by the prefetcher in '~/.config/wix/virtual-monorepo/archive-checksums.json', keyed by '<owner>/<name>@<revision>'.
+#
+# After a vector is resolved, a detached prefetcher downloads the archives that are missing from the repository cache
+# (i.e. the revisions that changed) in parallel, hashes them while streaming and stores them in the repository cache
+# layout. It then pins the other branched vectors of the workspace, so switching back to a branch with known revisions
+# needs no network. The vector in use is left as is, it is pinned on its next resolve.
+#
+
+RULE_TYPE_ENV_VAR_NAME = "VMR_REPO_RULE_TYPE"
+RULE_TYPE_HTTP_ARCHIVE = "http_archive"
+
+# Keep in sync with 'http_archive_wrapper' at 'rules/virtual_monorepo.bzl'
+ARCHIVE_URL_TEMPLATES = [
+    "https://github-proxy.wixprod.net/{owner}/{name}/tar.gz/{version}",
+    "https://bo.wix.com/git-bazel-proxy/{owner}/{name}/{version}/tar.gz",
+]
+
+SHA256_FIELD_NAME = "sha256"
+
+CHECKSUMS_FILE_NAME = "archive-checksums.json"
+PREFETCH_LOCK_FILE_NAME = "archive-prefetch.lock"
+
+PREFETCH_MAX_WORKERS = 8
+DOWNLOAD_TIMEOUT_SEC = 60
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+def is_prefetch_enabled() -> bool:
+    return os.environ.get(RULE_TYPE_ENV_VAR_NAME, "") == RULE_TYPE_HTTP_ARCHIVE
+
+
+def config_folder_path() -> str:
+    return "{}/.config/wix/virtual-monorepo".format(
+        ioutils.get_home_directory())
+
+
+def default_repository_cache_dir() -> str:
+    """ Bazel's default repository cache, under the default output user root
+        Keep in sync with 'output_user_root' at 'bazelwrapper/env/bazel_server.py'
+    """
+    import pwd
+    user_name = pwd.getpwuid(os.getuid()).pw_name
+
+    if sys.platform == "darwin":
+        output_user_root = "/private/var/tmp/_bazel_{}".format(user_name)
+    else:
+        output_user_root = os.path.expanduser(
+            "~/.cache/bazel/_bazel_{}".format(user_name))
+
+    return os.path.join(output_user_root, "cache", "repos", "v1")
+
+
+def cached_archive_path(repository_cache_dir: str, sha256: str) -> str:
+    return os.path.join(repository_cache_dir, "content_addressable", "sha256",
+                        sha256, "file")
+
+
+def archive_key(repo: dict) -> Optional[str]:
+    """ Return '<owner>/<name>@<revision>' of a repository fetched as an archive, None for local clones
+        and for the previous vector format
+    """
+    if "url" not in repo or "revision" not in repo:
+        return None
+
+    try:
+        # Same parsing as 'http_archive_wrapper', e.g. git@github.com:wix-private/ecom.git
+        (owner, name) = repo["url"].rsplit(":")[1][:-4].split("/")
+    except (IndexError, ValueError):
+        return None
+
+    return "{}/{}@{}".format(owner, name, repo["revision"])
+
+
+def archive_urls(key: str) -> List[str]:
+    (owner_name, version) = key.split("@")
+    (owner, name) = owner_name.split("/")
+    return [
+        template.format(owner=owner, name=name, version=version)
+        for template in ARCHIVE_URL_TEMPLATES
+    ]
+
+
+class ArchiveChecksums:
+
+    def __init__(self, file_path: Optional[str] = None):
+        self.file_path = file_path if file_path is not None else os.path.join(
+            config_folder_path(), CHECKSUMS_FILE_NAME)
+        self._known = None
+
+    def known(self) -> dict:
+        if self._known is None:
+            content = ioutils.read_file_safe(self.file_path)
+            try:
+                self._known = json.loads(content) if content else {}
+            except ValueError as err:
+                logger.debug(
+                    "Ignoring malformed archive checksums. error: {}".format(
+                        err))
+                self._known = {}
+
+        return self._known
+
+    def pin(self, repos: list) -> list:
+        """ Return the repositories with the sha256 of their archive, when it is known
+            A sha256 provided by the vector server is kept as is
+        """
+        pinned = []
+        for repo in repos:
+            key = archive_key(repo)
+            sha256 = self.known().get(key) if key is not None else None
+            if sha256 is not None and SHA256_FIELD_NAME not in repo:
+                repo = dict(repo)
+                repo[SHA256_FIELD_NAME] = sha256
+            pinned.append(repo)
+
+        return pinned
+
+    def record(self, checksums: dict):
+        # Re-read, other workspaces may have recorded checksums in the meantime
+        self._known = None
+        known = dict(self.known())
+        known.update(checksums)
+
+        ioutils.create_directory(os.path.dirname(self.file_path))
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.file_path),
+                                        prefix=CHECKSUMS_FILE_NAME)
+        try:
+            with os.fdopen(fd, "w") as tmp_file:
+                json.dump(known, tmp_file, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.file_path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+
+        self._known = known
+
+
+class ArchivePrefetcher:
+
+    def __init__(self, checksums: ArchiveChecksums, repository_cache_dir: str):
+        self.checksums = checksums
+        self.repository_cache_dir = repository_cache_dir
+
+    def missing_archives(self, repos: list) -> dict:
+        """ Return a dictionary of <key, expected sha256 or None> of the archives missing from the repository cache
+        """
+        missing = dict()
+        for repo in repos:
+            key = archive_key(repo)
+            if key is None:
+                continue
+
+            sha256 = repo.get(SHA256_FIELD_NAME) or self.checksums.known().get(
+                key)
+            if sha256 is None or not os.path.isfile(
+                    cached_archive_path(self.repository_cache_dir, sha256)):
+                missing[key] = sha256
+
+        return missing
+
+    def prefetch(self, repos: list) -> dict:
+        """ Download the missing archives in parallel and record their checksums
+            Return a dictionary of <key, sha256> of the prefetched archives
+        """
+        missing = self.missing_archives(repos)
+        if len(missing) == 0:
+            logger.debug("All 2nd party archives are in the repository cache")
+            return {}
+
+        logger.info("Prefetching {} 2nd party archives into: {}".format(
+            len(missing), self.repository_cache_dir))
+
+        with ThreadPoolExecutor(max_workers=min(PREFETCH_MAX_WORKERS,
+                                                len(missing))) as executor:
+            results = executor.map(
+                lambda item: (item[0], self._download_safe(item[0], item[1])),
+                missing.items())
+            prefetched = {
+                key: sha256 for (key, sha256) in results if sha256 is not None
+            }
+
+        if len(prefetched) > 0:
+            self.checksums.record(prefetched)
+
+        logger.info("Prefetched {} of {} 2nd party archives".format(
+            len(prefetched), len(missing)))
+        return prefetched
+
+    def _download_safe(self, key: str,
+                       expected_sha256: Optional[str]) -> Optional[str]:
+        for url in archive_urls(key):
+            try:
+                sha256 = self._download(url)
+            except Exception as err:
+                logger.debug("Failed to prefetch archive. url: {}, error: {}".format(
+                    url, err))
+                continue
+
+            if expected_sha256 is not None and sha256 != expected_sha256:
+                logger.error(
+                    "Archive checksum mismatch, ignoring it. url: {}, expected: {}, actual: {}"
+                    .format(url, expected_sha256, sha256))
+                return None
+
+            return sha256
+
+        return None
+
+    def _download(self, url: str) -> str:
+        """ Stream the archive into the repository cache while hashing it, return its sha256
+        """
+        tmp_dir = os.path.join(self.repository_cache_dir, "content_addressable",
+                               "sha256")
+        ioutils.create_directory(tmp_dir)
+
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir, prefix="tmp-prefetch-")
+        try:
+            with os.fdopen(fd, "wb") as tmp_file, urlopen(
+                    url, timeout=DOWNLOAD_TIMEOUT_SEC) as response:
+                chunk = response.read(DOWNLOAD_CHUNK_SIZE)
+                while chunk:
+                    digest.update(chunk)
+                    tmp_file.write(chunk)
+                    chunk = response.read(DOWNLOAD_CHUNK_SIZE)
+
+            sha256 = digest.hexdigest()
+            file_path = cached_archive_path(self.repository_cache_dir, sha256)
+            ioutils.create_directory(os.path.dirname(file_path))
+            os.replace(tmp_path, file_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        logger.debug("Prefetched archive. url: {}, sha256: {}".format(
+            url, sha256))
+        return sha256
+
+
+def pin_vector_text(vector_txt: str,
+                    checksums: ArchiveChecksums) -> Optional[str]:
+    """ Return the vector text with its repositories pinned, None when nothing changed
+
+        Only the current vector format is pinned, the 'repos' block ends with an empty line
+    """
+    lines = vector_txt.splitlines(True)
+    start = None
+    end = None
+    for (index, line) in enumerate(lines):
+        if start is None and line.startswith("repos = "):
+            start = index
+        elif start is not None and line == "\n":
+            end = index
+            break
+
+    if start is None or end is None:
+        return None
+
+    repos_block = "".join(lines[start:end])[len("repos = "):]
+    try:
+        repos = json.loads(repos_block)
+    except ValueError:
+        return None
+
+    pinned = checksums.pin(repos)
+    if pinned == repos:
+        return None
+
+    pinned_block = "repos = {}\n".format(json.dumps(pinned, indent=4))
+    return "".join(lines[:start]) + pinned_block + "".join(lines[end:])
+
+
+def pin_branched_vectors(vector_dir_path: str, current_vector_path: str,
+                         checksums: ArchiveChecksums):
+    """ Pin the branched vectors of the workspace, except the one in use by the current build
+    """
+    if not os.path.isdir(vector_dir_path):
+        return
+
+    current_real_path = os.path.realpath(current_vector_path)
+    for file_name in os.listdir(vector_dir_path):
+        file_path = os.path.join(vector_dir_path, file_name)
+        if os.path.realpath(file_path) == current_real_path:
+            continue
+
+        vector_txt = ioutils.read_file_safe(file_path)
+        pinned_txt = pin_vector_text(vector_txt,
+                                     checksums) if vector_txt else None
+        if pinned_txt is None:
+            continue
+
+        fd, tmp_path = tempfile.mkstemp(dir=vector_dir_path, prefix=".pin-")
+        with os.fdopen(fd, "w") as tmp_file:
+            tmp_file.write(pinned_txt)
+        os.replace(tmp_path, file_path)
+        logger.debug("Pinned 2nd party archives of vector. path: {}".format(
+            file_path))
+
+
+def start_background_prefetch(workspace_dir: str):
+    """ Run the prefetcher in a detached process, the resolve never waits for the downloads
+    """
+    tools_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.Popen([
+        sys.executable, "-m", "virtualmonorepo.main", "--silent",
+        "prefetch-archives", "--workspace-dir", workspace_dir
+    ],
+                     cwd=tools_dir,
+                     stdin=subprocess.DEVNULL,
+                     stdout=subprocess.DEVNULL,
+                     stderr=subprocess.DEVNULL,
+                     start_new_session=True)
+
+
+def acquire_prefetch_lock():
+    """ Return an open lock file while holding it, None when another prefetcher runs
+    """
+    lock_folder_path = config_folder_path()
+    ioutils.create_directory(lock_folder_path)
+    lock_file = open(os.path.join(lock_folder_path, PREFETCH_LOCK_FILE_NAME),
+                     "w")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+
+    return lock_file
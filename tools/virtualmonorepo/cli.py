@@ -16,6 +16,7 @@ def parse_args(args):
 
     define_vector_action(sub_parser)
     define_local_vector_action(sub_parser)
+    define_prefetch_archives_action(sub_parser)
 
     if len(args) == 0:
         root_parser.print_help(sys.stderr)
@@ -89,6 +90,23 @@ def define_local_vector_action(sub_parser):
     )
 
 
+def define_prefetch_archives_action(sub_parser):
+    prefetch_command = sub_parser.add_parser("prefetch-archives")
+    prefetch_command.add_argument(
+        '--workspace-dir',
+        dest="workspace_dir",
+        required=True,
+        help=
+        'Directory path of a workspace whose 2nd party archives should get prefetched',
+    )
+    prefetch_command.add_argument(
+        '--repository-cache',
+        dest="repository_cache",
+        required=False,
+        help='Bazel repository cache directory (default: Bazel default)',
+    )
+
+
 def define_vector_action(sub_parser):
     resolve_command = sub_parser.add_parser("resolve-vector")
     resolve_command.add_argument(
@@ -225,6 +243,25 @@ class LocalVectorArgs:
                                                    self.bazel_context)
 
 
+class PrefetchArchivesArgs:
+
+    workspace_dir = None
+    repository_cache = None
+
+    # Globals
+    verbose = None
+    silent = None
+    bazel_context = None
+
+    def __init__(self, arguments):
+        if arguments is not None:
+            self.workspace_dir = arguments.workspace_dir
+            self.repository_cache = arguments.repository_cache
+            self.verbose = arguments.verbose
+            self.silent = arguments.silent
+            self.bazel_context = arguments.bazel_context
+
+
 class ProgramArgs:
 
     vector_action = None
@@ -232,6 +269,7 @@ class ProgramArgs:
 
     resolve_vector_args: ResolveVectorArgs = None
     local_vector_args: LocalVectorArgs = None
+    prefetch_archives_args: PrefetchArchivesArgs = None
 
     def __init__(self, arguments):
         if arguments is not None and arguments.vector_action is not None:
@@ -242,6 +280,9 @@ class ProgramArgs:
             elif arguments.vector_action == "local-vector":
                 self.local_vector_args = LocalVectorArgs(arguments)
                 self.is_valid = True
+            elif arguments.vector_action == "prefetch-archives":
+                self.prefetch_archives_args = PrefetchArchivesArgs(arguments)
+                self.is_valid = True
 
 
 def read_program_args(sys_args) -> ProgramArgs:
@@ -29,6 +29,17 @@ class Differ:
             # Do nothing
             return None
 
+    @staticmethod
+    def extract_vector_repos(vector_data) -> list:
+        """ Return the list of raw repository objects out of a resolved vector data bzl format
+        """
+        try:
+            return _try_parse_from_both_vector_formats(vector_data)
+        except Exception as e:
+            logger.error(
+                "Failed to parse vector repositories. error: {}".format(e))
+            return None
+
     @staticmethod
     def extract_vector_metadata(vector_txt):
         """ Extract metadata object from current vector format
@@ -4,6 +4,7 @@ import json
 import sys
 import os
 
+from virtualmonorepo import archives
 from virtualmonorepo.log import init_logger, logger
 from virtualmonorepo.context import Context
 from virtualmonorepo.git import read_current_branch
@@ -13,9 +14,11 @@ from virtualmonorepo.linker import FileSystemVectorLinker, DryRunVectorLinker
 from virtualmonorepo.templates import VectorTemplateGenerator
 from virtualmonorepo.paths import PathsBuilder
 from virtualmonorepo.extensions import FileBasedVmrExtensions, DryRunVmrExtensions
+from virtualmonorepo.differ import Differ
 from virtualmonorepo.bazel_driver import create_build_files_if_needed
 from virtualmonorepo.vector import resolve, read_local_vector, VectorData
-from virtualmonorepo.cli import read_program_args, ProgramArgs, ResolveVectorArgs, LocalVectorArgs
+from virtualmonorepo.trace import span
+from virtualmonorepo.cli import read_program_args, ProgramArgs, ResolveVectorArgs, LocalVectorArgs, PrefetchArchivesArgs
 
 # Skip generating .pyc files
 sys.dont_write_bytecode = True
@@ -36,6 +39,8 @@ def main():
         vector_data = read_vector(arguments.local_vector_args)
         if vector_data is not None:
             print(vector_data.toJSON())
+    elif arguments.vector_action == "prefetch-archives":
+        prefetch_archives(arguments.prefetch_archives_args)
 
 
 def update_vector(arguments: ResolveVectorArgs):
@@ -69,16 +74,18 @@ def calculate_build_branch(workspace_dir, build_type, build_branch_override):
 
 
 def create_context(arguments: ResolveVectorArgs):
-    build_branch = calculate_build_branch(arguments.workspace_dir,
-                                          arguments.build_type,
-                                          arguments.build_branch_override)
+    with span("vmr.calculate_build_branch"):
+        build_branch = calculate_build_branch(arguments.workspace_dir,
+                                              arguments.build_type,
+                                              arguments.build_branch_override)
     logger.debug("Selected build branch identified as: {}".format(build_branch))
 
     registry = InjectionsRegistry()
     registry.vector_provider = HttpVectorProvider(arguments.vector_provider_url)
     registry.vector_file_linker = DryRunVectorLinker(
     ) if arguments.dry_run else FileSystemVectorLinker()
-    registry.template_generator = VectorTemplateGenerator()
+    registry.template_generator = VectorTemplateGenerator(
+        archives.ArchiveChecksums())
     registry.paths_builder = PathsBuilder(arguments.workspace_dir, build_branch,
                                           build_branch)
     registry.vmr_extensions = DryRunVmrExtensions(
@@ -101,10 +108,24 @@ def update_2nd_parties_vector(ctx: Context):
     if not ctx.resolve_vector_args.dry_run:
         #  TODO: why??
         create_build_files_if_needed(ctx.resolve_vector_args.workspace_dir)
+        _start_archives_prefetch(ctx.resolve_vector_args.workspace_dir)
 
     logger.info(response.output_message)
 
 
+def _start_archives_prefetch(workspace_dir):
+    if not archives.is_prefetch_enabled():
+        return
+
+    try:
+        archives.start_background_prefetch(workspace_dir)
+    except Exception as err:
+        # Prefetching is an optimization, the build fetches missing archives by itself
+        logger.debug(
+            "Failed to start the 2nd party archives prefetch. error: {}".format(
+                err))
+
+
 def _log_diff(diff: dict):
     if diff is None:
         logger.info("Could not identify vector differences to log, skipping")
@@ -149,5 +170,37 @@ def read_vector(arguments: LocalVectorArgs) -> VectorData:
     return read_local_vector(ctx)
 
 
+def prefetch_archives(arguments: PrefetchArchivesArgs):
+    """ Fill the Bazel repository cache with the 2nd party archives of the current vector
+        and pin the other branched vectors of the workspace
+    """
+    init_logger(is_silent=arguments.silent,
+                is_verbose=arguments.verbose,
+                is_dry_run=False,
+                is_bazel_context=arguments.bazel_context)
+
+    lock_file = archives.acquire_prefetch_lock()
+    if lock_file is None:
+        logger.debug("2nd party archives prefetch is already running, skipping")
+        return
+
+    with lock_file:
+        paths_builder = PathsBuilder(arguments.workspace_dir, branch=None)
+        symlink_path = paths_builder.vector_symlink_path()
+        repos = Differ.extract_vector_repos(
+            FileSystemVectorLinker().read_file_content(symlink_path) or "")
+        if repos is None:
+            logger.debug("No vector repositories to prefetch")
+            return
+
+        checksums = archives.ArchiveChecksums()
+        repository_cache_dir = arguments.repository_cache or archives.default_repository_cache_dir(
+        )
+        archives.ArchivePrefetcher(checksums,
+                                   repository_cache_dir).prefetch(repos)
+        archives.pin_branched_vectors(paths_builder.vector_directory_path(),
+                                      symlink_path, checksums)
+
+
 if __name__ == "__main__":
     main()
@@ -9,6 +9,7 @@ from virtualmonorepo.extensions import VmrExtensions
 from virtualmonorepo.linker import VectorLinker
 from virtualmonorepo.paths import PathsBuilder
 from virtualmonorepo.templates import TemplateGenerator
+from virtualmonorepo.trace import traced
 from virtualmonorepo.vector_provider import VectorProvider
 
 
@@ -37,6 +38,7 @@ class ResolverActions:
         self.v_templategen = v_templategen
         self.paths_builder = paths_builder
 
+    @traced("vmr.point_symlink_to_existing_vector")
     def point_symlink_to_existing_vector(self) -> ResolvedVectorResponse:
         branched_vector_path = self.paths_builder.branched_vector_file_path()
         symlink_path = self.paths_builder.vector_symlink_path()
@@ -51,6 +53,7 @@ class ResolverActions:
             branched_vector_path, symlink_path, resolved,
             output_message) if resolved is not None else None
 
+    @traced("vmr.create_vector_from_symlink_content")
     def create_vector_from_symlink_content(self) -> ResolvedVectorResponse:
         branched_vector_path = self.paths_builder.branched_vector_file_path()
         symlink_path = self.paths_builder.vector_symlink_path()
@@ -67,6 +70,7 @@ class ResolverActions:
             branched_vector_path, symlink_path, resolved,
             output_message) if resolved is not None else None
 
+    @traced("vmr.download_vector_from_remote_server")
     def download_vector_from_remote_server(self) -> ResolvedVectorResponse:
         branched_vector_path = self.paths_builder.branched_vector_file_path()
         symlink_path = self.paths_builder.vector_symlink_path()
@@ -88,6 +92,7 @@ class ResolverActions:
             output_message,
             diff=diff) if resolved is not None else None
 
+    @traced("vmr.point_symlink_to_fixed_vector")
     def point_symlink_to_fixed_vector(self) -> ResolvedVectorResponse:
         fixed_vector_path = self.paths_builder.git_tracked_vector_path()
         symlink_path = self.paths_builder.vector_symlink_path()
@@ -101,6 +106,7 @@ class ResolverActions:
             fixed_vector_path, symlink_path, resolved,
             output_message) if resolved is not None else None
 
+    @traced("vmr.create_vector_from_ci_lock_file")
     def create_vector_from_ci_lock_file(self) -> ResolvedVectorResponse:
         symlink_path = self.paths_builder.vector_symlink_path()
         ci_lockfile_path = self.paths_builder.ci_generated_lock_file_path()
@@ -26,6 +26,7 @@ def _create_build_file(repo_ctx):
         """,
     )
 
+# Keep the archive URLs in sync with 'ARCHIVE_URL_TEMPLATES' at 'virtualmonorepo/archives.py'
 def _prepare_definitions_content(repo_ctx):
     active_rule_type = _get_active_rule_type(repo_ctx.os.environ)
 
@@ -55,6 +56,8 @@ def http_archive_wrapper(**repo):
             "https://bo.wix.com/git-bazel-proxy/%s/%s/%s/tar.gz" % (owner, name, version),
         ],
         strip_prefix = "%s-%s" % (name, version),
+        # Recorded by the VMR client, pinned archives are fetched from the repository cache
+        sha256 = repo.get("sha256", ""),
     )
 """.format(active_rule_type)
 
@@ -1,6 +1,9 @@
 #!/usr/bin/env python3
 
 import json
+from typing import Optional
+
+from virtualmonorepo.archives import ArchiveChecksums
 
 
 class TemplateGenerator:
@@ -14,13 +17,16 @@ class TemplateGenerator:
 
 class VectorTemplateGenerator(TemplateGenerator):
 
-    def __init__(self):
-        pass
+    def __init__(self, archive_checksums: Optional[ArchiveChecksums] = None):
+        self.archive_checksums = archive_checksums
 
     def generate(self, raw_vector_json) -> str:
         vector_json_raw = raw_vector_json.get("vector")
 
         vector_repos_raw = vector_json_raw.get("repos")
+        if self.archive_checksums is not None:
+            # Pinned archives are served from the Bazel repository cache
+            vector_repos_raw = self.archive_checksums.pin(vector_repos_raw)
         repos_json = json.dumps(vector_repos_raw, indent=4)
 
         metadata_raw = vector_json_raw.get("metaData", "")
@@ -57,6 +63,9 @@ _vector_bzl_template = """%(load_defs)s
 #     "pushedAtInSeconds": "12345",
 # }
 
+# When using a 'http_archive' VMR rule type, an optional 'sha256' attribute pins the archive
+# and allows fetching it from the Bazel repository cache.
+
 # Hint:
 # To check the active VMR rule type in use run the following command from the WORKSPACE root folder: 
 # ./tools/vmr config
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+
+from contextlib import contextmanager
+from functools import wraps
+
+# A context manager factory '(name, **args)' installed by the embedding process (e.g. the bazel wrapper) to record the
+# VMR client phases in its own trace. The VMR client does not record anything on its own.
+_span_hook = None
+
+
+def set_span_hook(hook):
+    global _span_hook
+    _span_hook = hook
+
+
+@contextmanager
+def span(name: str, **args):
+    if _span_hook is None:
+        yield
+    else:
+        with _span_hook(name, **args):
+            yield
+
+
+def traced(name: str):
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -7,6 +7,7 @@ from virtualmonorepo.log import logger
 from virtualmonorepo.context import Context
 from virtualmonorepo.differ import Differ
 from virtualmonorepo.ioutils import read_file_safe, file_exists
+from virtualmonorepo.trace import span
 from virtualmonorepo.resolver import (Resolver, BranchOnlyResolver,
                                       BuildMasterResolver,
                                       CrossRepoOnlyResolver,
@@ -47,7 +48,8 @@ def resolve(ctx: Context, build_type: str) -> ResolvedVectorResponse:
     logger.info("Resolving 2nd party vector. resolver: {}".format(
         type(r).__name__))
 
-    return r.resolve(ctx)
+    with span("vmr.resolve", resolver=type(r).__name__):
+        return r.resolve(ctx)
 
 
 def server_resolver(ctx: Context):